@@ -0,0 +1,263 @@
+"""
+Арена: много змеек на одном поле
+
+Все змейки ходят одновременно. Столкновения проверяются не попарно, а по общей
+сетке занятости движка: голова смотрит только в свою новую клетку, а встречные
+головы находятся по словарю новых клеток голов. Поэтому тик стоит O(число змеек)
+и не зависит от их длины. Кроме сетки занятости у арены есть сетка владельцев
+(номер змейки в клетке), по ней отличается удар в себя от удара в другую змейку.
+
+Змейкой 0 может управлять игрок (action в step), остальными - бот policy. Погибшие
+боты сразу появляются заново в случайной свободной клетке, поэтому число змеек
+не меняется. Пилюль на арене нет, яблок несколько.
+
+Пример:
+    arena = Arena(500, 500, snakes=100)
+    for i in range(1000):
+        arena.step()
+"""
+import random
+import sys
+import time
+from array import array
+
+from engine import (ACTION_CODES, APPLE, CAUSES, DIRECTIONS, EVENT_APPLE, EVENT_DEATH, EVENT_MOVE, OPPOSITE, SNAKE,
+                    WALL, Engine, Snake, State)
+
+DIRECTION_NAMES = list(DIRECTIONS)
+
+
+def careful_policy(arena, snake):
+    """
+    Простой бот для арены: берёт яблоко рядом, иначе идёт прямо, а перед препятствием
+    или изредка просто так поворачивает в свободную сторону. Смотрит только на соседние клетки
+    :param arena: Arena
+    :param snake: Змейка бота
+    :return: Направление или None
+    """
+    grid = arena.grid
+    width = arena.width
+    height = arena.height
+    choices = []
+    for direction in DIRECTION_NAMES:
+        if direction == OPPOSITE[snake.direction]:
+            continue
+        dx, dy = DIRECTIONS[direction]
+        cell = grid[(snake.y + dy) % height * width + (snake.x + dx) % width]
+        if cell == APPLE:
+            return direction
+        if cell != WALL and cell != SNAKE:
+            choices.append(direction)
+    if not choices:
+        return None
+    if snake.direction in choices and arena.random.random() > 0.1:
+        return None
+    return arena.random.choice(choices)
+
+
+class Arena(Engine):
+    def __init__(self, width: int, height: int, snakes: int = 100, difficulty: int = 3, seed=None,
+                 apples: int = None, length: int = 3, player: bool = False, policy=careful_policy):
+        """
+        Арена без графики
+        :param width: Ширина поля в клетках
+        :param height: Высота поля в клетках
+        :param snakes: Количество змеек
+        :param difficulty: Уровень сложности, от него зависят стены
+        :param seed: Зерно уровня
+        :param apples: Сколько яблок держать на поле, по умолчанию по одному на две змейки
+        :param length: Начальная длина змейки
+        :param player: Змейкой 0 управляет игрок: она не появляется заново, её смерть заканчивает игру
+        :param policy: Бот для остальных змеек: policy(arena, snake) -> направление или None
+        """
+        self.count = snakes
+        self.apple_count = apples or max(1, snakes // 2)
+        self.length = length
+        self.player = player
+        self.policy = policy
+        super().__init__(width, height, difficulty, seed=seed)
+
+    def reset(self, seed=None):
+        """
+        Новая игра на том же поле: змейки и яблоки в случайных свободных клетках
+        :param seed: Зерно игры, по умолчанию берётся из генератора уровня
+        :return: Начальное состояние змейки 0
+        """
+        self.game_seed = self.level_random.randrange(2 ** 63) if seed is None else seed
+        self.random = random.Random(self.game_seed)
+        self.actions = bytearray()
+        self._reset_grid()
+        self.changed = []  # Клетки, изменившиеся за последний тик, для отрисовки
+        # Номер змейки + 1 в каждой клетке её тела, 0 - клетка ничья
+        self.owner = array('H', [0]) * (self.width * self.height)
+        self.snakes = []
+        for number in range(self.count):
+            self.snakes.append(self.place(number))
+        self.snake = self.snakes[0]
+        self.apples = set()
+        self.add_apples()
+
+        self.apple = None  # Одиночные предметы движка на арене не используются
+        self.pill = None
+        self.fast_pill = None
+        self.fast_pill_timer = 0
+        self.ticks = 0
+        self.done = False
+        self.cause = None
+        self.deaths = 0
+        return State((self.snake.x, self.snake.y), None, 0, self.snake.length, False, None)
+
+    def place(self, number):
+        """
+        Новая змейка в случайной свободной клетке. Она начинается с одной клетки и дорастает до длины length
+        :param number: Номер змейки
+        :return: Snake или None, если свободных клеток нет
+        """
+        cell = self.random_free_cell()
+        if cell is None:
+            return None
+        snake = Snake(*cell, rng=self.random)
+        snake.length = self.length
+        snake.grow = self.length - 1
+        index = cell[1] * self.width + cell[0]
+        self._occupy(index, SNAKE)
+        self.owner[index] = number + 1
+        return snake
+
+    def add_apples(self):
+        """
+        Новые яблоки вместо съеденных
+        :return:
+        """
+        while len(self.apples) < self.apple_count:
+            cell = self.spawn(APPLE)
+            if cell is None:
+                return
+            self.apples.add(cell)
+            self.changed.append(cell)
+
+    def step(self, action=None):
+        """
+        Один тик: все змейки ходят одновременно
+        :param action: Направление змейки игрока (если player), остальными управляет policy
+        :return: Состояние змейки 0
+        """
+        snake = self.snake
+        if self.done:
+            return State((snake.x, snake.y), None, snake.score, snake.length, True, self.cause)
+
+        grid = self.grid
+        owner = self.owner
+        width = self.width
+        height = self.height
+        policy = self.policy
+        timer = self.timer
+        events = self.events
+        self.changed = changed = []
+        self.ticks += 1
+
+        # Ходы: хвосты освобождаются сразу, поэтому в клетку хвоста можно войти на этом же тике.
+        # Новые клетки голов собираются в словарь, две головы в одной клетке - лобовое столкновение
+        heads = {}
+        crashed = []
+        tails = [None] * len(self.snakes)
+        for number, snake in enumerate(self.snakes):
+            if snake is None:
+                continue
+            direction = action if number == 0 and self.player else policy(self, snake)
+            # Разворот назад, как в движке, разрешён только до первого яблока
+            if direction is not None and (direction != OPPOSITE[snake.direction] or snake.score == 0):
+                snake.direction = direction
+            tail = snake.move(width, height)
+            if tail is not None:
+                index = tail[1] * width + tail[0]
+                self._release(index)
+                owner[index] = 0
+                changed.append(tail)
+                tails[number] = tail
+            index = snake.y * width + snake.x
+            if index in heads:
+                crashed.append(number)
+                crashed.append(heads[index])
+            else:
+                heads[index] = number
+
+        # События и отметки времени, как в Engine.step, относятся к змейке 0
+        if events is not None and self.snakes[0] is not None:
+            snake = self.snakes[0]
+            events.emit(self.ticks, EVENT_MOVE, snake.x, snake.y, ACTION_CODES[snake.direction])
+        if timer is not None:
+            timer.mark('move')
+
+        # Столкновения: по содержимому новой клетки головы в общей сетке
+        causes = dict.fromkeys(crashed, 'snake')
+        for index, number in heads.items():
+            if number in causes:
+                continue
+            cell = grid[index]
+            if cell == WALL:
+                causes[number] = 'wall'
+            elif cell == SNAKE:
+                causes[number] = 'self' if owner[index] == number + 1 else 'snake'
+            else:
+                snake = self.snakes[number]
+                if cell == APPLE:
+                    snake.add_body()
+                    self.apples.discard((snake.x, snake.y))
+                    if number == 0 and events is not None:
+                        events.emit(self.ticks, EVENT_APPLE, snake.x, snake.y, snake.score)
+                self._occupy(index, SNAKE)
+                owner[index] = number + 1
+                changed.append((snake.x, snake.y))
+
+        if timer is not None:
+            timer.mark('collision')
+
+        # Погибшие змейки освобождают тело (кроме головы, которая так и не заняла клетку) и появляются заново
+        for number, cause in causes.items():
+            snake = self.snakes[number]
+            self.deaths += 1
+            if number == 0 and events is not None:
+                events.emit(self.ticks, EVENT_DEATH, snake.x, snake.y, CAUSES.index(cause))
+            for x, y in list(snake.body)[1:]:
+                index = y * width + x
+                if owner[index] == number + 1:
+                    self._release(index)
+                    owner[index] = 0
+                    changed.append((x, y))
+            if number == 0 and self.player:
+                self.done = True
+                self.cause = cause
+            else:
+                self.snakes[number] = self.place(number)
+                if self.snakes[number] is not None:
+                    changed.append((self.snakes[number].x, self.snakes[number].y))
+        self.add_apples()
+        if timer is not None:
+            timer.mark('spawn')
+
+        if self.snakes[0] is not None:
+            self.snake = self.snakes[0]
+        snake = self.snake
+        return State((snake.x, snake.y), tails[0], snake.score, snake.length, self.done, self.cause)
+
+    def total_length(self):
+        """
+        Суммарная длина живых змеек
+        :return:
+        """
+        return sum(snake.length for snake in self.snakes if snake is not None)
+
+
+if __name__ == '__main__':
+    # python arena.py 100 500 - 100 змеек на поле 500x500, 1000 тиков
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    arena = Arena(size, size, snakes=count, seed=1)
+    start = time.perf_counter()
+    for i in range(1000):
+        arena.step()
+    elapsed = time.perf_counter() - start
+    print(f'{count} змеек на поле {size}x{size}: {elapsed:.2f} с на 1000 тиков, '
+          f'{elapsed / 1000 / count * 1e6:.1f} мкс на змейку за тик, длина всех змеек {arena.total_length()}, '
+          f'смертей {arena.deaths}')
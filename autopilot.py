@@ -0,0 +1,220 @@
+"""
+Автопилот: бот, который ведёт змейку к яблоку по кратчайшему пути
+
+Путь ищется поиском в ширину по сетке занятости движка (стены и тело змейки
+непроходимы, края поля склеены, как в engine.Snake.move). Поиск идёт сразу по
+целому слою: свободные клетки поля хранятся битами одного целого числа, и
+соседи всех клеток слоя получаются несколькими сдвигами. Найденный путь
+запоминается и используется, пока яблоко на месте и следующая клетка свободна,
+поэтому поиск выполняется примерно раз на яблоко, а не на каждом тике.
+
+Прежде чем идти к яблоку, автопилот проверяет путь на безопасность: змейка
+мысленно проходит его до конца, и из клетки яблока должен оставаться путь до
+хвоста. Если безопасного пути нет, змейка идёт за своим хвостом и время от
+времени пробует найти путь к яблоку снова.
+
+Пример:
+    pilot = Autopilot()
+    state = engine.play(Engine(50, 40, difficulty=3), pilot)
+"""
+from collections import deque
+
+from engine import DIRECTIONS, OPPOSITE, SNAKE, WALL
+
+# Направления в порядке соседей в Board.neighbors
+DIRECTION_NAMES = list(DIRECTIONS)
+
+# Код клетки -> символ бита свободной клетки: стены и змейка непроходимы
+FREE_BITS = bytes(ord('0') if code in (WALL, SNAKE) else ord('1') for code in range(256))
+
+# Поля по размеру: (ширина, высота) -> Board
+_boards = {}
+
+
+class Board:
+    def __init__(self, width: int, height: int):
+        """
+        Маски и таблица соседей для поля одного размера
+        :param width: Ширина поля
+        :param height: Высота поля
+        """
+        self.width = width
+        self.height = height
+        # Соседи каждой клетки с переходом через край поля
+        self.neighbors = [tuple(((y + dy) % height) * width + (x + dx) % width for dx, dy in DIRECTIONS.values())
+                          for y in range(height) for x in range(width)]
+        # Бит клетки - её индекс y * width + x
+        self.full = (1 << width * height) - 1
+        self.first_column = sum(1 << y * width for y in range(height))
+        self.last_column = self.first_column << width - 1
+        self.first_row = (1 << width) - 1
+        self.last_row_shift = width * (height - 1)
+
+    def free_cells(self, grid):
+        """
+        Свободные клетки сетки занятости битами целого числа
+        :param grid: Сетка занятости движка
+        :return:
+        """
+        return int(grid.translate(FREE_BITS)[::-1], 2)
+
+    def expand(self, cells):
+        """
+        Все соседи клеток с переходом через край поля
+        :param cells: Клетки битами
+        :return: Клетки битами
+        """
+        width = self.width
+        last_column = self.last_column
+        first_column = self.first_column
+        return (((cells & ~last_column) << 1) | ((cells & last_column) >> width - 1)
+                | ((cells & ~first_column) >> 1) | ((cells & first_column) << width - 1)
+                | ((cells << width) & self.full) | (cells >> self.last_row_shift)
+                | (cells >> width) | ((cells & self.first_row) << self.last_row_shift))
+
+    def find_path(self, free, start, goal):
+        """
+        Кратчайший путь поиском в ширину по слоям
+        :param free: Свободные клетки битами, цель может быть занята
+        :param start: Клетка, откуда идёт путь
+        :param goal: Клетка, куда нужно прийти
+        :return: Клетки пути без начальной, последняя - цель, или None, если пути нет
+        """
+        goal_bit = 1 << goal
+        free |= goal_bit
+        frontier = seen = 1 << start
+        layers = []
+        while not frontier & goal_bit:
+            frontier = self.expand(frontier) & free & ~seen
+            if not frontier:
+                return None
+            seen |= frontier
+            layers.append(frontier)
+
+        # Обратный проход: из цели в соседа из предыдущего слоя
+        path = [goal]
+        cell = goal
+        for layer in reversed(layers[:-1]):
+            cell = next(near for near in self.neighbors[cell] if layer >> near & 1)
+            path.append(cell)
+        path.reverse()
+        return path
+
+
+def board(width, height):
+    """
+    Поле нужного размера, маски считаются один раз
+    :return: Board
+    """
+    result = _boards.get((width, height))
+    if result is None:
+        result = _boards[(width, height)] = Board(width, height)
+    return result
+
+
+class Autopilot:
+    def __init__(self, retry: int = 4):
+        """
+        Инициализация автопилота, один объект можно использовать для многих игр подряд
+        :param retry: Через сколько тиков за хвостом снова искать путь к яблоку
+        """
+        self.retry = retry
+        self.path = []  # Оставшиеся клетки пути в обратном порядке, последняя - следующий ход
+        self.target = None  # Яблоко, к которому ведёт путь, или None, если змейка идёт за хвостом
+        self.wait = 0  # Тиков до следующей попытки найти путь к яблоку
+        self.expected = None  # Игра и тик, на котором сохранённый путь ещё действителен
+        self.searches = 0  # Количество поисков пути, для оценки повторного использования
+
+    def __call__(self, game):
+        """
+        Выбор направления на следующий тик
+        :param game: engine.Engine
+        :return: Направление
+        """
+        snake = game.snake
+        width = game.width
+        field = board(width, game.height)
+        head = snake.y * width + snake.x
+        apple = None if game.apple is None else game.apple[1] * width + game.apple[0]
+
+        # Сохранённый путь годится, если змейка шла по нему, цель та же и следующая клетка свободна
+        path = self.path
+        if (self.expected != (id(game), game.game_seed, game.ticks) or not path
+                or path[-1] not in field.neighbors[head] or game.grid[path[-1]] in (WALL, SNAKE)
+                or (self.target is not None and self.target != apple)
+                or (self.target is None and apple is not None and self.wait <= 0)):
+            path = self.plan(game, field, head, apple)
+        self.wait -= 1
+
+        self.expected = (id(game), game.game_seed, game.ticks + 1)
+        if not path:
+            return None
+        cell = path.pop()
+        return DIRECTION_NAMES[field.neighbors[head].index(cell)]
+
+    def plan(self, game, field, head, apple):
+        """
+        Новый путь: к яблоку, если после него можно дойти до хвоста, иначе за хвостом
+        :return: Клетки пути в обратном порядке
+        """
+        self.searches += 1
+        snake = game.snake
+        free = field.free_cells(game.grid)
+        if snake.score:
+            # Разворот на месте запрещён, даже если клетка позади головы ещё пуста (змейка растёт)
+            free &= ~(1 << field.neighbors[head][DIRECTION_NAMES.index(OPPOSITE[snake.direction])])
+        width = game.width
+        body = deque(y * width + x for x, y in snake.body)
+        grow = snake.grow
+
+        if apple is not None:
+            path = field.find_path(free, head, apple)
+            if path is not None and self.is_safe(field, free, body, grow, path):
+                return self.follow(path, apple)
+
+        # Безопасного пути к яблоку нет: идём за хвостом, пока место не освободится
+        self.wait = self.retry
+        tail = body[-1]
+        if tail != head and (grow == 0 or tail not in field.neighbors[head]):
+            path = field.find_path(free, head, tail)
+            if path is not None:
+                return self.follow(path, None)
+        # Хвост недостижим: любой свободный соседний ход
+        for near in field.neighbors[head]:
+            if free >> near & 1:
+                return self.follow([near], None)
+        return self.follow([], None)
+
+    def follow(self, path, target):
+        """
+        Запоминание пути для следующих тиков
+        :return: Путь в обратном порядке
+        """
+        path.reverse()
+        self.path = path
+        self.target = target
+        return path
+
+    @staticmethod
+    def is_safe(field, free, body, grow, path):
+        """
+        Проверка пути: змейка мысленно проходит его, и от головы должен оставаться путь до хвоста
+        :param field: Board
+        :param free: Свободные клетки битами
+        :param body: Клетки тела змейки от головы к хвосту
+        :param grow: На сколько змейка ещё вырастет
+        :param path: Путь до яблока
+        :return:
+        """
+        body = deque(body)
+        for cell in path:
+            if grow:
+                grow -= 1
+            else:
+                free |= 1 << body.pop()
+            body.appendleft(cell)
+            free &= ~(1 << cell)
+        # После яблока змейка растёт, поэтому хвост на следующем тике остаётся на месте
+        head = body[0]
+        tail = body[-1]
+        return head == tail or field.find_path(free, head, tail) is not None
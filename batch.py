@@ -0,0 +1,233 @@
+"""
+Пакетная среда: много независимых игр змейка за один вызов step
+
+Правила те же, что в engine.Engine, но состояние всех игр хранится в общих
+массивах NumPy (по строке на игру), поэтому один вызов step(actions) двигает
+все игры сразу. Законченные игры сразу начинаются заново. Используется для
+обучения ботов, где нужны сотни тысяч шагов в секунду. Требует NumPy.
+
+Пример:
+    env = BatchEngine(1024, 50, 40, difficulty=3)
+    state = env.step(np.random.randint(-1, 4, 1024))
+"""
+import random
+from collections import namedtuple
+
+import numpy as np
+
+from engine import (APPLE, DIRECTIONS, EMPTY, FAST_PILL, FAST_PILL_TIME, OPPOSITE, PILL, PILL_TIME, SNAKE, WALL,
+                    generate_level_grid)
+
+# Номера действий: индекс в этом списке, -1 - не менять направление
+ACTIONS = list(DIRECTIONS)
+DX = np.array([DIRECTIONS[action][0] for action in ACTIONS])
+DY = np.array([DIRECTIONS[action][1] for action in ACTIONS])
+REVERSE = np.array([ACTIONS.index(OPPOSITE[action]) for action in ACTIONS])
+
+# Причины смерти в BatchState.cause
+ALIVE = 0
+DIED_SELF = 1
+DIED_WALL = 2
+
+# Результат шага для всех игр (массивы длины n):
+#   reward - прирост счёта, done - игра закончилась и начата заново,
+#   cause - причина смерти, score - счёт в конце шага (для законченных игр - итоговый)
+BatchState = namedtuple('BatchState', ['reward', 'done', 'cause', 'score'])
+
+
+class BatchEngine:
+    def __init__(self, n: int, width: int, height: int, difficulty: int = 1, seed=None):
+        """
+        Инициализация пакета игр на одном поле
+        :param n: Количество игр
+        :param width: Ширина поля
+        :param height: Высота поля
+        :param difficulty: Уровень сложности, стены общие для всех игр
+        :param seed: Зерно генератора случайных чисел
+        """
+        self.n = n
+        self.width = width
+        self.height = height
+        self.difficulty = difficulty
+        level_random = random.Random(seed)
+        self.wall_grid = generate_level_grid(difficulty, width, height, level_random).ravel()
+        self.rng = np.random.default_rng(level_random.getrandbits(64))
+        self.rows = np.arange(n)
+
+        # Клетки внутри поля (без крайних рядов), где могут появляться предметы
+        interior = np.zeros((height, width), dtype=bool)
+        interior[1:-1, 1:-1] = True
+        self.interior = np.flatnonzero(interior.ravel() & (self.wall_grid == EMPTY))
+
+        cells = width * height
+        self.grid = np.empty((n, cells), dtype=np.uint8)  # Сетка занятости каждой игры
+        # Тело змейки - кольцевой буфер индексов клеток, head и tail - счётчики без переполнения
+        self.body = np.zeros((n, cells), dtype=np.int32)
+        self.head = np.zeros(n, dtype=np.int64)
+        self.tail = np.zeros(n, dtype=np.int64)
+        self.x = np.zeros(n, dtype=np.int64)
+        self.y = np.zeros(n, dtype=np.int64)
+        self.direction = np.zeros(n, dtype=np.int64)
+        self.grow = np.zeros(n, dtype=np.int64)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.pill_timer = np.zeros(n, dtype=np.int64)
+        self.fast_pill_timer = np.zeros(n, dtype=np.int64)
+        self.ticks = np.zeros(n, dtype=np.int64)
+        self.apple = np.full(n, -1, dtype=np.int64)
+        self.pill = np.full(n, -1, dtype=np.int64)
+        self.fast_pill = np.full(n, -1, dtype=np.int64)
+        self.reset()
+
+    @property
+    def length(self):
+        """
+        Длина змейки в каждой игре
+        :return:
+        """
+        return self.head - self.tail + 1
+
+    def reset(self, rows=None):
+        """
+        Начало новых игр
+        :param rows: Номера игр, по умолчанию все
+        :return:
+        """
+        if rows is None:
+            rows = self.rows
+        x = self.width // 2
+        y = self.height // 2
+        self.grid[rows] = self.wall_grid
+        self.grid[rows, y * self.width + x] = SNAKE
+        self.body[rows, 0] = y * self.width + x
+        self.head[rows] = 0
+        self.tail[rows] = 0
+        self.x[rows] = x
+        self.y[rows] = y
+        self.direction[rows] = self.rng.integers(0, 4, len(rows))
+        self.grow[rows] = 0
+        self.score[rows] = 0
+        self.pill_timer[rows] = 0
+        self.fast_pill_timer[rows] = 0
+        self.ticks[rows] = 0
+        self.pill[rows] = -1
+        self.fast_pill[rows] = -1
+        self.apple[rows] = self._spawn(rows, APPLE)
+
+    def _spawn(self, rows, item, attempts=8):
+        """
+        Размещение предмета в случайной свободной клетке в каждой из игр.
+        Клетки выбираются сразу для всех игр, повторно только для тех, где клетка оказалась занята.
+        Если за attempts попыток места не нашлось, клетка выбирается среди всех свободных клеток игры,
+        поэтому предмет появляется всегда, когда на поле есть место, как в Engine
+        :param rows: Номера игр
+        :param item: APPLE, PILL или FAST_PILL
+        :param attempts: Сколько раз пробовать случайную клетку до выбора среди всех свободных
+        :return: Индексы клеток, -1 если поле заполнено
+        """
+        cells = np.full(len(rows), -1, dtype=np.int64)
+        pending = np.arange(len(rows))
+        for i in range(attempts):
+            if not len(pending):
+                return cells
+            candidates = self.interior[self.rng.integers(0, len(self.interior), len(pending))]
+            ok = self.grid[rows[pending], candidates] == EMPTY
+            self.grid[rows[pending[ok]], candidates[ok]] = item
+            cells[pending[ok]] = candidates[ok]
+            pending = pending[~ok]
+        if not len(pending):
+            return cells
+
+        # Тесное поле: у каждой свободной клетки случайный ключ, выбирается клетка с наибольшим
+        free = self.grid[rows[pending][:, None], self.interior] == EMPTY
+        best = np.where(free, self.rng.random(free.shape), -1.0).argmax(axis=1)
+        found = free[np.arange(len(pending)), best]
+        candidates = self.interior[best[found]]
+        self.grid[rows[pending[found]], candidates] = item
+        cells[pending[found]] = candidates
+        return cells
+
+    def step(self, actions=None):
+        """
+        Один тик во всех играх
+        :param actions: Массив номеров действий из ACTIONS (-1 - без изменений) или None
+        :return: BatchState
+        """
+        rows = self.rows
+        width = self.width
+        cap = self.body.shape[1]
+
+        # Проверка на движение в противоположную сторону и длина змейки
+        if actions is not None:
+            actions = np.asarray(actions)
+            allowed = (actions >= 0) & ((actions != REVERSE[self.direction]) | (self.score == 0))
+            self.direction = np.where(allowed, actions, self.direction)
+
+        # Хвост освобождает клетку, если змейка не растёт
+        growing = self.grow > 0
+        self.grow -= growing
+        moving = rows[~growing]
+        self.grid[moving, self.body[moving, self.tail[moving] % cap]] = EMPTY
+        self.tail[moving] += 1
+
+        # Движение головы с переносом на другую сторону поля
+        self.x = (self.x + DX[self.direction]) % width
+        self.y = (self.y + DY[self.direction]) % self.height
+        head = self.y * width + self.x
+        cell = self.grid[rows, head]
+        self.ticks += 1
+
+        # Проверка на столкновение с собой и с блоком
+        cause = np.where(cell == SNAKE, DIED_SELF, np.where(cell == WALL, DIED_WALL, ALIVE))
+        done = cause != ALIVE
+        alive = rows[~done]
+        self.head[alive] += 1
+        self.body[alive, self.head[alive] % cap] = head[alive]
+        self.grid[alive, head[alive]] = SNAKE
+
+        # Столкновение с яблоком: с активной пилюлей змейка растёт на 2 блока и получает 3 очка
+        reward = np.zeros(self.n, dtype=np.int64)
+        eaten = rows[cell == APPLE]
+        with_pill = self.pill_timer[eaten] > 0
+        reward[eaten] = 1 + 2 * with_pill
+        self.grow[eaten] += 1 + with_pill
+        self.apple[eaten] = self._spawn(eaten, APPLE)
+
+        # Столкновение с пилюлькой
+        eaten = rows[cell == PILL]
+        reward[eaten] += 1
+        self.grow[eaten] += 1
+        self.pill_timer[eaten] = PILL_TIME
+        self.pill[eaten] = -1
+
+        # Столкновение с быстрой пилюлькой
+        eaten = rows[cell == FAST_PILL]
+        self.fast_pill_timer[eaten] = FAST_PILL_TIME
+        self.fast_pill[eaten] = -1
+
+        self.score += reward
+        self.fast_pill_timer -= self.fast_pill_timer > 0
+        self.pill_timer -= self.pill_timer > 0
+
+        # Генерация пилюль
+        chance = self.rng.integers(0, 101, self.n) == 0
+        spawn = rows[chance & (self.pill < 0) & ~done]
+        self.pill[spawn] = self._spawn(spawn, PILL)
+        chance = self.rng.integers(0, 201, self.n) == 0
+        spawn = rows[chance & (self.fast_pill < 0) & (self.fast_pill_timer == 0) & ~done]
+        self.fast_pill[spawn] = self._spawn(spawn, FAST_PILL)
+
+        # Законченные игры начинаются заново
+        score = self.score.copy()
+        finished = rows[done]
+        if len(finished):
+            self.reset(finished)
+        return BatchState(reward, done, cause, score)
+
+    def random_actions(self):
+        """
+        Действия бота random_policy для всех игр: с вероятностью 1 к 5 случайный поворот
+        :return:
+        """
+        actions = self.rng.integers(0, 4, self.n)
+        actions[self.rng.integers(0, 5, self.n) != 0] = -1
+        return actions
@@ -0,0 +1,1115 @@
+"""
+Бенчмарки игры змейка
+
+Запуск всех бенчмарков:
+    python bench.py
+Запуск выбранных:
+    python bench.py engine
+
+Отрисовка измеряется без окна (SDL_VIDEODRIVER=dummy) и без ограничения частоты кадров.
+"""
+import os
+import random
+import sys
+import time
+
+import engine
+
+
+def bench_engine(seconds: float = 2.0):
+    """
+    Сравнение скорости тиков без графики и с отрисовкой
+    :param seconds: Время каждого замера
+    :return:
+    """
+    print('Тики в секунду: без графики против отрисовки в pygame (поле 50x40)')
+    for difficulty in (1, 4):
+        game = engine.Engine(50, 40, difficulty)
+        ticks = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            engine.play(game, max_ticks=1000)
+            ticks += game.ticks
+        headless = ticks / (time.perf_counter() - start)
+
+        rendered = _bench_rendered(difficulty, seconds)
+        print(f'  сложность {difficulty}: без графики {headless:12.0f} тик/с | '
+              f'с отрисовкой {rendered:8.0f} тик/с | x{headless / rendered:.0f}')
+
+
+def _make_game(difficulty=1, width=50, height=40, view=(50, 40), arena=0):
+    """
+    Создание игры с отрисовкой без настоящего окна и звука, по умолчанию окно 50x40 клеток
+    :return:
+    """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    import main
+
+    return main.Game(width, height, difficulty, view=view, arena=arena)
+
+
+def _check_full_redraw(game, state):
+    """
+    Кадр из изменившихся клеток должен совпадать с полной перерисовкой пиксель в пиксель.
+    Разноцветная змейка случайна и всё равно рисуется целиком, такие кадры не сравниваются
+    :param game: main.Game сразу после game.draw(state)
+    :param state: Состояние, с которым рисовался кадр
+    :return: True, если кадр сравнивался
+    """
+    import pygame
+
+    if game.snake.is_pill(False):
+        return False
+    frame = pygame.image.tobytes(game.display, 'RGB')
+    game.redraw = True
+    game.draw(state)
+    if pygame.image.tobytes(game.display, 'RGB') != frame:
+        raise AssertionError(f'кадр из изменений не совпал с полной перерисовкой на тике {game.engine.ticks}')
+    return True
+
+
+def bench_load(repeat: int = 20):
+    """
+    Время запуска игры и загрузки уровней
+    :param repeat: Сколько раз загружается каждый уровень
+    :return:
+    """
+    start = time.perf_counter()
+    game = _make_game()
+    print(f'Запуск игры: {(time.perf_counter() - start) * 1000:.1f} мс')
+    for difficulty in (1, 2, 3, 4):
+        game.difficulty = difficulty
+        start = time.perf_counter()
+        for i in range(repeat):
+            game.new_game()
+        elapsed = (time.perf_counter() - start) / repeat
+        print(f'  загрузка уровня {difficulty}: {elapsed * 1000:7.2f} мс ({len(game.engine.wall_cells)} блоков)')
+
+
+def _bench_rendered(difficulty, seconds):
+    """
+    Тики в секунду в игровом цикле с отрисовкой, но без clock.tick
+    :return:
+    """
+    import pygame
+
+    game = _make_game(difficulty)
+    ticks = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        game.new_game()
+        state = game.engine.reset()
+        game.snake = game.engine.snake
+        while not state.done and game.engine.ticks < 1000:
+            state = game.engine.step(engine.random_policy(game.engine))
+            pygame.event.pump()
+            pygame.display.update(game.draw(state))
+        ticks += game.engine.ticks
+    return ticks / (time.perf_counter() - start)
+
+
+def serpentine_policy(game):
+    """
+    Змейка обходит поле змейкой по строкам и не врезается в себя, пока не заполнит поле
+    :return:
+    """
+    snake = game.snake
+    if snake.direction == 'down':
+        return 'left' if snake.x == game.width - 1 else 'right'
+    if snake.direction == 'right' and snake.x == game.width - 1:
+        return 'down'
+    if snake.direction == 'left' and snake.x == 0:
+        return 'down'
+    return None
+
+
+def bench_grid(size: int = 200, window: int = 10000):
+    """
+    Стоимость тика по мере роста змейки до заполнения большого поля
+    :param size: Сторона поля
+    :param window: Сколько тиков в одном замере
+    :return:
+    """
+    print(f'Стоимость тика от длины змейки (поле {size}x{size}, сетка занятости)')
+    game = engine.Engine(size, size)
+    game.snake.direction = 'right'
+    game.snake.grow = size * size  # Змейка растёт каждый тик
+    while len(game.snake.body) + window < size * size * 0.95 and not game.done:
+        start = time.perf_counter()
+        for i in range(window):
+            game.step(serpentine_policy(game))
+        elapsed = time.perf_counter() - start
+        print(f'  длина {len(game.snake.body):7d}: {elapsed / window * 1e6:6.2f} мкс/тик')
+
+
+def bench_spawn(size: int = 200, fill: float = 0.95, count: int = 100000):
+    """
+    Появление предметов на почти заполненном поле: список свободных клеток
+    против прежнего перебора случайных клеток до первой свободной
+    :param size: Сторона поля
+    :param fill: Доля занятых клеток
+    :param count: Количество появлений
+    :return:
+    """
+    print(f'Появление предмета на поле {size}x{size}, занято {fill:.0%}')
+    cells = [(x, y) for y in range(size) for x in range(size)]
+    random.shuffle(cells)
+    game = engine.Engine(size, size, walls=cells[:int(len(cells) * fill)])
+
+    start = time.perf_counter()
+    for i in range(count):
+        x, y = game.spawn(engine.APPLE)
+        game._release(y * size + x)
+    sampler = (time.perf_counter() - start) / count
+
+    start = time.perf_counter()
+    tries = 0
+    for i in range(count):
+        while True:
+            tries += 1
+            x = random.randint(1, size - 2)
+            y = random.randint(1, size - 2)
+            if game.is_free(x, y):
+                break
+    retry = (time.perf_counter() - start) / count
+
+    print(f'  список свободных клеток: {sampler * 1e6:6.2f} мкс | '
+          f'перебор: {retry * 1e6:6.2f} мкс ({tries / count:.1f} попыток в среднем)')
+
+
+def bench_render(seconds: float = 3.0, check_every: int = 20):
+    """
+    Время кадра: полная перерисовка против перерисовки изменившихся клеток
+    :param seconds: Время каждого замера
+    :param check_every: Каждый какой кадр из изменений сравнивается с полной перерисовкой (вне замера)
+    :return:
+    """
+    import pygame
+
+    print('Время отрисовки кадра (поле 50x40)')
+    for difficulty in (3, 4):
+        game = _make_game(difficulty)
+        for full in (True, False):
+            game.new_game()
+            frames = 0
+            checked = 0
+            total = 0
+            start = time.perf_counter()
+            while time.perf_counter() - start < seconds:
+                state = game.engine.step(engine.random_policy(game.engine))
+                if state.done:
+                    game.new_game()
+                # Новая игра сама требует полной перерисовки
+                game.redraw = game.redraw or full
+                frame_start = time.perf_counter()
+                pygame.display.update(game.draw(state))
+                total += time.perf_counter() - frame_start
+                frames += 1
+                if not full and frames % check_every == 0:
+                    checked += _check_full_redraw(game, state)
+            name = 'весь экран ' if full else 'изменения  '
+            check = f' | совпало с полной перерисовкой: {checked}' if not full else ''
+            print(f'  сложность {difficulty}, {name}: {total / frames * 1000:6.3f} мс/кадр, '
+                  f'{frames / total:7.0f} кадров/с{check}')
+
+
+def bench_levels():
+    """
+    Генерация уровней: чистый Python против NumPy
+    :return:
+    """
+    print('Генерация уровня: Python против NumPy')
+    engine.generate_level_grid(4, 50, 40)  # Прогрев NumPy
+    for width, height in ((50, 40), (500, 500), (2000, 2000)):
+        for difficulty in (2, 3, 4):
+            start = time.perf_counter()
+            engine.generate_level_python(difficulty, width, height)
+            python = time.perf_counter() - start
+            start = time.perf_counter()
+            engine.generate_level_grid(difficulty, width, height)
+            vectorized = time.perf_counter() - start
+            print(f'  {width}x{height}, сложность {difficulty}: Python {python * 1000:9.2f} мс | '
+                  f'NumPy {vectorized * 1000:7.2f} мс')
+
+
+def bench_batch(seconds: float = 3.0):
+    """
+    Пакетная среда против цикла по отдельным играм
+    :param seconds: Время каждого замера
+    :return:
+    """
+    import batch
+
+    print('Суммарные шаги в секунду (поле 50x40, сложность 3, бот random_policy)')
+    games = [engine.Engine(50, 40, 3) for i in range(64)]
+    steps = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for game in games:
+            if game.step(engine.random_policy(game)).done:
+                game.reset()
+        steps += len(games)
+    print(f'  цикл по Engine:        {steps / (time.perf_counter() - start):10.0f} шаг/с')
+
+    for n in (64, 1024, 4096):
+        env = batch.BatchEngine(n, 50, 40, 3)
+        steps = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            env.step(env.random_actions())
+            steps += n
+        print(f'  BatchEngine, {n:4d} игр: {steps / (time.perf_counter() - start):10.0f} шаг/с')
+
+
+def bench_replay(games: int = 200):
+    """
+    Запись игр и их повтор: размер записи, скорость повтора и совпадение результата
+    :param games: Количество игр
+    :return:
+    """
+    import replay
+
+    print(f'Повтор {games} записанных игр (поле 50x40, бот random_policy)')
+    records = []
+    finals = []
+    for i in range(games):
+        game = engine.Engine(50, 40, i % 4 + 1, seed=i)
+        engine.play(game, max_ticks=5000)
+        records.append(replay.to_bytes(replay.record(game)))
+        finals.append((game.snake.score, tuple(game.snake.body), bytes(game.grid)))
+
+    ticks = 0
+    mismatches = 0
+    start = time.perf_counter()
+    for data, final in zip(records, finals):
+        game, state = replay.simulate(replay.from_bytes(data))
+        ticks += game.ticks
+        mismatches += (game.snake.score, tuple(game.snake.body), bytes(game.grid)) != final
+    elapsed = time.perf_counter() - start
+    size = sum(len(data) for data in records)
+    print(f'  {size / games:.0f} байт на игру ({size * 8 / ticks:.2f} бит на тик) | '
+          f'повтор {ticks / elapsed:.0f} тик/с | расхождений: {mismatches}')
+
+
+def bench_records(count: int = 1000000, top: int = 37):
+    """
+    Рекорды: чтение и сортировка всего records.txt против запросов к индексу в SQLite
+    :param count: Количество рекордов
+    :param top: Размер страницы рекордов
+    :return:
+    """
+    import tempfile
+
+    from records import RecordStore
+
+    print(f'Рекорды: {count} записей, страница из {top} лучших')
+    with tempfile.TemporaryDirectory() as directory:
+        text = os.path.join(directory, 'records.txt')
+        with open(text, 'w') as file:
+            for i in range(count):
+                file.write(f'{random.randint(1, 500)} | {random.randint(1, 4)} | 17.12.2022 16:47:28\n')
+
+        # Как раньше в show_records: прочитать всё, разобрать и отсортировать
+        start = time.perf_counter()
+        with open(text, 'r') as file:
+            records = file.readlines()
+        records.sort(key=lambda x: int(x.split(' | ')[0]), reverse=True)
+        records[:top]
+        print(f'  records.txt, чтение и сортировка: {(time.perf_counter() - start) * 1000:8.1f} мс')
+
+        store = RecordStore(os.path.join(directory, 'records.db'))
+        start = time.perf_counter()
+        store.import_text(text)
+        print(f'  перенос в SQLite:                 {(time.perf_counter() - start) * 1000:8.1f} мс')
+
+        start = time.perf_counter()
+        store.top(top)
+        print(f'  SQLite, лучшие на всех уровнях:   {(time.perf_counter() - start) * 1000:8.3f} мс')
+        start = time.perf_counter()
+        store.top(top, offset=top * 100, difficulty=3)
+        print(f'  SQLite, страница 101, уровень 3:  {(time.perf_counter() - start) * 1000:8.3f} мс')
+
+        start = time.perf_counter()
+        for i in range(100000):
+            store.add(random.randint(1, 500), random.randint(1, 4))
+        store.flush()
+        print(f'  запись пачками: {100000 / (time.perf_counter() - start):.0f} рекордов/с')
+        store.close()
+
+
+def _submit_scores(client, count, batch):
+    """
+    Процесс-игрок: отправляет рекорды писателю по одному или пачками
+    :return:
+    """
+    if batch == 1:
+        for i in range(count):
+            client.submit(random.randint(1, 500), random.randint(1, 4), '17.12.2022 16:47:28')
+    else:
+        for i in range(0, count, batch):
+            client.submit_many([(random.randint(1, 500), random.randint(1, 4), '17.12.2022 16:47:28')
+                                for j in range(batch)])
+
+
+def bench_sink(processes: int = 4, count: int = 25000):
+    """
+    Рекорды из многих процессов через одного писателя
+    :param processes: Количество процессов-игроков
+    :param count: Рекордов от каждого процесса
+    :return:
+    """
+    import multiprocessing
+    import tempfile
+
+    from records import RecordStore, ScoreSink
+
+    print(f'Запись рекордов из {processes} процессов по {count} от каждого')
+    for batch in (1, 100):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'records.db')
+            start = time.perf_counter()
+            with ScoreSink(path) as sink:
+                players = [multiprocessing.Process(target=_submit_scores, args=(sink.client(), count, batch))
+                           for i in range(processes)]
+                for player in players:
+                    player.start()
+                for player in players:
+                    player.join()
+            elapsed = time.perf_counter() - start
+            store = RecordStore(path)
+            written = store.count()
+            store.close()
+            print(f'  по {batch:3d} за сообщение: {written / elapsed:8.0f} рекордов/с, '
+                  f'записано {written} из {processes * count}')
+
+
+def bench_timestep(seconds: float = 3.0):
+    """
+    Игровой цикл с фиксированным шагом: скорость игры, частота кадров и загрузка процессора
+    :param seconds: Время каждого замера
+    :return:
+    """
+    import pygame
+
+    print('Игровой цикл (сложность 3, 9 тиков/с по правилам игры)')
+    game = _make_game(3)
+    clock = pygame.time.Clock()
+    for fps, smooth in ((60, True), (144, True), (60, False)):
+        game.fps = fps
+        game.smooth = smooth
+        game.new_game()
+        frames = 0
+        ticks = 0
+        start = time.perf_counter()
+        cpu = time.process_time()
+        while time.perf_counter() - start < seconds:
+            pygame.event.pump()
+            game.action = game.action or engine.random_policy(game.engine)
+            if not game.advance():
+                ticks += game.engine.ticks
+                game.new_game()
+            clock.tick(game.fps)
+            frames += 1
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu
+        ticks += game.engine.ticks
+        print(f'  {fps} кадров/с, плавно: {"да " if smooth else "нет"} | {frames / elapsed:5.1f} кадров/с, '
+              f'{ticks / elapsed:5.1f} тиков/с, процессор {cpu / elapsed:4.0%}')
+
+
+def bench_profile(seconds: float = 3.0, path=None):
+    """
+    Время этапов кадра в игровом цикле без ограничения частоты кадров и цена замеров в движке
+    :param seconds: Время замера
+    :param path: Куда сохранить время кадров (CSV или JSON), по умолчанию не сохраняется
+    :return:
+    """
+    import pygame
+
+    from profiler import FrameProfiler, PHASES
+
+    game = _make_game(3)
+    game.show_profile = True
+    game.new_game()
+    profiler = game.profiler
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        profiler.start_frame()
+        pygame.event.pump()
+        game.action = game.action or engine.random_policy(game.engine)
+        profiler.mark('input')
+        if not game.advance():
+            game.new_game()
+        profiler.end_frame()
+        # Без clock.tick кадры идут чаще тиков, поэтому время игры сдвигается вручную
+        game.last_time -= 1 / 60
+    if path:
+        profiler.dump(path)
+
+    p50, p99 = profiler.percentiles()
+    frames = len(profiler.rows)
+    print(f'Кадры с отрисовкой (сложность 3): {frames} кадров, p50 {p50 * 1000:.2f} мс, p99 {p99 * 1000:.2f} мс')
+    totals = [sum(row[2 + i] for row in profiler.rows) for i in range(len(PHASES))]
+    for phase, total in zip(PHASES, totals):
+        print(f'  {phase:9} {total / frames * 1000:7.3f} мс/кадр  {total / sum(totals):5.1%}')
+
+    # Цена отметок в движке: тики без таймера и с таймером
+    for timer in (None, FrameProfiler()):
+        game = engine.Engine(50, 40, 3, seed=1)
+        game.timer = timer
+        ticks = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            state = game.reset()
+            while not state.done and game.ticks < 1000:
+                state = game.step(engine.random_policy(game))
+            ticks += game.ticks
+        rate = ticks / (time.perf_counter() - start)
+        print(f'  движок {"с таймером " if timer else "без таймера"}: {rate:9.0f} тик/с')
+
+
+# Запуск игры в отдельном процессе: время импорта main.py, первого кадра (заставки) и первого кадра меню
+_STARTUP = '''
+import os, sys, time
+start = time.perf_counter()
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['SDL_AUDIODRIVER'] = 'dummy'
+import pygame
+import main
+imported = time.perf_counter()
+with_menu = 'pygame_menu' in sys.modules
+game = main.Game(50, 40)
+game.draw_splash()
+splash = time.perf_counter()
+game.menu.draw(game.display)
+pygame.display.flip()
+print(imported - start, splash - start, time.perf_counter() - start, with_menu)
+'''
+
+
+def bench_startup(repeat: int = 5):
+    """
+    Холодный запуск: от старта процесса до первого кадра меню
+    :param repeat: Сколько раз запускать
+    :return:
+    """
+    import subprocess
+
+    results = []
+    for i in range(repeat):
+        output = subprocess.run([sys.executable, '-c', _STARTUP], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+        results.append([float(value) for value in output[-4:-1]])
+    imported, splash, menu = (sorted(column)[repeat // 2] * 1000 for column in zip(*results))
+    print(f'Холодный запуск (медиана из {repeat}): импорт main {imported:.0f} мс '
+          f'(pygame_menu при импорте: {output[-1] == "True"}), первый кадр {splash:.0f} мс, меню {menu:.0f} мс')
+
+
+def bench_autopilot(games: int = 10, max_ticks: int = 5000):
+    """
+    Автопилот: решений в секунду, время одного решения и счёт по сравнению со случайным ботом
+    :param games: Игр на каждом уровне сложности
+    :param max_ticks: Ограничение длины игры
+    :return:
+    """
+    from autopilot import Autopilot
+
+    print(f'Автопилот (поле 50x40, {games} игр до {max_ticks} тиков)')
+    for difficulty in (1, 2, 3, 4):
+        pilot = Autopilot()
+        times = []
+        scores = []
+        random_scores = []
+        for seed in range(games):
+            game = engine.Engine(50, 40, difficulty, seed=seed)
+            state = game.reset()
+            while not state.done and game.ticks < max_ticks:
+                start = time.perf_counter()
+                action = pilot(game)
+                times.append(time.perf_counter() - start)
+                state = game.step(action)
+            scores.append(state.score)
+            random.seed(seed)
+            random_scores.append(engine.play(engine.Engine(50, 40, difficulty, seed=seed), max_ticks=max_ticks).score)
+        times.sort()
+        print(f'  сложность {difficulty}: {len(times) / sum(times):8.0f} решений/с, '
+              f'p50 {times[len(times) // 2] * 1e6:5.1f} мкс, p99 {times[len(times) * 99 // 100] * 1e6:5.0f} мкс, '
+              f'поисков на тик {pilot.searches / len(times):.3f} | '
+              f'средний счёт {sum(scores) / games:6.1f} (случайный бот {sum(random_scores) / games:.1f})')
+
+
+def bench_hamilton(ticks: int = 20000):
+    """
+    Решатель на гамильтоновом цикле: время построения цикла, доля клеток поля на цикле,
+    решений в секунду и заполнение небольших полей на многих зёрнах
+    :param ticks: Тиков игры для замера решений в секунду
+    :return:
+    """
+    import hamilton
+
+    print('Гамильтонов цикл: построение и ходы')
+    for width, height in ((50, 40), (200, 160), (500, 400), (1000, 800)):
+        for difficulty in (1, 2):
+            game = engine.Engine(width, height, difficulty, seed=1)
+            start = time.perf_counter()
+            cycle = hamilton.cycle_for(game)
+            built = time.perf_counter() - start
+            solver = hamilton.Solver()
+            state = game.reset()
+            start = time.perf_counter()
+            while not state.done and game.ticks < ticks:
+                state = game.step(solver(game))
+            elapsed = time.perf_counter() - start
+            print(f'  {width}x{height}, сложность {difficulty}: цикл {built * 1000:7.1f} мс, '
+                  f'на цикле {cycle.size / game.wall_grid.count(0):6.1%} клеток | '
+                  f'{game.ticks / elapsed:7.0f} тик/с с решателем')
+
+    # Игра идёт до заполнения поля, смерти или застревания: если яблоко не съедено за четыре
+    # обхода цикла, змейка уже только кружит (яблоко отрезано стенами или заход за ним не помещается)
+    print('Заполнение поля (яблоки появляются только внутри поля, без крайних рядов)')
+    for difficulty, width, height, seeds in ((1, 20, 16, 50), (1, 30, 24, 10), (2, 20, 16, 10)):
+        results = {}
+        start = time.perf_counter()
+        for seed in range(seeds):
+            game = engine.Engine(width, height, difficulty, seed=seed)
+            solver = hamilton.Solver()
+            state = game.reset()
+            stall = 4 * hamilton.cycle_for(game).size
+            score = eaten = 0
+            while not state.done and game.apple is not None and game.ticks - eaten < stall:
+                state = game.step(solver(game))
+                if state.score != score:
+                    score = state.score
+                    eaten = game.ticks
+            if game.apple is None:
+                result = 'поле заполнено'
+            elif state.done:
+                result = f'смерть ({state.cause}, длина {state.length} из {game.wall_grid.count(0)})'
+            else:
+                result = f'змейка кружит (длина {state.length} из {game.wall_grid.count(0)})'
+            results.setdefault(result, []).append(seed)
+        elapsed = time.perf_counter() - start
+        print(f'  {width}x{height}, сложность {difficulty}, {seeds} игр за {elapsed:.1f} с:')
+        for result, numbers in results.items():
+            seeds_text = '' if result == 'поле заполнено' else f', зёрна {", ".join(map(str, numbers))}'
+            print(f'    {result}: игр {len(numbers)}{seeds_text}')
+        # На лёгком уровне все клетки на цикле, и решатель обязан заполнить поле
+        if difficulty == 1 and list(results) != ['поле заполнено']:
+            raise AssertionError(f'решатель не заполнил поле {width}x{height} на лёгком уровне')
+
+
+def bench_snapshot(repeat: int = 5000):
+    """
+    Снимки игры: размер, время снимка и восстановления, перебор ходов с откатом
+    :param repeat: Сколько раз повторять замер
+    :return:
+    """
+    import zlib
+
+    from autopilot import Autopilot
+
+    print('Снимки игры (сложность 3)')
+    for width, height in ((50, 40), (200, 160)):
+        game = engine.Engine(width, height, 3, seed=1)
+        game.reset()
+        pilot = Autopilot()
+        while game.ticks < 1000 and not game.done:
+            game.step(pilot(game))
+        data = game.snapshot()
+        start = time.perf_counter()
+        for i in range(repeat):
+            game.snapshot()
+        taken = (time.perf_counter() - start) / repeat
+        start = time.perf_counter()
+        for i in range(repeat):
+            game.restore(data)
+        restored = (time.perf_counter() - start) / repeat
+        print(f'  {width}x{height}, длина {game.snake.length}: {len(data)} байт '
+              f'({len(zlib.compress(data))} со сжатием) | '
+              f'снимок {taken * 1e6:.1f} мкс, восстановление {restored * 1e6:.1f} мкс')
+
+    # Перебор: перед каждым тиком пробуются все ходы на 8 тиков вперёд с откатом к снимку
+    game = engine.Engine(50, 40, 3, seed=2)
+    state = game.reset()
+    branches = 0
+    start = time.perf_counter()
+    while not state.done and game.ticks < 300:
+        data = game.snapshot(actions=False)
+        best = None
+        for action in engine.DIRECTIONS:
+            for i in range(8):
+                result = game.step(action if i == 0 else None)
+                if result.done:
+                    break
+            branches += 1
+            # Лучшая ветвь: змейка жива, больше счёт, ближе к яблоку
+            distance = abs(result.head[0] - game.apple[0]) + abs(result.head[1] - game.apple[1]) if game.apple else 0
+            if best is None or (not result.done, result.score, -distance) > best[0]:
+                best = ((not result.done, result.score, -distance), action)
+            game.restore(data)
+        state = game.step(best[1])
+    elapsed = time.perf_counter() - start
+    print(f'  перебор с откатом: {branches / elapsed:.0f} ветвей/с (по 8 тиков), '
+          f'счёт {state.score} за {game.ticks} тиков')
+
+
+def _measure(create):
+    """
+    Память и количество блоков памяти, которые остаются после вызова
+    :param create: Функция без аргументов
+    :return: Результат вызова, байты и блоки
+    """
+    import gc
+    import tracemalloc
+
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    result = create()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    gc.collect()
+    return result, size, sys.getallocatedblocks() - blocks
+
+
+def bench_entities(ticks: int = 20000):
+    """
+    Представление стен, змейки и предметов: память на клетку, объекты и выделения памяти на тик
+    :param ticks: Сколько тиков замерять
+    :return:
+    """
+    import tracemalloc
+
+    import pygame
+
+    from autopilot import Autopilot
+
+    print('Память уровня (сложность 4)')
+    engine.Engine(50, 40, 4, seed=0)  # Прогрев NumPy и кэшей
+    for width, height in ((50, 40), (500, 400), (1000, 800)):
+        game, size, blocks = _measure(lambda: engine.Engine(width, height, 4, seed=1))
+        print(f'  движок {width}x{height}: {size / (width * height):5.1f} байт на клетку, '
+              f'{blocks} объектов, стен {len(game.wall_cells)}')
+    for width, height in ((50, 40), (150, 120)):
+        game = _make_game(4)
+        # Поле больше окна: игра рисует фон под размер поверхности, а не окна
+        game.width, game.height = width, height
+        game.display = pygame.Surface((width * 20, height * 20))
+        size, blocks = _measure(lambda: game.new_game(1))[1:]
+        print(f'  игра {width}x{height}: {size / (width * height):5.1f} байт на клетку, {blocks} объектов')
+
+    game = engine.Engine(50, 40, 3, seed=1)
+    pilot = Autopilot()
+    done = 0
+    transient = 0
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    for i in range(ticks):
+        action = pilot(game)
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        if game.step(action).done:
+            game.reset()
+            done += 1
+        transient += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    print(f'Тик движка: {transient / ticks:.0f} байт временных выделений на тик, '
+          f'{(sys.getallocatedblocks() - blocks) / ticks:.3f} блоков остаётся на тик ({done} игр)')
+
+
+def bench_telemetry(ticks: int = 200000):
+    """
+    Поток событий: скорость тиков без событий и с получателями, размер файлов событий
+    :param ticks: Сколько тиков в каждом замере
+    :return:
+    """
+    import tempfile
+
+    from telemetry import EventStats, EventWriter, Telemetry
+
+    print(f'Поток событий (поле 50x40, сложность 3, {ticks} тиков, раздача раз в 10 тиков)')
+    with tempfile.TemporaryDirectory() as folder:
+        variants = (('без событий', None), ('буфер без получателей', ()),
+                    ('счётчики', ('stats',)), ('счётчики и бинарный файл', ('stats', 'game.events')),
+                    ('NDJSON файл', ('game.ndjson',)))
+        for name, consumers in variants:
+            events = None
+            if consumers is not None:
+                events = Telemetry()
+                for consumer in consumers:
+                    events.subscribe(EventStats() if consumer == 'stats' else
+                                     EventWriter(os.path.join(folder, consumer)))
+            game = engine.Engine(50, 40, 3, seed=1)
+            game.events = events
+            rng = random.Random(1)
+            state = game.reset()
+            pumped = 0
+            start = time.perf_counter()
+            for i in range(ticks):
+                if state.done:
+                    state = game.reset()
+                state = game.step(rng.choice(engine.CODE_ACTIONS) if rng.random() < 0.2 else None)
+                # В игре события раздаются раз в кадр, при 60 кадрах и 6-20 тиках в секунду это реже
+                if events is not None and i % 10 == 0:
+                    pump_start = time.perf_counter()
+                    events.pump()
+                    pumped += time.perf_counter() - pump_start
+            if events is not None:
+                events.close()
+            elapsed = time.perf_counter() - start
+            sizes = ', '.join(f'{consumer}: {os.path.getsize(os.path.join(folder, consumer)) / events.written:.1f} '
+                              f'байт на событие' for consumer in consumers or () if consumer != 'stats')
+            print(f'  {name:26}: {ticks / elapsed:7.0f} тик/с, раздача {pumped / elapsed * 100:4.1f}% времени'
+                  + (f' | {sizes}' if sizes else ''))
+
+
+def bench_soak(games: int = 500):
+    """
+    Долгая сессия: много игр подряд через сцены меню, выбора уровня, игры, паузы и конца игры.
+    Сцены сменяются так же, как в Game.loop, а нажатия клавиш подаются событиями pygame.
+    Память между играми не должна расти
+    :param games: Сколько игр сыграть
+    :return:
+    """
+    import gc
+    import tempfile
+    import tracemalloc
+
+    import pygame
+
+    import main
+    from autopilot import Autopilot
+    from records import RecordStore
+
+    game = _make_game()
+    game.autopilot = Autopilot()
+    folder = tempfile.TemporaryDirectory()
+    game.records = RecordStore(os.path.join(folder.name, 'records.db'))  # Рекорды бенчмарка не попадают в игру
+    game.replay_path = os.path.join(folder.name, 'last_game.replay')  # И запись последней игры тоже
+    # Клавиша, которая уводит из каждой сцены: Enter в меню, Esc в игре, Enter в паузе, любая в конце игры
+    keys = {main.MENU: pygame.K_RETURN, main.LEVELS: pygame.K_RETURN, main.PLAYING: pygame.K_ESCAPE,
+            main.PAUSED: pygame.K_RETURN, main.GAME_OVER: pygame.K_SPACE}
+
+    print(f'Сессия из {games} игр подряд (поле 50x40, автопилот)')
+    tracemalloc.start()
+    scene = main.MENU
+    played = 0
+    ticks = 0
+    start = time.perf_counter()
+    while played < games:
+        if scene == main.PLAYING:
+            # Вместо ожидания в реальном времени игра получает 3 секунды одним кадром, потом пауза
+            game.lag = 3.0
+            game.advance()
+        # test=True: pygame_menu принимает событие без физического нажатия клавиши
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=keys[scene], mod=0, unicode='', test=True))
+        if scene == main.GAME_OVER:
+            ticks += game.engine.ticks
+            played += 1
+        scene = game.scenes[scene]()
+        if scene == main.MENU and played % (games // 5) == 0:
+            gc.collect()
+            print(f'  игр {played:5}: память {tracemalloc.get_traced_memory()[0] / 1024:8.1f} КБ, '
+                  f'блоков {sys.getallocatedblocks():7}, объектов {len(gc.get_objects()):7}, '
+                  f'{(time.perf_counter() - start) / played * 1000:.0f} мс на игру, {ticks / played:.0f} тиков')
+    tracemalloc.stop()
+    game.records.close()
+    folder.cleanup()
+
+
+def bench_idle(seconds: float = 2.0):
+    """
+    Загрузка процессора на экранах, где игрок ничего не делает: меню, рекорды, пауза, конец игры
+    :param seconds: Сколько секунд держать каждый экран
+    :return:
+    """
+    import tempfile
+
+    import pygame
+
+    import main
+    from records import RecordStore
+
+    game = _make_game()
+    folder = tempfile.TemporaryDirectory()
+    game.records = RecordStore(os.path.join(folder.name, 'records.db'))  # Экран рекордов не трогает базу игры
+    game.replay_path = os.path.join(folder.name, 'last_game.replay')  # Конец игры не заменяет запись последней игры
+    game.build_menus()  # Меню и pygame.init - до замера
+    print(f'Процессор на неподвижных экранах ({seconds:.0f} с на экран)')
+    for scene, key in ((main.MENU, pygame.K_RETURN), (main.RECORDS, pygame.K_ESCAPE),
+                       (main.PAUSED, pygame.K_ESCAPE), (main.GAME_OVER, None)):
+        if scene in (main.PAUSED, main.GAME_OVER):
+            game.new_game()
+        pygame.event.clear()
+        # Клавиша, которая закрывает экран, приходит таймером pygame через заданное время
+        if key is not None:
+            pygame.time.set_timer(pygame.event.Event(pygame.KEYDOWN, key=key, mod=0, unicode='', test=True),
+                                  int(seconds * 1000), 1)
+        start = time.perf_counter()
+        cpu = time.process_time()
+        game.scenes[scene]()
+        elapsed = time.perf_counter() - start
+        print(f'  {scene:10}: {(time.process_time() - cpu) / elapsed * 100:5.1f}% процессора за {elapsed:.1f} с')
+
+
+def bench_viewport(frames: int = 2000):
+    """
+    Камера на полях больше окна: время кадра должно зависеть от размера окна, а не поля
+    :param frames: Сколько кадров в каждом замере
+    :return:
+    """
+    import pygame
+
+    print('Время кадра с камерой (окно 50x40, сложность 3)')
+    for width, height in ((50, 40), (500, 500), (2000, 2000), (5000, 5000)):
+        start = time.perf_counter()
+        game = _make_game(3, width, height)
+        game.new_game(1)
+        created = time.perf_counter() - start
+        rng = random.Random(1)
+        times = {True: [], False: []}
+        checked = 0
+        for i in range(frames):
+            action = rng.choice(engine.CODE_ACTIONS) if rng.random() < 0.1 else None
+            state = game.engine.step(action)
+            if state.done:
+                game.new_game()
+                state = None
+            # Каждый десятый кадр - полная перерисовка, как после сдвига камеры или паузы
+            full = i % 10 == 0
+            game.redraw = game.redraw or full
+            frame_start = time.perf_counter()
+            pygame.display.update(game.draw(state))
+            times[full].append(time.perf_counter() - frame_start)
+            if i % 10 == 5:
+                checked += _check_full_redraw(game, state)
+        changes = sum(times[False]) / len(times[False]) * 1000
+        full = sum(times[True]) / len(times[True]) * 1000
+        print(f'  поле {width}x{height}: создание {created:6.2f} с | изменения {changes:.3f} мс, '
+              f'весь экран {full:.3f} мс/кадр, кусков стен в кэше {len(game.chunks)} | '
+              f'совпало с полной перерисовкой {checked}')
+    checked, cameras = _check_camera()
+    print(f'  поле 200x160: окно камеры совпало с полной отрисовкой в {checked} кадрах, положений камеры {cameras}')
+
+
+def _check_camera(width: int = 200, height: int = 160, frames: int = 2000, check_every: int = 10):
+    """
+    Окно камеры должно совпадать пиксель в пиксель с той же игрой, нарисованной на всё поле
+    и обрезанной по камере. Игры рисуются по очереди, так как окно pygame у них общее.
+    Счёт и окантовка скоростной пилюли привязаны к окну, а не к полю, поэтому область счёта
+    не сравнивается, а кадры с окантовкой и разноцветной змейкой пропускаются
+    :param width: Ширина поля
+    :param height: Высота поля
+    :param frames: Сколько тиков играет камера
+    :param check_every: Каждый какой кадр сравнивается
+    :return: Количество сравненных кадров и положений камеры
+    """
+    import pygame
+
+    from autopilot import Autopilot
+
+    game = _make_game(3, width, height)
+    game.new_game(1)
+    policy = Autopilot()  # Бот ходит за яблоками по всему полю, камера едет за ним
+    checkpoints = []
+    for i in range(frames):
+        state = game.engine.step(policy(game.engine))
+        if state.done:
+            game.new_game(1)
+            state = None
+        game.draw(state)
+        if i % check_every or game.snake.is_pill(False) or game.engine.fast_pill_timer > 0:
+            continue
+        camera = (game.camera_x * game.block_size, game.camera_y * game.block_size)
+        checkpoints.append((game.engine.snapshot(), camera, game.display.copy(), game.score_rect.copy()))
+
+    full = _make_game(3, width, height, view=(width, height))
+    full.new_game(1)
+    for snapshot, (x, y), frame, score in checkpoints:
+        full.restore(snapshot)
+        full.draw()
+        crop = full.display.subsurface(pygame.Rect((x, y), frame.get_size())).copy()
+        # Счёт нарисован в углу окна у камеры и в углу поля у полной отрисовки
+        for rect in (score, full.score_rect.move(-x, -y)):
+            frame.fill((0, 0, 0), rect)
+            crop.fill((0, 0, 0), rect)
+        if pygame.image.tobytes(frame, 'RGB') != pygame.image.tobytes(crop, 'RGB'):
+            raise AssertionError(f'окно камеры в {x // game.block_size, y // game.block_size} '
+                                 f'не совпало с полной отрисовкой поля')
+    return len(checkpoints), len({camera for snapshot, camera, frame, score in checkpoints})
+
+
+def _pairwise_collisions(arena):
+    """
+    Проверка столкновений перебором пар, для сравнения с сеткой арены:
+    голова каждой змейки сравнивается с телом каждой змейки
+    :param arena: arena.Arena
+    :return: Количество голов, которые во что-то врезались
+    """
+    crashed = 0
+    snakes = [snake for snake in arena.snakes if snake is not None]
+    for snake in snakes:
+        head = snake.body[0]
+        for other in snakes:
+            if head in other.body and (other is not snake or snake.body.count(head) > 1):
+                crashed += 1
+                break
+    return crashed
+
+
+def bench_arena(ticks: int = 200, size: int = 1000):
+    """
+    Арена: время тика при 10, 100 и 1000 змейках коротких и длинных. Тик должен расти с числом змеек
+    и не зависеть от их длины. Для сравнения - проверка столкновений перебором пар на том же поле
+    :param ticks: Сколько тиков в каждом замере
+    :param size: Сторона поля
+    :return:
+    """
+    from arena import Arena
+
+    print(f'Арена {size}x{size}, сложность 3, {ticks} тиков')
+    for count in (10, 100, 1000):
+        for length in (3, 100):
+            arena = Arena(size, size, snakes=count, seed=1, length=length)
+            # Змейки дорастают до начальной длины за length тиков
+            for i in range(length):
+                arena.step()
+            start = time.perf_counter()
+            for i in range(ticks):
+                arena.step()
+            elapsed = (time.perf_counter() - start) / ticks
+            line = (f'  {count:4} змеек, длина {length:3}: {elapsed * 1000:8.2f} мс/тик, '
+                    f'{elapsed / count * 1e6:5.1f} мкс на змейку, длина всех змеек {arena.total_length():6}')
+            # Перебор пар растёт как число змеек на сумму их длин, на 1000 длинных змейках он слишком долгий
+            if count * arena.total_length() <= 10 ** 7:
+                repeat = 20
+                start = time.perf_counter()
+                for i in range(repeat):
+                    _pairwise_collisions(arena)
+                line += f' | перебор пар {(time.perf_counter() - start) / repeat * 1000:8.2f} мс/тик'
+            print(line)
+
+    # Отрисовка арены в окне: клетки, изменённые всеми змейками, против полной перерисовки
+    from arena import careful_policy
+
+    for width, height in ((50, 40), (100, 80)):
+        game = _make_game(3, width, height, arena=50)
+        game.new_game(1)
+        checked = 0
+        for i in range(1000):
+            state = game.engine.step(careful_policy(game.engine, game.snake))
+            if state.done:
+                game.new_game()
+            game.draw(state)
+            if i % 5 == 0:
+                checked += _check_full_redraw(game, state)
+        print(f'  отрисовка арены {width}x{height}, 50 змеек: совпало с полной перерисовкой {checked} кадров')
+
+
+async def _check_mirror(clients: int = 20, seconds: float = 3.0):
+    """
+    Игра клиента, собранная из сообщений (server.Mirror), должна совпадать с игрой на сервере.
+    Сервер работает в этом же процессе, боты нажимают случайные направления, а после каждого
+    сообщения сетка, тело змейки и зерно сравниваются с движком сессии, если он на том же тике
+    той же игры (иначе сервер уже ушёл вперёд и сообщения ещё в пути)
+    :param clients: Количество подключений
+    :param seconds: Сколько секунд играют боты
+    :return: Количество сравнений и начатых игр
+    """
+    import asyncio
+
+    import server
+
+    game_server = server.GameServer()
+    port = await game_server.start('127.0.0.1', 0)
+    loop = asyncio.get_running_loop()
+    end = loop.time() + seconds
+    checked = games = 0
+
+    async def client(number):
+        nonlocal checked, games
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        rng = random.Random(number)
+        mirror = server.Mirror()
+        session = None
+        while loop.time() < end:
+            await mirror.read(reader)
+            if rng.random() < 0.3:
+                writer.write(bytes((rng.randint(0, 4),)))
+            if session is None:
+                address = writer.get_extra_info('sockname')
+                session = next(session for session in game_server.sessions
+                               if session.writer.get_extra_info('peername') == address)
+            engine = session.engine
+            if mirror.done or mirror.ticks != engine.ticks or mirror.game_seed != engine.game_seed:
+                continue
+            if mirror.grid != engine.grid or list(mirror.body) != list(engine.snake.body):
+                raise AssertionError(f'клиент {number} разошёлся с сервером на тике {engine.ticks}')
+            checked += 1
+        games += mirror.games
+        writer.close()
+
+    try:
+        await asyncio.gather(*(client(number) for number in range(clients)))
+    finally:
+        await game_server.stop()
+    return checked, games
+
+
+def bench_server(seconds: float = 8.0):
+    """
+    Сервер игр под нагрузкой: сервер в отдельном процессе, боты подключаются из этого.
+    Для каждого числа подключений сервер запускается заново
+    :param seconds: Сколько секунд длится каждый замер
+    :return:
+    """
+    import asyncio
+    import signal
+    import subprocess
+
+    import loadtest
+
+    print(f'Сервер игр, сложность 3, поле 50x40, {seconds:.0f} с на замер')
+    checked, games = asyncio.run(_check_mirror())
+    print(f'  игра клиента совпала с сервером: {checked} проверок, игр {games}')
+    for clients in (10, 100, 1000, 2000):
+        process = subprocess.Popen([sys.executable, 'server.py', '--port', '0'], stdout=subprocess.PIPE, text=True)
+        port = int(process.stdout.readline().rsplit(':', 1)[1])
+        stats, elapsed = asyncio.run(loadtest.run_load('127.0.0.1', port, clients, seconds))
+        process.send_signal(signal.SIGINT)
+        summary = process.communicate()[0].strip()
+        print('  ' + loadtest.report(stats, elapsed, clients))
+        print(f'        сервер: {summary}')
+
+
+BENCHMARKS = {
+    'engine': bench_engine,
+    'grid': bench_grid,
+    'spawn': bench_spawn,
+    'load': bench_load,
+    'render': bench_render,
+    'levels': bench_levels,
+    'batch': bench_batch,
+    'replay': bench_replay,
+    'records': bench_records,
+    'sink': bench_sink,
+    'timestep': bench_timestep,
+    'profile': bench_profile,
+    'startup': bench_startup,
+    'autopilot': bench_autopilot,
+    'hamilton': bench_hamilton,
+    'snapshot': bench_snapshot,
+    'entities': bench_entities,
+    'telemetry': bench_telemetry,
+    'soak': bench_soak,
+    'idle': bench_idle,
+    'viewport': bench_viewport,
+    'arena': bench_arena,
+    'server': bench_server,
+}
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
@@ -0,0 +1,736 @@
+"""
+Ядро игры змейка без графики (headless)
+
+Модуль содержит только правила игры и не зависит от pygame: здесь нет окна,
+микшера и ограничения частоты кадров, поэтому игра считается так быстро,
+как позволяет процессор. Используется как основа для отрисовки в main.py,
+а так же для массовых симуляций (балансировка, оценка ботов).
+
+Пример:
+    engine = Engine(50, 40, difficulty=3)
+    state = engine.reset()
+    while not state.done:
+        state = engine.step('left')
+"""
+import random
+import struct
+from array import array
+from collections import deque, namedtuple
+
+try:
+    import numpy as np
+except ImportError:  # Без NumPy уровни генерируются на чистом Python
+    np = None
+
+# Смещение головы для каждого направления
+DIRECTIONS = {'right': (1, 0), 'left': (-1, 0), 'up': (0, -1), 'down': (0, 1)}
+# Противоположные направления (разворот на месте запрещён)
+OPPOSITE = {'right': 'left', 'left': 'right', 'up': 'down', 'down': 'up'}
+
+# Коды действий для записи игры: 0 - не менять направление
+ACTION_CODES = {None: 0, 'right': 1, 'left': 2, 'up': 3, 'down': 4}
+CODE_ACTIONS = [None, 'right', 'left', 'up', 'down']
+
+# Скорость игры (тиков в секунду) для каждого уровня сложности
+CLOCK_SPEEDS = {1: 6, 2: 7, 3: 9, 4: 10}
+
+# Содержимое клетки в сетке занятости
+EMPTY = 0
+WALL = 1
+SNAKE = 2
+APPLE = 3
+PILL = 4
+FAST_PILL = 5
+
+PILL_TIME = 120  # Длительность действия пилюли в тиках
+FAST_PILL_TIME = 200  # Длительность действия быстрой пилюли в тиках
+FAST_PILL_SPEEDUP = 2  # Во сколько раз быстрая пилюля ускоряет игру
+
+# События тика для телеметрии (Engine.events, см. telemetry.py). Значение события:
+# ход - код направления, яблоко и пилюля - счёт после них, смерть - индекс причины в CAUSES
+EVENT_MOVE = 0
+EVENT_APPLE = 1
+EVENT_PILL = 2
+EVENT_FAST_PILL_START = 3
+EVENT_FAST_PILL_END = 4
+EVENT_DEATH = 5
+
+# Результат одного тика:
+#   head - новая клетка головы, tail - освободившаяся клетка хвоста (или None),
+#   done - игра окончена, cause - причина смерти ('self', 'wall' или на арене 'snake')
+State = namedtuple('State', ['head', 'tail', 'score', 'length', 'done', 'cause'])
+
+# Снимок игры (Engine.snapshot): заголовок, затем сетка занятости, клетки тела по x и по y,
+# список свободных клеток, состояние генератора случайных чисел и записанные действия.
+# Заголовок: метка, ширина, высота, сложность, зерно уровня, генератор уровня, зерно игры, тики, счёт,
+# длина, рост, таймеры пилюль, направление, причина смерти, яблоко, пилюля, быстрая пилюля (-1 - нет),
+# длина тела, количество свободных клеток, количество действий
+SNAPSHOT_MAGIC = b'SNS2'
+SNAPSHOT = struct.Struct('<4sHHBQBQIIIIHHBBiiiIII')
+CAUSES = [None, 'self', 'wall', 'snake']  # 'snake' - удар в другую змейку на арене
+
+# Генераторы уровня. Одно зерно даёт разные стены на NumPy и на чистом Python,
+# поэтому записи и снимки хранят, каким генератором построено поле
+GENERATOR_PYTHON = 0
+GENERATOR_NUMPY = 1
+
+
+class Snake:
+    __slots__ = ('x', 'y', 'length', 'body', 'direction', 'score', 'pill_timer', 'grow')
+
+    def __init__(self, x, y, length=1, rng=random):
+        """
+        Инициализация змейки
+        :param x: Координата x
+        :param y: Координата y
+        :param length: Длина змейки
+        :param rng: Генератор случайных чисел
+        """
+        self.x = x  # Координата x
+        self.y = y  # Координата y
+        self.length = length  # Длина змейки
+        self.body = deque((x, y) for i in range(length))  # Тело змейки, голова слева, хвост справа
+        self.direction = rng.choice(['right', 'left', 'up', 'down'])  # Случайное направление движения змейки
+        self.score = 0  # Счёт игрока
+        self.pill_timer = 0  # Таймер для пилюли
+        self.grow = 0  # Сколько ещё клеток змейка вырастет при следующих движениях
+
+    def move(self, width=None, height=None):
+        """
+        Движение змейки
+        :param width: Ширина поля, если задана - змейка переносится на другую сторону
+        :param height: Высота поля
+        :return: Клетка хвоста, которая освободилась, или None если змейка растёт
+        """
+        dx, dy = DIRECTIONS[self.direction]
+        self.x += dx
+        self.y += dy
+
+        # Перенос змейки на другую сторону поля
+        if width is not None:
+            self.x %= width
+            self.y %= height
+
+        self.body.appendleft((self.x, self.y))
+        # Пока змейка растёт, хвост остаётся на месте
+        if self.grow:
+            self.grow -= 1
+            return None
+        return self.body.pop()
+
+    def add_body(self, points=1):
+        """
+        Добавление тела змейке
+        :return:
+        """
+        self.length += 1
+        self.grow += 1
+        self.score += points
+
+    def eat_pill(self):
+        """
+        Съедание пилюли
+        :return:
+        """
+        self.pill_timer = PILL_TIME  # Устанавливаем таймер на 120 кадров
+
+        self.length += 1
+        self.grow += 1
+        self.score += 1
+
+    def is_pill(self, with_update: bool = True):
+        """
+        Проверка на пилюлю
+        :return:
+        """
+        if self.pill_timer > 0:
+            if with_update:
+                self.pill_timer -= 1
+            return True
+        else:
+            return False
+
+
+def _add_border(walls, width, height):
+    """
+    Генерация блоков по кругу вокруг поля
+    :return:
+    """
+    for i in range(width):
+        walls.append((i, 0))
+        walls.append((i, height - 1))
+    for i in range(height):
+        walls.append((0, i))
+        walls.append((width - 1, i))
+
+
+# Стены для уровней сложности на поле 50x40: количество стен, минимальная и максимальная длина.
+# На больших полях количество стен растёт пропорционально площади
+LEVEL_WALLS = {2: (20, 0, 0), 3: (15, 3, 10), 4: (50, 1, 5)}
+BASE_AREA = 50 * 40
+
+
+def _wall_count(difficulty, width, height):
+    """
+    Количество стен с учётом размера поля
+    :return:
+    """
+    return max(1, round(LEVEL_WALLS[difficulty][0] * width * height / BASE_AREA))
+
+
+def _random_walls(width, height, count, min_length, max_length, rng=random):
+    """
+    Генерация стен случайным блужданием
+    :param count: Количество стен
+    :param min_length: Минимальная длина стены
+    :param max_length: Максимальная длина стены
+    :param rng: Генератор случайных чисел
+    :return: Список клеток стен
+    """
+    walls = []
+    for i in range(count):
+        # Выбираем направление стены
+        direction = rng.randint(0, 3)
+        # Стартовая позиция стены
+        x = rng.randint(0, width - 1)
+        y = rng.randint(0, height - 1)
+        for length in range(rng.randint(min_length, max_length)):
+            # С вероятностью 1 к 5 стена поворачивает
+            if rng.randint(0, 4) == 0:
+                direction = rng.randint(0, 3)
+            if direction == 0:
+                x += 1
+            elif direction == 1:
+                x -= 1
+            elif direction == 2:
+                y += 1
+            elif direction == 3:
+                y -= 1
+            walls.append((x, y))
+    return walls
+
+
+def generate_level_python(difficulty, width, height, rng=random):
+    """
+    Генерация стен для уровня сложности на чистом Python
+    :param difficulty: 1 - лёгкий, 2 - средний, 3 - сложный, 4 - супер сложный
+    :param width: Ширина поля
+    :param height: Высота поля
+    :return: Список клеток (x, y) со стенами
+    """
+    if difficulty == 1:
+        return []
+
+    count = _wall_count(difficulty, width, height)
+    if difficulty == 2:
+        # Генерация случайных блоков
+        walls = [(rng.randint(0, width - 1), rng.randint(0, height - 1)) for i in range(count)]
+    else:
+        walls = _random_walls(width, height, count, *LEVEL_WALLS[difficulty][1:], rng)
+
+    # Удаление блоков за пределами поля и блоков из центра поля с радиусом 6
+    walls = [(x, y) for x, y in walls
+             if 0 <= x < width and 0 <= y < height
+             and not (abs(width // 2 - x) < 6 and abs(height // 2 - y) < 6)]
+    _add_border(walls, width, height)
+
+    # Удаление повторяющихся блоков с сохранением порядка
+    return list(dict.fromkeys(walls))
+
+
+def generate_level_grid(difficulty, width, height, rng=random):
+    """
+    Векторная генерация стен на NumPy, подходит для полей в тысячи клеток по стороне.
+    Все стены блуждают одновременно: шаги каждой стены - строка матрицы
+    :param difficulty: 1 - лёгкий, 2 - средний, 3 - сложный, 4 - супер сложный
+    :param width: Ширина поля
+    :param height: Высота поля
+    :return: Массив uint8 размера (height, width), где WALL - стена
+    """
+    grid = np.zeros((height, width), dtype=np.uint8)
+    if difficulty == 1:
+        return grid
+
+    # Генератор NumPy берёт зерно из rng, поэтому зерно игры задаёт и эти уровни
+    rng = np.random.default_rng(rng.getrandbits(64))
+    count = _wall_count(difficulty, width, height)
+    x0 = rng.integers(0, width, count)
+    y0 = rng.integers(0, height, count)
+    if difficulty == 2:
+        # Генерация случайных блоков
+        xs, ys = x0, y0
+    else:
+        min_length, max_length = LEVEL_WALLS[difficulty][1:]
+        steps = np.arange(max_length)
+        lengths = rng.integers(min_length, max_length + 1, count)
+        # С вероятностью 1 к 5 стена поворачивает: направление на шаге - последнее выбранное до него
+        turns = rng.integers(0, 5, (count, max_length)) == 0
+        new_directions = rng.integers(0, 4, (count, max_length))
+        last_turn = np.maximum.accumulate(np.where(turns, steps, -1), axis=1)
+        directions = np.where(last_turn >= 0,
+                              np.take_along_axis(new_directions, np.maximum(last_turn, 0), axis=1),
+                              rng.integers(0, 4, count)[:, None])
+        # Направления 0..3: вправо, влево, вниз, вверх
+        xs = x0[:, None] + np.cumsum(np.array([1, -1, 0, 0])[directions], axis=1)
+        ys = y0[:, None] + np.cumsum(np.array([0, 0, 1, -1])[directions], axis=1)
+        used = steps < lengths[:, None]
+        xs = xs[used]
+        ys = ys[used]
+
+    # Повторяющиеся блоки пропадают сами, так как клетка сетки просто отмечается ещё раз
+    inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    grid[ys[inside], xs[inside]] = WALL
+
+    # Удаление блоков из центра поля с радиусом 6
+    grid[max(0, height // 2 - 5):height // 2 + 6, max(0, width // 2 - 5):width // 2 + 6] = EMPTY
+
+    # Блоки по кругу вокруг поля
+    grid[0, :] = WALL
+    grid[-1, :] = WALL
+    grid[:, 0] = WALL
+    grid[:, -1] = WALL
+    return grid
+
+
+def default_generator():
+    """
+    Генератор уровня по умолчанию: NumPy, если он установлен
+    :return: GENERATOR_NUMPY или GENERATOR_PYTHON
+    """
+    return GENERATOR_PYTHON if np is None else GENERATOR_NUMPY
+
+
+def check_generator(generator):
+    """
+    Проверка, что генератор уровня доступен
+    :param generator: GENERATOR_NUMPY, GENERATOR_PYTHON или None (по умолчанию)
+    :return: Генератор
+    """
+    if generator is None:
+        return default_generator()
+    if generator not in (GENERATOR_PYTHON, GENERATOR_NUMPY):
+        raise ValueError(f'Неизвестный генератор уровня: {generator}')
+    if generator == GENERATOR_NUMPY and np is None:
+        raise ValueError('Уровень построен генератором на NumPy, а NumPy не установлен')
+    return generator
+
+
+def _min(values):
+    """
+    Наименьшее число в массиве array. Длинные массивы просматривает NumPy, если он есть,
+    на коротких вызов NumPy дороже встроенного min
+    :return:
+    """
+    if np is not None and len(values) > 1000:
+        return int(np.frombuffer(values, dtype=values.typecode).min())
+    return min(values)
+
+
+def _max(values):
+    """
+    Наибольшее число в массиве array
+    :return:
+    """
+    if np is not None and len(values) > 1000:
+        return int(np.frombuffer(values, dtype=values.typecode).max())
+    return max(values)
+
+
+def _free_positions(free, cells):
+    """
+    Позиции клеток в массиве свободных клеток
+    :param free: Массив индексов свободных клеток
+    :param cells: Количество клеток поля
+    :return: Массив, где для каждой клетки её позиция в free или -1
+    """
+    if free and not (0 <= _min(free) and _max(free) < cells):
+        raise ValueError('Индекс свободной клетки вне поля')
+    if np is not None:
+        free_pos = np.full(cells, -1, dtype=np.int32)
+        free_pos[np.frombuffer(free, dtype=np.int32)] = np.arange(len(free), dtype=np.int32)
+        return array('i', free_pos.tobytes())
+    free_pos = array('i', [-1]) * cells
+    for pos, index in enumerate(free):
+        free_pos[index] = pos
+    return free_pos
+
+
+class Engine:
+    def __init__(self, width: int, height: int, difficulty: int = 1, walls=None, seed=None, generator=None):
+        """
+        Инициализация игры без графики
+        :param width: Ширина поля в клетках
+        :param height: Высота поля в клетках
+        :param difficulty: Уровень сложности
+        :param walls: Готовый список стен, по умолчанию генерируется по уровню сложности
+        :param seed: Зерно уровня, по умолчанию случайное. Одно и то же зерно даёт те же стены и те же игры
+        :param generator: Генератор уровня (GENERATOR_NUMPY или GENERATOR_PYTHON), по умолчанию
+            NumPy, если он установлен. Для повтора записи нужен тот же генератор, что при записи
+        """
+        self.width = width
+        self.height = height
+        self.difficulty = difficulty
+        self.seed = random.randrange(2 ** 63) if seed is None else seed
+        # Генератор уровня: стены и зёрна для каждой следующей игры на этом поле
+        self.level_random = random.Random(self.seed)
+        self.custom_walls = walls is not None  # Стены заданы вручную, а не по зерну
+        self.generator = check_generator(generator)
+
+        # Стены не меняются между играми, поэтому сетка со стенами строится один раз.
+        # Сами стены хранятся массивом индексов клеток, а не списком пар (x, y)
+        if walls is None and self.generator == GENERATOR_NUMPY:
+            grid = generate_level_grid(difficulty, width, height, self.level_random).ravel()
+            self.wall_grid = grid.tobytes()
+            self.wall_cells = array('i', np.flatnonzero(grid).astype(np.int32).tobytes())
+        else:
+            if walls is None:
+                walls = generate_level_python(difficulty, width, height, self.level_random)
+            self.wall_cells = array('i', dict.fromkeys(y * width + x for x, y in walls))
+            wall_grid = bytearray(width * height)
+            for index in self.wall_cells:
+                wall_grid[index] = WALL
+            self.wall_grid = bytes(wall_grid)
+        # Замер времени этапов тика (profiler.FrameProfiler), None - без замеров
+        self.timer = None
+        # Получатель событий тика (telemetry.Telemetry), None - события не создаются
+        self.events = None
+        self.reset()
+
+    @property
+    def walls(self):
+        """
+        Клетки (x, y) со стенами, список строится при каждом обращении
+        :return:
+        """
+        width = self.width
+        return [(index % width, index // width) for index in self.wall_cells]
+
+    def reset(self, seed=None):
+        """
+        Начало новой игры на том же поле
+        :param seed: Зерно игры, по умолчанию берётся из генератора уровня
+        :return: Начальное состояние
+        """
+        # Все случайности игры (направление змейки, предметы) идут через свой генератор
+        self.game_seed = self.level_random.randrange(2 ** 63) if seed is None else seed
+        self.random = random.Random(self.game_seed)
+        self.actions = bytearray()  # Запись действий, по байту на тик
+
+        self._reset_grid()
+        width = self.width
+
+        self.snake = Snake(width // 2, self.height // 2, rng=self.random)
+        for x, y in self.snake.body:
+            self._occupy(y * width + x, SNAKE)
+
+        self.pill = None
+        self.fast_pill = None
+        self.fast_pill_timer = 0
+        self.ticks = 0
+        self.done = False
+        self.cause = None
+        self.apple = self.spawn(APPLE)
+        return State((self.snake.x, self.snake.y), None, 0, self.snake.length, False, None)
+
+    def _reset_grid(self):
+        """
+        Сетка занятости и список свободных клеток пустого поля со стенами
+        :return:
+        """
+        width = self.width
+        height = self.height
+        # Сетка занятости: по одному байту на клетку, индекс клетки y * width + x
+        self.grid = bytearray(self.wall_grid)
+
+        # Свободные клетки внутри поля (без крайних рядов), где могут появляться предметы.
+        # free - массив индексов клеток, free_pos - позиция клетки в этом массиве или -1,
+        # поэтому добавление, удаление и выбор случайной клетки работают за O(1)
+        if np is not None:
+            free = np.frombuffer(self.wall_grid, dtype=np.uint8).reshape(height, width) == EMPTY
+            free[[0, -1], :] = False
+            free[:, [0, -1]] = False
+            self.free = array('i', np.flatnonzero(free).astype(np.int32).tobytes())
+        else:
+            self.free = array('i', [y * width + x for y in range(1, height - 1) for x in range(1, width - 1)
+                                    if self.grid[y * width + x] == EMPTY])
+        self.free_pos = _free_positions(self.free, width * height)
+
+    def snapshot(self, actions: bool = True):
+        """
+        Снимок текущего состояния игры для сохранения, отката и перебора ходов.
+        Восстанавливается в игре на том же поле (Engine с тем же размером, уровнем, зерном и генератором)
+        :param actions: Сохранять ли записанные действия (нужны для записи игры, см. replay.py)
+        :return: bytes
+        """
+        snake = self.snake
+        width = self.width
+        xs, ys = zip(*snake.body)
+        random_state = self.random.getstate()
+        header = SNAPSHOT.pack(
+            SNAPSHOT_MAGIC, width, self.height, self.difficulty, self.seed, self.generator, self.game_seed,
+            self.ticks, snake.score, snake.length, snake.grow, snake.pill_timer, self.fast_pill_timer,
+            ACTION_CODES[snake.direction], CAUSES.index(self.cause),
+            -1 if self.apple is None else self.apple[1] * width + self.apple[0],
+            -1 if self.pill is None else self.pill[1] * width + self.pill[0],
+            -1 if self.fast_pill is None else self.fast_pill[1] * width + self.fast_pill[0],
+            len(xs), len(self.free), len(self.actions) if actions else 0)
+        return b''.join((header, self.grid, array('H', xs).tobytes(), array('H', ys).tobytes(),
+                         self.free.tobytes(), array('I', random_state[1]).tobytes(),
+                         self.actions if actions else b''))
+
+    def restore(self, data):
+        """
+        Возврат игры к снимку. Снимок проверяется целиком до изменения игры,
+        поэтому после ValueError игра остаётся прежней
+        :param data: Результат snapshot()
+        :return: Состояние игры в момент снимка
+        """
+        (magic, width, height, difficulty, seed, generator, game_seed, ticks, score, length, grow, pill_timer,
+         fast_pill_timer, direction, cause, apple, pill, fast_pill, body_length, free_length,
+         actions_length) = SNAPSHOT.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError('Это не снимок игры')
+        if (width, height, difficulty) != (self.width, self.height, self.difficulty) or \
+                ((seed, generator) != (self.seed, self.generator) and not self.custom_walls):
+            raise ValueError('Снимок сделан на другом поле')
+        cells = width * height
+        if len(data) != SNAPSHOT.size + cells + body_length * 4 + free_length * 4 + 625 * 4 + actions_length or \
+                not body_length or direction >= len(CODE_ACTIONS) or cause >= len(CAUSES) or \
+                max(apple, pill, fast_pill) >= cells:
+            raise ValueError('Снимок повреждён')
+
+        offset = SNAPSHOT.size
+        grid = bytearray(data[offset:offset + cells])
+        offset += cells
+        xs = array('H', data[offset:offset + body_length * 2])
+        offset += body_length * 2
+        ys = array('H', data[offset:offset + body_length * 2])
+        offset += body_length * 2
+        free = array('i', data[offset:offset + free_length * 4])
+        offset += free_length * 4
+        random_state = array('I', data[offset:offset + 625 * 4])
+        offset += 625 * 4
+        if _max(xs) >= width or _max(ys) >= height:
+            raise ValueError('Снимок повреждён')
+        # Позиции свободных клеток не сохраняются, а считаются заново по массиву свободных клеток
+        free_pos = _free_positions(free, cells)
+        # Состояние генератора проверяет сам random.setstate, поэтому оно ставится первым из изменений
+        self.random.setstate((3, tuple(random_state), None))
+        self.grid = grid
+        self.free = free
+        self.free_pos = free_pos
+        self.actions = bytearray(data[offset:offset + actions_length])
+
+        self.game_seed = game_seed
+        # Змейка меняется на месте, так как на неё ссылается отрисовка
+        snake = self.snake
+        snake.body = deque(zip(xs, ys))
+        snake.x, snake.y = snake.body[0]
+        snake.direction = CODE_ACTIONS[direction]
+        snake.score = score
+        snake.length = length
+        snake.grow = grow
+        snake.pill_timer = pill_timer
+        self.fast_pill_timer = fast_pill_timer
+        self.apple = None if apple < 0 else (apple % width, apple // width)
+        self.pill = None if pill < 0 else (pill % width, pill // width)
+        self.fast_pill = None if fast_pill < 0 else (fast_pill % width, fast_pill // width)
+        self.ticks = ticks
+        self.cause = CAUSES[cause]
+        self.done = self.cause is not None
+        return State((snake.x, snake.y), None, score, length, self.done, self.cause)
+
+    @property
+    def clock_speed(self):
+        """
+        Скорость игры в тиках в секунду: по уровню сложности и с учётом быстрой пилюли.
+        Считается заново каждый раз, поэтому не накапливает ошибку при ускорении и замедлении
+        :return:
+        """
+        if self.fast_pill_timer > 0:
+            return CLOCK_SPEEDS[self.difficulty] * FAST_PILL_SPEEDUP
+        return CLOCK_SPEEDS[self.difficulty]
+
+    def cell(self, x, y):
+        """
+        Что находится в клетке (EMPTY, WALL, SNAKE, APPLE, PILL, FAST_PILL)
+        :return:
+        """
+        return self.grid[y * self.width + x]
+
+    def is_free(self, x, y):
+        """
+        Проверка на то, что клетка не занята стеной, змейкой или предметом
+        :return:
+        """
+        return self.grid[y * self.width + x] == EMPTY
+
+    def _occupy(self, index, item):
+        """
+        Занять клетку и убрать её из списка свободных
+        :param index: Индекс клетки
+        :param item: Что теперь находится в клетке
+        :return:
+        """
+        self.grid[index] = item
+        pos = self.free_pos[index]
+        if pos >= 0:
+            # Удаление обменом с последним элементом
+            last = self.free.pop()
+            if last != index:
+                self.free[pos] = last
+                self.free_pos[last] = pos
+            self.free_pos[index] = -1
+
+    def _release(self, index):
+        """
+        Освободить клетку и вернуть её в список свободных
+        :param index: Индекс клетки
+        :return:
+        """
+        self.grid[index] = EMPTY
+        x = index % self.width
+        y = index // self.width
+        if 0 < x < self.width - 1 and 0 < y < self.height - 1 and self.free_pos[index] < 0:
+            self.free_pos[index] = len(self.free)
+            self.free.append(index)
+
+    def random_free_cell(self):
+        """
+        Случайная свободная клетка внутри поля (без крайних рядов)
+        :return: Клетка (x, y) или None, если свободных клеток нет
+        """
+        if not self.free:
+            return None
+        index = self.free[self.random.randrange(len(self.free))]
+        return index % self.width, index // self.width
+
+    def spawn(self, item):
+        """
+        Размещение предмета в случайной свободной клетке
+        :param item: APPLE, PILL или FAST_PILL
+        :return: Клетка (x, y) или None, если поле заполнено
+        """
+        cell = self.random_free_cell()
+        if cell is not None:
+            self._occupy(cell[1] * self.width + cell[0], item)
+        return cell
+
+    def step(self, action=None):
+        """
+        Один тик игры
+        :param action: Новое направление ('right', 'left', 'up', 'down') или None
+        :return: Состояние после тика
+        """
+        snake = self.snake
+        if self.done:
+            return State((snake.x, snake.y), None, snake.score, snake.length, True, self.cause)
+
+        self.actions.append(ACTION_CODES[action])
+        # Проверка на движение в противоположную сторону и длина змейки
+        if action is not None and (action != OPPOSITE[snake.direction] or snake.score == 0):
+            snake.direction = action
+
+        grid = self.grid
+        width = self.width
+        timer = self.timer
+        events = self.events
+        tail = snake.move(width, self.height)
+        if tail is not None:
+            self._release(tail[1] * width + tail[0])
+        head = snake.body[0]
+        index = snake.y * width + snake.x
+        self.ticks += 1
+        if events is not None:
+            events.emit(self.ticks, EVENT_MOVE, snake.x, snake.y, ACTION_CODES[snake.direction])
+        if timer is not None:
+            timer.mark('move')
+
+        # Проверка на столкновение с собой и с блоком
+        cell = grid[index]
+        if cell == SNAKE or cell == WALL:
+            if timer is not None:
+                timer.mark('collision')
+            return self._die(head, tail, 'self' if cell == SNAKE else 'wall')
+        self._occupy(index, SNAKE)
+
+        # Проверка на столкновение с яблоком
+        if cell == APPLE:
+            # Если активна пилюля, то увеличиваем длину змейки на дополнительный блок
+            if snake.is_pill(False):
+                snake.score += 1
+                snake.add_body()
+            snake.add_body()
+            self.apple = self.spawn(APPLE)
+            if events is not None:
+                events.emit(self.ticks, EVENT_APPLE, snake.x, snake.y, snake.score)
+
+        # Проверка на столкновение с пилюлькой
+        elif cell == PILL:
+            snake.eat_pill()
+            self.pill = None
+            if events is not None:
+                events.emit(self.ticks, EVENT_PILL, snake.x, snake.y, snake.score)
+
+        # Столкновение с быстрой пилюлькой
+        elif cell == FAST_PILL:
+            self.fast_pill = None
+            self.fast_pill_timer = FAST_PILL_TIME
+            if events is not None:
+                events.emit(self.ticks, EVENT_FAST_PILL_START, snake.x, snake.y, FAST_PILL_TIME)
+
+        # Проверка с таймером быстрой пилюли
+        if self.fast_pill_timer > 0:
+            self.fast_pill_timer -= 1
+            if self.fast_pill_timer == 0 and events is not None:
+                events.emit(self.ticks, EVENT_FAST_PILL_END, snake.x, snake.y, 0)
+
+        snake.is_pill()
+        if timer is not None:
+            timer.mark('collision')
+
+        # Генерация пилюль
+        if self.pill is None and self.random.randint(0, 100) == 0:
+            self.pill = self.spawn(PILL)
+        if self.fast_pill is None and self.random.randint(0, 200) == 0 and self.fast_pill_timer == 0:
+            self.fast_pill = self.spawn(FAST_PILL)
+        if timer is not None:
+            timer.mark('spawn')
+
+        return State(head, tail, snake.score, snake.length, False, None)
+
+    def _die(self, head, tail, cause):
+        """
+        Завершение игры
+        :param cause: Причина смерти
+        :return:
+        """
+        self.done = True
+        self.cause = cause
+        if self.events is not None:
+            self.events.emit(self.ticks, EVENT_DEATH, head[0], head[1], CAUSES.index(cause))
+        return State(head, tail, self.snake.score, self.snake.length, True, cause)
+
+
+def random_policy(engine):
+    """
+    Простейший бот: с вероятностью 1 к 5 поворачивает в случайную сторону
+    :return: Направление или None
+    """
+    if random.randint(0, 4) == 0:
+        return random.choice(['right', 'left', 'up', 'down'])
+    return None
+
+
+def play(engine, policy=random_policy, max_ticks=None):
+    """
+    Игра от начала до конца без графики и без ограничения скорости
+    :param engine: Игра
+    :param policy: Функция, которая по игре возвращает направление
+    :param max_ticks: Ограничение на количество тиков
+    :return: Последнее состояние
+    """
+    state = engine.reset()
+    while not state.done and (max_ticks is None or engine.ticks < max_ticks):
+        state = engine.step(policy(engine))
+    return state
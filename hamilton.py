@@ -0,0 +1,376 @@
+"""
+Решатель на гамильтоновом цикле: змейка, которая заполняет всё поле
+
+По свободным клеткам уровня строится замкнутый путь, проходящий через каждую
+клетку один раз. Змейка, идущая по такому циклу, никогда не врезается в себя,
+а чтобы не обходить всё поле ради каждого яблока, она срезает путь: переходит
+в соседнюю клетку дальше по циклу, если при этом не обгоняет яблоко и не
+приближается к своему хвосту. Когда змейка занимает половину цикла, срезания
+выключаются, и дальше она идёт строго по циклу.
+
+Цикл строится так: поле делится на плитки 2x2 без стен, по плиткам строится
+остовное дерево, и цикл обходит дерево по контуру. Клетки, не попавшие в
+плитки (рядом с одиночными блоками уровня "Средний"), по возможности
+вставляются в цикл парами. Оставшиеся клетки цикл обойти не может (на поле с
+препятствиями гамильтонова цикла может не существовать вовсе), поэтому за
+яблоком в такой клетке змейка заходит с цикла и выходит обратно дальше по нему.
+Поэтому на уровне "Средний" поле заполняется не всегда: змейка кружит по циклу,
+если яблоко отрезано стенами или заход не помещается перед хвостом, а в конце
+игры может стать длиннее цикла и врезаться в себя.
+
+Цикл зависит только от размера поля и стен, поэтому строится один раз на уровень.
+
+Пример:
+    solver = Solver()
+    state = engine.play(Engine(50, 40, difficulty=1), solver)
+"""
+from array import array
+from collections import OrderedDict
+
+from autopilot import Autopilot
+from engine import EMPTY, SNAKE, WALL
+
+# Запас свободных клеток перед хвостом при срезании, не считая роста змейки
+SHORTCUT_MARGIN = 4
+# Срезания выключаются, когда змейка (с будущим ростом) занимает эту долю цикла. Рост от яблок,
+# съеденных уже после срезания (яблоко под пилюлей - две клетки, пилюля - одна), запас не покрывает,
+# а на плотном поле он приводит к удару в хвост. Без срезаний змейка идёт по циклу и не врезается в себя
+SHORTCUT_FILL = 0.5
+
+# Сколько последних уровней хранят свои циклы: цикл поля 1000x800 занимает около 6 МБ
+CYCLE_CACHE_SIZE = 8
+
+# Циклы по уровням от давно использованных к недавним: (ширина, сетка стен) -> Cycle
+_cycles = OrderedDict()
+
+
+def _neighbors(cell, width, height):
+    """
+    Соседи клетки с переходом через край поля
+    :return: Кортеж индексов клеток
+    """
+    x = cell % width
+    y = cell // width
+    return (y * width + (x + 1) % width, y * width + (x - 1) % width,
+            ((y + 1) % height) * width + x, ((y - 1) % height) * width + x)
+
+
+def _direction(head, cell, width, height):
+    """
+    Направление хода из клетки head в соседнюю клетку cell
+    :return:
+    """
+    if cell // width == head // width:
+        return 'right' if cell % width == (head % width + 1) % width else 'left'
+    return 'down' if cell // width == (head // width + 1) % height else 'up'
+
+
+class Cycle:
+    def __init__(self, width: int, height: int, wall_grid):
+        """
+        Построение цикла по свободным клеткам уровня
+        :param width: Ширина поля
+        :param height: Высота поля
+        :param wall_grid: Сетка стен движка (engine.Engine.wall_grid)
+        """
+        self.width = width
+        self.height = height
+        successor = self._tile_cycle(wall_grid)
+        self._insert_pairs(successor, wall_grid)
+
+        # Обход цикла от клетки, где появляется змейка
+        start = (height // 2) * width + width // 2
+        if successor[start] < 0:
+            start = next((cell for cell, after in enumerate(successor) if after >= 0), -1)
+        self.order = array('i')  # Клетки в порядке обхода
+        self.pos = array('i', [-1]) * (width * height)  # Номер клетки в обходе, -1 - клетка вне цикла
+        cell = start
+        while cell >= 0:
+            self.pos[cell] = len(self.order)
+            self.order.append(cell)
+            cell = successor[cell]
+            if cell == start:
+                break
+        self.size = len(self.order)
+
+    def _tile_cycle(self, wall_grid):
+        """
+        Цикл по контуру остовного дерева плиток 2x2.
+        Каждая плитка - маленький цикл по часовой стрелке, а соседние по дереву плитки
+        сливаются заменой двух параллельных рёбер на их общей стороне двумя поперечными
+        :return: Следующая клетка цикла для каждой клетки, -1 - клетка вне цикла
+        """
+        width = self.width
+        height = self.height
+
+        # Сдвиг сетки плиток, при котором без стен остаётся больше всего плиток
+        best = None
+        for offset_x in (0, 1):
+            for offset_y in (0, 1):
+                columns = (width - offset_x) // 2
+                rows = (height - offset_y) // 2
+                tiles = bytearray(columns * rows)
+                for j in range(rows):
+                    top = (offset_y + 2 * j) * width + offset_x
+                    bottom = top + width
+                    for i in range(columns):
+                        x = 2 * i
+                        if not (wall_grid[top + x] or wall_grid[top + x + 1]
+                                or wall_grid[bottom + x] or wall_grid[bottom + x + 1]):
+                            tiles[j * columns + i] = 1
+                count = tiles.count(1)
+                if best is None or count > best[0]:
+                    best = (count, offset_x, offset_y, columns, rows, tiles)
+        count, offset_x, offset_y, columns, rows, tiles = best
+
+        successor = array('i', [-1]) * (width * height)
+        if not count:
+            return successor
+
+        def corner(tile):
+            # Левая верхняя клетка плитки
+            return (offset_y + 2 * (tile // columns)) * width + offset_x + 2 * (tile % columns)
+
+        # Остовное дерево поиском в глубину от плитки, где появляется змейка
+        i = (width // 2 - offset_x) // 2
+        j = (height // 2 - offset_y) // 2
+        start = j * columns + i
+        if not (0 <= i < columns and 0 <= j < rows and tiles[start]):
+            start = tiles.index(1)
+        tiles[start] = 2  # 2 - плитка уже в дереве
+        stack = [start]
+        edges = []
+        while stack:
+            tile = stack[-1]
+            i = tile % columns
+            for near in (tile + 1 if i + 1 < columns else -1, tile + columns if tile + columns < len(tiles) else -1,
+                         tile - 1 if i > 0 else -1, tile - columns):
+                if near >= 0 and tiles[near] == 1:
+                    tiles[near] = 2
+                    edges.append((tile, near))
+                    stack.append(near)
+                    break
+            else:
+                stack.pop()
+
+        # Плитки дерева: цикл по часовой стрелке
+        for tile in range(len(tiles)):
+            if tiles[tile] == 2:
+                top_left = corner(tile)
+                bottom_left = top_left + width
+                successor[top_left] = top_left + 1
+                successor[top_left + 1] = bottom_left + 1
+                successor[bottom_left + 1] = bottom_left
+                successor[bottom_left] = top_left
+
+        # Слияние соседних по дереву плиток
+        for first, second in edges:
+            if first > second:
+                first, second = second, first
+            left_top = corner(first)
+            right_top = corner(second)
+            if second == first + 1:
+                # Правая сторона левой плитки и левая сторона правой
+                successor[left_top + 1] = right_top
+                successor[right_top + width] = left_top + width + 1
+            else:
+                # Нижняя сторона верхней плитки и верхняя сторона нижней
+                successor[left_top + width + 1] = right_top + 1
+                successor[right_top] = left_top + width
+        return successor
+
+    def _insert_pairs(self, successor, wall_grid):
+        """
+        Вставка в цикл соседних пар клеток вне цикла: ребро a -> b заменяется на a -> c -> d -> b,
+        если c соседняя с a, d соседняя с b, а c и d соседние между собой
+        :return:
+        """
+        width = self.width
+        height = self.height
+        outside = [cell for cell in range(width * height) if successor[cell] < 0 and wall_grid[cell] == EMPTY]
+        changed = True
+        while changed:
+            changed = False
+            for first in outside:
+                if successor[first] >= 0:
+                    continue
+                for second in _neighbors(first, width, height):
+                    if second == first or successor[second] >= 0 or wall_grid[second] != EMPTY:
+                        continue
+                    second_neighbors = _neighbors(second, width, height)
+                    for before in _neighbors(first, width, height):
+                        after = successor[before]
+                        if after >= 0 and after in second_neighbors:
+                            successor[before] = first
+                            successor[first] = second
+                            successor[second] = after
+                            changed = True
+                            break
+                    if successor[first] >= 0:
+                        break
+
+    def distance(self, start, end):
+        """
+        Сколько ходов по циклу от клетки start до клетки end
+        :return:
+        """
+        return (self.pos[end] - self.pos[start]) % self.size
+
+
+def cycle_for(game):
+    """
+    Цикл для уровня игры, строится один раз на каждое сочетание размера поля и стен.
+    Хранятся циклы CYCLE_CACHE_SIZE последних уровней, самый давний вытесняется
+    :param game: engine.Engine
+    :return: Cycle
+    """
+    key = (game.width, game.wall_grid)
+    cycle = _cycles.get(key)
+    if cycle is None:
+        cycle = _cycles[key] = Cycle(game.width, game.height, game.wall_grid)
+        if len(_cycles) > CYCLE_CACHE_SIZE:
+            _cycles.popitem(last=False)
+    else:
+        _cycles.move_to_end(key)
+    return cycle
+
+
+class Solver:
+    def __init__(self):
+        """
+        Инициализация решателя, один объект можно использовать для многих игр подряд
+        """
+        self.pilot = Autopilot()  # Запасной бот, если змейка оказалась вне цикла
+        self.route = []  # Оставшиеся клетки захода за яблоком вне цикла, последняя - следующий ход
+        self.detour = None  # Яблоко вне цикла и заход за ним: (яблоко, вход, выход, клетки) или None
+        self.expected = None  # Игра и тик, на котором заход ещё действителен
+
+    def __call__(self, game):
+        """
+        Выбор направления на следующий тик
+        :param game: engine.Engine
+        :return: Направление
+        """
+        cycle = cycle_for(game)
+        snake = game.snake
+        width = game.width
+        height = game.height
+        grid = game.grid
+        pos = cycle.pos
+        head = snake.y * width + snake.x
+        tick = (id(game), game.game_seed, game.ticks)
+
+        # Заход за яблоком вне цикла продолжается, пока змейка идёт по нему и клетки свободны
+        route = self.route
+        if route and (tick != self.expected or route[-1] not in _neighbors(head, width, height)
+                      or grid[route[-1]] in (WALL, SNAKE)):
+            route.clear()
+        self.expected = (id(game), game.game_seed, game.ticks + 1)
+        if not route:
+            if pos[head] < 0:
+                return self.pilot(game)
+            cell = self.choose(game, cycle, head)
+            route = self.route
+        if route:
+            cell = route.pop()
+        return _direction(head, cell, width, height)
+
+    def choose(self, game, cycle, head):
+        """
+        Ход с цикла: к яблоку на цикле со срезанием или ко входу в заход за яблоком вне цикла
+        :return: Следующая клетка; если начинается заход, его клетки кладутся в self.route
+        """
+        snake = game.snake
+        width = game.width
+        grid = game.grid
+        pos = cycle.pos
+
+        # Хвост - первая с конца клетка тела на цикле (клетки захода вне цикла ему не мешают)
+        tail = head
+        for x, y in reversed(snake.body):
+            tail = y * width + x
+            if pos[tail] >= 0:
+                break
+        room = cycle.distance(head, tail) if tail != head else cycle.size
+        room -= snake.grow + SHORTCUT_MARGIN
+
+        target = None
+        if game.apple is not None:
+            apple = game.apple[1] * width + game.apple[0]
+            if pos[apple] >= 0:
+                target = apple
+            else:
+                if self.detour is None or self.detour[0] != apple:
+                    self.detour = (apple, *self.plan_detour(game, cycle, apple))
+                entry, exit_cell, route = self.detour[1:]
+                # Заход пропускает участок цикла между входом и выходом, поэтому хвоста там быть не должно
+                if route and head == entry and cycle.distance(entry, exit_cell) < room \
+                        and all(grid[cell] not in (WALL, SNAKE) for cell in route):
+                    self.route = route[::-1]
+                    return None
+                # До входа змейка идёт по циклу без срезаний: так тело собирается в плотный участок
+                # цикла и перед входом остаётся место для пропуска участка между входом и выходом
+
+        # Ход по циклу, а если есть цель - самый дальний соседний ход по циклу, не дальше цели и хвоста
+        cell = cycle.order[(pos[head] + 1) % cycle.size]
+        if target is not None and len(snake.body) + snake.grow < cycle.size * SHORTCUT_FILL:
+            limit = min(cycle.distance(head, target), room)
+            best = 1
+            for near in _neighbors(head, width, game.height):
+                if pos[near] < 0 or grid[near] in (WALL, SNAKE):
+                    continue
+                distance = cycle.distance(head, near)
+                if best < distance <= limit:
+                    best = distance
+                    cell = near
+        return cell
+
+    @staticmethod
+    def plan_detour(game, cycle, apple):
+        """
+        Заход за яблоком вне цикла: поиск в ширину от яблока по клеткам вне цикла до клеток цикла.
+        Вход и выход выбираются так, чтобы выход был как можно ближе ко входу по циклу,
+        а пути от яблока к ним не пересекались
+        :return: Вход, выход и клетки захода от входа (не включая) до выхода (включая)
+        """
+        width = game.width
+        height = game.height
+        grid = game.grid
+        pos = cycle.pos
+        parent = {apple: None}
+        branch = {apple: apple}  # Первая клетка после яблока на пути к клетке
+        exits = []  # (клетка цикла, клетка вне цикла рядом с ней)
+        frontier = [apple]
+        while frontier:
+            layer = []
+            for cell in frontier:
+                for near in _neighbors(cell, width, height):
+                    if grid[near] == WALL:
+                        continue
+                    if pos[near] >= 0:
+                        exits.append((near, cell))
+                    elif near not in parent:
+                        parent[near] = cell
+                        branch[near] = near if cell == apple else branch[cell]
+                        layer.append(near)
+            frontier = layer
+
+        def path_to(cell):
+            path = []
+            while cell is not None:
+                path.append(cell)
+                cell = parent[cell]
+            return path
+
+        best = None
+        for entry, entry_cell in exits:
+            for exit_cell, last_cell in exits:
+                if entry == exit_cell or (branch[entry_cell] == branch[last_cell] and branch[entry_cell] != apple):
+                    continue
+                distance = cycle.distance(entry, exit_cell)
+                if best is None or distance < best[0]:
+                    best = (distance, entry, exit_cell, entry_cell, last_cell)
+        if best is None:
+            return None, None, []
+        distance, entry, exit_cell, entry_cell, last_cell = best
+        return entry, exit_cell, path_to(entry_cell) + path_to(last_cell)[-2::-1] + [exit_cell]
@@ -0,0 +1,144 @@
+"""
+Нагрузочный тест сервера игр: тысячи подключений-ботов с этого же компьютера
+
+Каждый бот держит свою игру на сервере, собирает её из сообщений (server.Mirror) и
+примерно на каждом пятом тике нажимает случайное направление в случайный момент между
+тиками. Задержка нажатия - время от отправки байта до тика, который его применил:
+на незагруженном сервере это в среднем половина тика, а рост задержки показывает,
+что сервер не успевает. Трафик считается по полезным данным, без заголовков TCP/IP.
+
+Запуск:
+    python main.py server --port 8765
+    python loadtest.py --clients 2000 --seconds 30 --port 8765
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from engine import CLOCK_SPEEDS
+from server import ACK, LEVEL_FLAG, START_FLAG, Mirror
+
+
+class LoadStats:
+    def __init__(self):
+        """
+        Общие счётчики всех ботов
+        """
+        self.connected = 0
+        self.failed = 0  # Не удалось подключиться или соединение оборвалось
+        self.ticks = 0
+        self.games = 0  # Начатых игр
+        self.received = 0  # Получено байт всеми ботами
+        self.latency = []  # Задержки нажатий в секундах
+
+
+async def bot(host, port, stats, rng, delay=0.0):
+    """
+    Один бот: подключение и игра, пока задачу не отменят
+    :param stats: LoadStats
+    :param rng: Генератор случайных чисел
+    :param delay: Через сколько секунд подключиться
+    :return:
+    """
+    loop = asyncio.get_running_loop()
+    await asyncio.sleep(delay)
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        stats.failed += 1
+        return
+    stats.connected += 1
+    mirror = Mirror()
+    sent = None  # Время отправки нажатия, которое ещё не применено
+    waiting = False  # Нажатие запланировано, но ещё не отправлено
+
+    def press():
+        nonlocal sent, waiting
+        waiting = False
+        if not writer.is_closing():
+            writer.write(bytes((rng.randint(1, 4),)))
+            sent = loop.time()
+
+    try:
+        while True:
+            flags = await mirror.read(reader)
+            if flags == LEVEL_FLAG:
+                continue
+            if flags & START_FLAG:
+                stats.games += 1
+                continue
+            stats.ticks += 1
+            if flags & ACK and sent is not None:
+                stats.latency.append(loop.time() - sent)
+                sent = None
+            if sent is None and not waiting and rng.random() < 0.2:
+                waiting = True
+                loop.call_later(rng.random() / CLOCK_SPEEDS[mirror.difficulty], press)
+    except (ConnectionError, asyncio.IncompleteReadError):
+        stats.failed += 1
+    finally:
+        stats.received += mirror.received
+        writer.close()
+
+
+async def run_load(host='127.0.0.1', port=8765, clients=1000, seconds=10.0, ramp=2.0, seed=0):
+    """
+    Нагрузка: clients ботов подключаются в течение ramp секунд и играют seconds секунд
+    :return: LoadStats и фактическое время игры в секундах
+    """
+    loop = asyncio.get_running_loop()
+    stats = LoadStats()
+    rng = random.Random(seed)
+    start = loop.time()
+    # Подключения распределены по времени разгона, чтобы не упереться в очередь accept
+    tasks = [asyncio.create_task(bot(host, port, stats, random.Random(rng.random()), i * ramp / clients))
+             for i in range(clients)]
+    await asyncio.sleep(ramp + seconds)
+    # Боты останавливаются одновременно, без таймаута на каждое сообщение
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return stats, loop.time() - start - ramp / 2
+
+
+def report(stats, elapsed, clients):
+    """
+    Сводка нагрузочного теста
+    :param stats: LoadStats
+    :param elapsed: Время игры в секундах
+    :param clients: Сколько ботов запускалось
+    :return: Строка
+    """
+    latency = sorted(stats.latency) or [0.0]
+    p50 = latency[len(latency) // 2]
+    p99 = latency[min(len(latency) - 1, len(latency) * 99 // 100)]
+    sessions = max(1, stats.connected)
+    return (f'{clients:5} подключений (ошибок {stats.failed}) | {stats.ticks / elapsed:7.0f} тик/с, '
+            f'{stats.ticks / elapsed / sessions:4.1f} на сессию | задержка нажатия p50 {p50 * 1000:6.1f} мс, '
+            f'p99 {p99 * 1000:6.1f} мс | {stats.received / elapsed / sessions:5.1f} Б/с на сессию, '
+            f'{stats.received / max(1, stats.ticks):.2f} Б/тик | начато игр {stats.games}')
+
+
+def main(argv=None):
+    """
+    Точка входа командной строки
+    :param argv: Аргументы без имени команды
+    :return:
+    """
+    parser = argparse.ArgumentParser(description='Нагрузочный тест сервера игр')
+    parser.add_argument('--host', default='127.0.0.1', help='адрес сервера')
+    parser.add_argument('--port', type=int, default=8765, help='порт сервера')
+    parser.add_argument('--clients', type=int, default=1000, help='количество подключений')
+    parser.add_argument('--seconds', type=float, default=10.0, help='длительность теста')
+    parser.add_argument('--ramp', type=float, default=2.0, help='за сколько секунд подключаются все боты')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    stats, elapsed = asyncio.run(run_load(args.host, args.port, args.clients, args.seconds, args.ramp))
+    print(report(stats, elapsed, args.clients))
+    print(f'Тест занял {time.perf_counter() - start:.1f} с')
+
+
+if __name__ == '__main__':
+    main()
@@ -13,124 +13,114 @@
     4. Супер сложный - Могут появляться в случайное время, в случайном месте
 
 При запуске игры пользователь попадает в меню, где может выбрать уровень сложности.
-Так же в меню можно посмотреть рекорды, которые сохраняются в файле records.txt.
+Так же в меню можно посмотреть рекорды, которые сохраняются в базе records.db (см. records.py).
 
 При нажатии на кнопку "Начать игру" игра начинается.
 
+Правила игры находятся в engine.py и не зависят от pygame, здесь только ввод и отрисовка.
+Скорость игры без графики и с отрисовкой можно сравнить запуском bench.py.
+Клавиша F3 в игре показывает время кадра по этапам (см. profiler.py), клавиша A включает
+и выключает автопилот (см. autopilot.py), клавиша H - решатель на гамильтоновом цикле (см. hamilton.py).
+F5 - быстрое сохранение, F9 - загрузка, Backspace - откат на несколько секунд назад.
+События игры (ходы, яблоки, пилюли, смерть) можно записывать в файл, см. telemetry.py.
+Ключ --arena N запускает арену из N змеек на одном поле, см. arena.py.
+Команда python main.py server запускает игры на сервере по TCP без графики, см. server.py.
 
 """
-import datetime
+import os
+import struct
 import sys
+import threading
 import time
+import zlib
+from collections import deque
 
 import pygame
 import random
-import pygame_menu
 
-
-class Snake:
-    def __init__(self, x, y, length=1):
-        """
-        Инициализация змейки
-        :param x: Координата x
-        :param y: Координата y
-        :param length: Длина змейки
-        """
-        self.x = x  # Координата x
-        self.y = y  # Координата y
-        self.length = length  # Длина змейки
-        self.body = [[x, y] for i in range(length)]  # Тело змейки
-        self.direction = random.choice(['right', 'left', 'up', 'down'])  # Случайное направление движения змейки
-        self.score = 0  # Счёт игрока
-        self.pill_timer = 0  # Таймер для пилюли
-
-    def move(self):
-        """
-        Движение змейки
-        :return:
-        """
-        if self.direction == 'right':
-            self.x += 1
-        elif self.direction == 'left':
-            self.x -= 1
-        elif self.direction == 'up':
-            self.y -= 1
-        elif self.direction == 'down':
-            self.y += 1
-
-        # Проверка на столкновение с самой собой
-        self.body.insert(0, [self.x, self.y])
-        self.body.pop()
-
-    def add_body(self, points=1):
-        """
-        Добавление тела змейке
-        :return:
-        """
-        self.length += 1
-        self.body.append([self.x, self.y])
-        self.score += points
-
-    def eat_pill(self):
-        """
-        Съедание пилюли
-        :return:
-        """
-        self.pill_timer = 120  # Устанавливаем таймер на 120 кадров
-
-        self.length += 1
-        self.body.append([self.x, self.y])
-        self.score += 1
-
-    def is_pill(self, with_update: bool = True):
-        """
-        Проверка на пилюлю
-        :return:
-        """
-        if self.pill_timer > 0:
-            if with_update:
-                self.pill_timer -= 1
-            return True
-        else:
-            return False
+import replay
+from arena import Arena
+from autopilot import Autopilot
+from hamilton import Solver
+from engine import APPLE, CLOCK_SPEEDS, DIRECTIONS, FAST_PILL, PILL, SNAKE, SNAPSHOT, WALL, Engine, check_generator
+from profiler import PHASES, FrameProfiler
+from records import RecordStore
+from telemetry import Dashboard, EventWriter, Telemetry
+
+# Названия уровней сложности для таблицы рекордов
+DIFFICULTY_NAMES = {1: 'Легко', 2: 'Средне', 3: 'Сложно', 4: 'Очень сложно'}
+
+# Короткие подписи этапов кадра для оверлея профайлера
+PHASE_NAMES = dict(zip(PHASES, ('ввод', 'ход', 'столкн.', 'появл.', 'рисов.', 'вывод')))
+
+QUICKSAVE = 'quicksave.snapshot'  # Файл быстрого сохранения (F5 - сохранить, F9 - загрузить)
+LAST_REPLAY = 'last_game.replay'  # Запись последней игры, её можно повторить командой python replay.py last_game.replay
+ROLLBACK_TICKS = 30  # На сколько тиков назад откатывает Backspace
+ROLLBACK_MAX_CELLS = 1_000_000  # Поля больше этого размера играются без отката
+CHUNK_CELLS = 16  # Сторона куска статичного слоя в клетках, когда поле больше окна
+GAME_OVER_TIME = 2  # Сколько секунд показывается экран конца игры
+# Сколько миллисекунд неподвижный экран ждёт события. Ожидание не грузит процессор, а таймаут
+# нужен, чтобы между ожиданиями Python успевал обработать Ctrl+C
+IDLE_TIMEOUT = 500
+
+# Сцены игры. Каждая сцена работает своим циклом и возвращает следующую, переходы идут через Game.loop
+MENU = 'menu'
+LEVELS = 'levels'
+PLAYING = 'playing'
+PAUSED = 'paused'
+GAME_OVER = 'game_over'
+RECORDS = 'records'
+QUIT = 'quit'
+
+# Кэш картинок: (имя файла, размер) -> Surface, общий для всех объектов и уровней
+_images = {}
+
+
+def load_image(name, size=20):
+    """
+    Загрузка картинки: файл декодируется и масштабируется один раз для каждого размера.
+    Спрайты берут картинку при отрисовке, поэтому файлы не читаются до первого кадра игры
+    :param name: Имя файла
+    :param size: Размер клетки в пикселях
+    :return: Surface
+    """
+    key = (name, size)
+    image = _images.get(key)
+    if image is None:
+        image = pygame.transform.scale(pygame.image.load(name).convert(), (size, size))
+        _images[key] = image
+    return image
 
 
 class Apple:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.apple_image = pygame.image.load('apple.png').convert()
-        self.apple_image = pygame.transform.scale(self.apple_image, (20, 20))
-
-    def set_position(self, x, y):
-        self.x = x
-        self.y = y
-
-    def draw(self, surface):
-        surface.blit(self.apple_image, (self.x * 20, self.y * 20))
+    __slots__ = ('x', 'y')
 
-
-class Block:
     def __init__(self, x, y):
         self.x = x
         self.y = y
-        self.block_image = pygame.image.load('block.png').convert()
-        self.block_image = pygame.transform.scale(self.block_image, (20, 20))
+
+    @property
+    def apple_image(self):
+        return load_image('apple.png')
 
     def set_position(self, x, y):
         self.x = x
         self.y = y
 
     def draw(self, surface):
-        surface.blit(self.block_image, (self.x * 20, self.y * 20))
+        surface.blit(self.apple_image, (self.x * 20, self.y * 20))
 
 
 class Pill:
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
-        self.pill_image = pygame.image.load('pill.png').convert()
-        self.pill_image = pygame.transform.scale(self.pill_image, (20, 20))
+
+    @property
+    def pill_image(self):
+        return load_image('pill.png')
 
     def set_position(self, x, y):
         self.x = x
@@ -141,11 +131,15 @@ class Pill:
 
 
 class FastPill:
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
-        self.fast_pill_image = pygame.image.load('fast_pill.png').convert()
-        self.fast_pill_image = pygame.transform.scale(self.fast_pill_image, (20, 20))
+
+    @property
+    def fast_pill_image(self):
+        return load_image('fast_pill.png')
 
     def set_position(self, x, y):
         self.x = x
@@ -156,465 +150,888 @@ class FastPill:
 
 
 class Game:
-    def __init__(self, width: int, height: int, difficulty: int = 1):
-        self.blocks = []
+    def __init__(self, width: int, height: int, difficulty: int = 1, fps: int = 60, smooth: bool = True,
+                 profile=None, autopilot=None, telemetry=None, view=None, arena: int = 0):
+        """
+        :param width: Ширина поля в клетках
+        :param height: Высота поля в клетках
+        :param view: Размер окна в клетках (ширина, высота), по умолчанию всё поле. Если поле больше
+            окна, камера следует за головой змейки, а стены рисуются кусками по мере показа
+        :param arena: Количество змеек на арене (см. arena.py), игрок управляет первой. 0 - обычная игра
+        """
+        self.fps = fps  # Частота кадров, скорость самой игры задаётся уровнем сложности
+        self.smooth = smooth  # Плавное движение змейки между тиками
         self.width = width
         self.height = height
+        self.view_width, self.view_height = (width, height) if view is None else view
         self.difficulty = difficulty  # 1 - лёгкий, 2 - средний, 3 - сложный, 4 - супер сложный
-        self.display = pygame.display.set_mode((width * 20, height * 20))  # Создание окна
-        self.pygame = pygame.init()  # Инициализация pygame
-        self.snake = Snake(5, 5)  # Создание змейки
+        # Для первого кадра нужны только окно и шрифты, остальное инициализируется вместе с меню
+        pygame.display.init()
+        pygame.font.init()
+        self.display = pygame.display.set_mode((self.view_width * 20, self.view_height * 20))  # Создание окна
+        self.engine = None  # Текущая игра
+        self.snake = None  # Змейка текущей игры
         self.block_size = 20
-        self.clock_speed = 10
         self.apple = Apple(10, 10)
         self.pill = Pill(15, 15)
         self.fast_pill = FastPill(20, 20)
         self.font = pygame.font.SysFont('arial', 15)  # Шрифт
-        self.menu = pygame_menu.Menu('Змейка', self.width * 20, self.height * 20,
-                                     theme=pygame_menu.themes.THEME_GREEN)  # Создание меню
-        self.menu.add.button('Начать играть', self.run_level_menu)
-        self.menu.add.button('Рекорды', self.show_records)
-        self.menu.add.button('Выйти', pygame_menu.events.EXIT)
+        self.colors = random.Random()  # Отдельный генератор для цветов, чтобы отрисовка не влияла на игру
+        self.profiler = FrameProfiler()  # Время этапов каждого кадра
+        self.profile_path = profile  # Файл CSV/JSON, куда сохраняется время кадров в конце игры
+        self.show_profile = False  # Оверлей со временем кадра, переключается на F3
+        self.autopilot = autopilot  # Демо-режим: бот (Autopilot или Solver), который управляет змейкой
+        self.telemetry = telemetry  # Поток событий игры (telemetry.Telemetry) или None
+        self.arena = arena
+        self._records = None  # База рекордов открывается при первом обращении, см. records
+        self.replay_path = LAST_REPLAY  # Куда сохраняется запись игры в конце игры
+        self._menu = None  # Меню создаются при первом показе, см. build_menus
+        self._level_menu = None
+        self.music = None  # Поток, который запускает фоновую музыку
+        self.scene = None  # Текущая сцена
+        self.next_scene = None  # Сцена, выбранная кнопкой меню
+        # Сцена -> метод, который её показывает и возвращает следующую сцену
+        self.scenes = {MENU: self.run_menu, LEVELS: self.run_level_menu, PLAYING: self.run, PAUSED: self.pause,
+                       GAME_OVER: self.game_over, RECORDS: self.show_records}
+
+    @property
+    def menu(self):
+        if self._menu is None:
+            self.build_menus()
+        return self._menu
+
+    @property
+    def level_menu(self):
+        if self._level_menu is None:
+            self.build_menus()
+        return self._level_menu
+
+    @property
+    def records(self):
+        """
+        База рекордов. Открывается при первом показе рекордов или конце игры, тогда же
+        один раз переносятся старые рекорды из records.txt
+        :return: RecordStore
+        """
+        if self._records is None:
+            self._records = RecordStore('records.db')
+            self._records.import_text('records.txt')
+        return self._records
 
-        self.level_menu = pygame_menu.Menu('Выбор уровня сложности', self.width * 20, self.height * 20,
-                                           theme=pygame_menu.themes.THEME_GREEN)
+    @records.setter
+    def records(self, store):
+        self._records = store
 
-        self.level_menu.add.button('Легкий', self.run_easy)
-        self.level_menu.add.button('Средний', self.run_medium)
-        self.level_menu.add.button('Сложный', self.run_hard)
-        self.level_menu.add.button('Супер сложный', self.run_super_hard)
-        self.level_menu.add.button('Назад', self.run_menu)
-        self.fast_pill_timer = 0
+    def build_menus(self):
+        """
+        Создание меню. pygame_menu импортируется только здесь, поэтому main.py
+        можно импортировать без него (бенчмарки, турнир). Пока меню создаётся, на экране заставка
+        :return:
+        """
+        self.draw_splash()
+        pygame.init()  # pygame_menu требует полной инициализации pygame
+        import pygame_menu
+
+        self._menu = pygame_menu.Menu('Змейка', self.view_width * 20, self.view_height * 20,
+                                      theme=pygame_menu.themes.THEME_GREEN)  # Создание меню
+        self._menu.add.button('Начать играть', self.go, LEVELS)
+        self._menu.add.button('Рекорды', self.go, RECORDS)
+        self._menu.add.button('Выйти', self.go, QUIT)
+
+        self._level_menu = pygame_menu.Menu('Выбор уровня сложности', self.view_width * 20, self.view_height * 20,
+                                            theme=pygame_menu.themes.THEME_GREEN)
+
+        self._level_menu.add.button('Легкий', self.run_easy)
+        self._level_menu.add.button('Средний', self.run_medium)
+        self._level_menu.add.button('Сложный', self.run_hard)
+        self._level_menu.add.button('Супер сложный', self.run_super_hard)
+        self._level_menu.add.button('Назад', self.go, MENU)
+
+    def draw_splash(self):
+        """
+        Заставка на время загрузки
+        :return:
+        """
+        self.display.fill((0, 0, 0))
+        value = self.font.render('Змейка - загрузка...', True, (255, 255, 255))
+        self.display.blit(value, value.get_rect(center=self.display.get_rect().center))
+        pygame.display.flip()
 
-        # Фоновая музыка
-        pygame.mixer.music.load('music.mp3')
-        # Задаём громкость
-        pygame.mixer.music.set_volume(0.3)
-        pygame.mixer.music.play(-1)
+    def start_music(self):
+        """
+        Запуск фоновой музыки в отдельном потоке: загрузка файла не задерживает показ меню
+        :return:
+        """
+        if self.music is None:
+            self.music = threading.Thread(target=self.play_music, daemon=True)
+            self.music.start()
 
+    def play_music(self):
+        """
+        Фоновая музыка
+        :return:
+        """
+        try:
+            pygame.mixer.init()
+            pygame.mixer.music.load('music.mp3')
+            # Задаём громкость
+            pygame.mixer.music.set_volume(0.3)
+            pygame.mixer.music.play(-1)
+        except pygame.error:  # Нет звукового устройства - игра идёт без музыки
+            pass
+
+    def loop(self, scene=MENU):
+        """
+        Главный цикл: сцены не вызывают друг друга, а возвращают следующую сцену сюда,
+        поэтому стек вызовов не растёт, сколько бы игр ни было сыграно подряд
+        :param scene: Первая сцена
+        :return:
+        """
+        self.scene = scene
+        while self.scene != QUIT:
+            self.scene = self.scenes[self.scene]()
 
-    def run_level_menu(self):
+    def go(self, scene):
         """
-        Запуск меню выбора уровня сложности
+        Переход из меню в другую сцену, вызывается кнопками меню
+        :param scene: Следующая сцена
         :return:
         """
-        self.level_menu.mainloop(self.display)
+        self.next_scene = scene
+
+    def run_pygame_menu(self, menu):
+        """
+        Показ меню pygame_menu, пока кнопка не выберет следующую сцену
+        :param menu: pygame_menu.Menu
+        :return: Следующая сцена
+        """
+        self.next_scene = None
+        changed = True
+        # Меню перерисовывается, только когда оно изменилось или окно нужно показать заново
+        while self.next_scene is None:
+            if changed:
+                menu.draw(self.display)
+                pygame.display.flip()
+            events = self.wait_events(IDLE_TIMEOUT)
+            changed = menu.update(events) or any(event.type == pygame.WINDOWEXPOSED for event in events)
+        return self.next_scene
+
+    @staticmethod
+    def wait_events(timeout):
+        """
+        Ожидание событий: процесс спит, пока не придёт событие или не выйдет время
+        :param timeout: Сколько ждать, мс
+        :return: Список событий, пустой, если время вышло
+        """
+        event = pygame.event.wait(timeout)
+        if event.type == pygame.NOEVENT:
+            return []
+        return [event, *pygame.event.get()]
+
+    def run_level_menu(self):
+        """
+        Меню выбора уровня сложности
+        :return: Следующая сцена
+        """
+        return self.run_pygame_menu(self.level_menu)
 
     def run_menu(self):
         """
-        Меню игры
+        Меню игры. Музыка запускается, когда меню уже на экране
+        :return: Следующая сцена
+        """
+        menu = self.menu
+        menu.draw(self.display)
+        pygame.display.flip()
+        self.start_music()
+        return self.run_pygame_menu(menu)
+
+    def start(self, difficulty):
+        """
+        Новая игра на уровне сложности
+        :param difficulty: 1 - лёгкий, 2 - средний, 3 - сложный, 4 - супер сложный
         :return:
         """
-        self.menu.mainloop(self.display)
+        self.difficulty = difficulty
+        self.profiler.clear()  # Время кадров сохраняется по каждой игре, начатой из меню, отдельно
+        self.new_game()
+        self.go(PLAYING)
 
     def run_easy(self):
         """
         Запуск игры на лёгком уровне сложности
         :return:
         """
-        self.difficulty = 1
-        self.clock_speed = 6
-        self.run()
+        self.start(1)
 
     def run_medium(self):
         """
         Запуск игры на среднем уровне сложности
         :return:
         """
-        self.difficulty = 2
-        self.clock_speed = 7
-
-        # Генерация случайных блоков
-        self.blocks = []
-        for i in range(20):
-            self.blocks.append(Block(random.randint(0, self.width - 1), random.randint(0, self.height - 1)))
-
-        blocks_to_remove = []
-        # Удаление блоков из центра поля с радиусом 6
-        for block in self.blocks:
-            if abs(self.width // 2 - block.x) < 6 and abs(self.height // 2 - block.y) < 6:
-                # Запоминай блоки, которые надо удалить
-                blocks_to_remove.append(block)
-        # Удаление блоков
-        for block in blocks_to_remove:
-            self.blocks.remove(block)
-
-        # Генерация блоков по кругу вокруг поля
-        for i in range(self.width):
-            self.blocks.append(Block(i, 0))
-            self.blocks.append(Block(i, self.height - 1))
-        for i in range(self.height):
-            self.blocks.append(Block(0, i))
-            self.blocks.append(Block(self.width - 1, i))
-
-        self.run()
+        self.start(2)
 
     def run_hard(self):
         """
         Запуск игры на сложном уровне сложности
         :return:
         """
-        self.difficulty = 3
-        self.clock_speed = 9
-
-        # Генерация стен
-        self.blocks = []
-        for i in range(15):
-            # Выбираем направление стены
-            direction = random.randint(0, 3)
-            # Стартовая позиция стены
-            x = random.randint(0, self.width - 1)
-            y = random.randint(0, self.height - 1)
-            for lenght in range(random.randint(3, 10)):
-                # С вероятностью 1 к 5 стена поворачивает
-                if random.randint(0, 4) == 0:
-                    direction = random.randint(0, 3)
-                if direction == 0:
-                    x += 1
-                elif direction == 1:
-                    x -= 1
-                elif direction == 2:
-                    y += 1
-                elif direction == 3:
-                    y -= 1
-                self.blocks.append(Block(x, y))
-
-        blocks_to_remove = []
-        # Удаление блоков из центра поля с радиусом 6
-        for block in self.blocks:
-            if abs(self.width // 2 - block.x) < 6 and abs(self.height // 2 - block.y) < 6:
-                # Запоминай блоки, которые надо удалить
-                blocks_to_remove.append(block)
-        # Удаление блоков
-        for block in blocks_to_remove:
-            self.blocks.remove(block)
-
-        # Генерация блоков по кругу вокруг поля
-        for i in range(self.width):
-            self.blocks.append(Block(i, 0))
-            self.blocks.append(Block(i, self.height - 1))
-        for i in range(self.height):
-            self.blocks.append(Block(0, i))
-            self.blocks.append(Block(self.width - 1, i))
-        self.run()
+        self.start(3)
 
     def run_super_hard(self):
         """
         Запуск игры на супер сложном уровне сложности
         :return:
         """
-        self.difficulty = 4
-        self.clock_speed = 10
-
-        self.blocks = []
-        for i in range(50):
-            # Выбираем направление стены
-            direction = random.randint(0, 3)
-            # Стартовая позиция стены
-            x = random.randint(0, self.width - 1)
-            y = random.randint(0, self.height - 1)
-            for length in range(random.randint(1, 5)):
-                # С вероятностью 1 к 4 стена поворачивает
-                if random.randint(0, 4) == 0:
-                    direction = random.randint(0, 3)
-                if direction == 0:
-                    x += 1
-                elif direction == 1:
-                    x -= 1
-                elif direction == 2:
-                    y += 1
-                elif direction == 3:
-                    y -= 1
-                self.blocks.append(Block(x, y))
-
-        # Удаление блоков из списка, которые находятся внутри других блоков
-        for block in self.blocks:
-            for block2 in self.blocks:
-                if block != block2 and block.x == block2.x and block.y == block2.y:
-                    self.blocks.remove(block)
-                    break
-
-        blocks_to_remove = []
-        # Удаление блоков из центра поля с радиусом 6
-        for block in self.blocks:
-            if abs(self.width // 2 - block.x) < 6 and abs(self.height // 2 - block.y) < 6:
-                # Запоминай блоки, которые надо удалить
-                blocks_to_remove.append(block)
-        # Удаление блоков
-        for block in blocks_to_remove:
-            self.blocks.remove(block)
-
-        # Генерация блоков по кругу вокруг поля
-        for i in range(self.width):
-            self.blocks.append(Block(i, 0))
-            self.blocks.append(Block(i, self.height - 1))
-        for i in range(self.height):
-            self.blocks.append(Block(0, i))
-            self.blocks.append(Block(self.width - 1, i))
-        self.run()
+        self.start(4)
 
     def run(self):
         """
-        
-        :return:
+        Игровой цикл: ввод, тик движка и отрисовка, пока игра не окончена или не нажата пауза
+        :return: Следующая сцена
         """
-        running = True  # Переменная для работы цикла
+        scene = PLAYING
         clock = pygame.time.Clock()  # Создание часов
-        self.snake = Snake(self.width // 2, self.height // 2)  # Создание змейки
-        self.display.fill((0, 0, 0))  # Заливка экрана черным цветом
-        self.regenerate_apple()  # Генерация яблока
-        pygame.display.flip()
-
-        while running:
-            clock.tick(self.clock_speed)  # Установка частоты обновления экрана
-            # Отрисовка блоков
 
+        profiler = self.profiler
+        while scene == PLAYING:
+            profiler.start_frame()
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
-                    running = False
+                    scene = GAME_OVER
                 if event.type == pygame.KEYDOWN:
-                    # Проверка на движение в противоположную сторону и длина змейки
-                    if event.key == pygame.K_LEFT and (self.snake.direction != 'right' or self.snake.score == 0):
-                        self.snake.direction = 'left'
-                    elif event.key == pygame.K_RIGHT and (self.snake.direction != 'left' or self.snake.score == 0):
-                        self.snake.direction = 'right'
-                    elif event.key == pygame.K_UP and (self.snake.direction != 'down' or self.snake.score == 0):
-                        self.snake.direction = 'up'
-                    elif event.key == pygame.K_DOWN and (self.snake.direction != 'up' or self.snake.score == 0):
-                        self.snake.direction = 'down'
+                    # Нажатие запоминается до ближайшего тика игры
+                    if event.key == pygame.K_LEFT:
+                        self.action = 'left'
+                    elif event.key == pygame.K_RIGHT:
+                        self.action = 'right'
+                    elif event.key == pygame.K_UP:
+                        self.action = 'up'
+                    elif event.key == pygame.K_DOWN:
+                        self.action = 'down'
                     # При нажатии на Esc выводит, вы действительно хотите выйти?
                     elif event.key == pygame.K_ESCAPE:
-                        self.pause()
-
-            self.display.fill((0, 0, 0))
-
-
-            self.snake.move()
-
-            # Проверка на столкновение с границами экрана и перенос змейки на другую сторону
-            if self.snake.x > self.width - 1:
-                self.snake.x = 0
-            elif self.snake.x < 0:
-                self.snake.x = self.width - 1
-            elif self.snake.y > self.height - 1:
-                self.snake.y = 0
-            elif self.snake.y < 0:
-                self.snake.y = self.height - 1
-
-            # Проверка на столкновение с собой с учётом длины змейки
-            for i in range(1, len(self.snake.body)):
-                if self.snake.x == self.snake.body[i][0] and self.snake.y == self.snake.body[i][1]:
-                    running = False
-
-            # Проверка на столкновение с яблоком
-            if self.snake.x == self.apple.x and self.snake.y == self.apple.y:
-
-                # Если активна пилюля, то увеличиваем длину змейки на дополнительный блок
-                if self.snake.is_pill(False):
-                    self.snake.score += 1
-                    self.snake.add_body()
-                self.regenerate_apple()
-                self.snake.add_body()
-
-            # Проверка на столкновение с блоком
-            for block in self.blocks:
-                if self.snake.x == block.x and self.snake.y == block.y:
-                    running = False
-
-            # Проверка на столкновение с пилюлькой
-            if self.pill:
-                if self.snake.x == self.pill.x and self.snake.y == self.pill.y:
-                    self.snake.eat_pill()
-                    self.pill = None
-
-            # Столкновение с быстрой пилюлькой
-            if self.fast_pill:
-                if self.snake.x == self.fast_pill.x and self.snake.y == self.fast_pill.y:
-                    self.fast_pill = None
-                    self.fast_pill_timer = 200
-                    self.clock_speed *= 2
-
-            # Проверка с таймером быстрой пилюли
-            if self.fast_pill_timer > 0:
-                self.fast_pill_timer -= 1
-                if self.fast_pill_timer == 0:
-                    self.clock_speed //= 2
-
-            is_pill = self.snake.is_pill()
-            # Отрисовка змейки
-            for part in self.snake.body:
+                        scene = PAUSED
+                    # A - включить или выключить автопилот
+                    elif event.key == pygame.K_a:
+                        self.autopilot = None if isinstance(self.autopilot, Autopilot) else Autopilot()
+                    # H - включить или выключить решатель на гамильтоновом цикле
+                    elif event.key == pygame.K_h:
+                        self.autopilot = None if isinstance(self.autopilot, Solver) else Solver()
+                    # F5 - быстрое сохранение, F9 - загрузка сохранения, Backspace - откат назад
+                    elif event.key == pygame.K_F5:
+                        self.quick_save()
+                    elif event.key == pygame.K_F9:
+                        self.quick_load()
+                    elif event.key == pygame.K_BACKSPACE:
+                        self.rollback()
+                    # F3 - показать или скрыть время кадра
+                    elif event.key == pygame.K_F3:
+                        self.show_profile = not self.show_profile
+                        self.redraw = True
+            profiler.mark('input')
+
+            if scene == PLAYING and not self.advance():
+                scene = GAME_OVER
+            profiler.end_frame()
+            # События кадра отдаются получателям после отрисовки, а не внутри тиков
+            if self.telemetry is not None:
+                self.telemetry.pump()
+
+            # Частота кадров не зависит от скорости игры
+            clock.tick(self.fps)
+
+        return scene
+
+    def advance(self):
+        """
+        Один кадр: игра делает столько тиков, сколько прошло по её скорости с прошлого кадра,
+        затем кадр рисуется. Если ничего не изменилось, кадр не перерисовывается
+        :return: False, если игра окончена
+        """
+        now = time.perf_counter()
+        # Не больше 0.25 секунды за кадр, чтобы после зависания игра не пыталась догнать время
+        self.lag += min(now - self.last_time, 0.25)
+        self.last_time = now
+
+        rects = []
+        alive = True
+        while self.lag >= 1 / self.engine.clock_speed:
+            # Скорость берётся заново на каждом тике, так как быстрая пилюля её меняет
+            self.lag -= 1 / self.engine.clock_speed
+            action = self.action if self.autopilot is None else self.autopilot(self.engine)
+            if self.history.maxlen:
+                # Запись действий в снимок не копируется, хватает её длины: при откате она обрезается
+                self.history.append((self.engine.snapshot(actions=False), len(self.engine.actions)))
+            state = self.engine.step(action)
+            self.action = None
+            self.last_state = state
+            rects.extend(self.draw(state))
+            self.profiler.mark('draw')
+            if state.done:
+                alive = False
+                break
+
+        if self.redraw:
+            rects.extend(self.draw(self.last_state))
+        # Плавное движение между тиками: голова въезжает в клетку, хвост из неё уезжает
+        if self.smooth and alive:
+            rects.extend(self.draw_motion(min(self.lag * self.engine.clock_speed, 1)))
+        if self.show_profile:
+            rects.extend(self.draw_profile(rects))
+        self.profiler.mark('draw')
+        if rects:
+            pygame.display.update(rects)
+        self.profiler.mark('flip')
+        return alive
+
+    def new_game(self, seed=None, generator=None):
+        """
+        Создание новой игры на текущем уровне сложности
+        :param seed: Зерно уровня, по умолчанию случайное
+        :param generator: Генератор уровня (см. engine.GENERATOR_NUMPY), по умолчанию NumPy, если он установлен
+        :return:
+        """
+        # Правила игры без графики
+        if self.arena:
+            self.engine = Arena(self.width, self.height, snakes=self.arena, difficulty=self.difficulty, seed=seed,
+                                player=True)
+        else:
+            self.engine = Engine(self.width, self.height, self.difficulty, seed=seed, generator=generator)
+        self.engine.timer = self.profiler  # Движок отмечает время хода, столкновений и появления предметов
+        self.engine.events = self.telemetry
+        self.snake = self.engine.snake
+
+        # Статичный слой: фон и стены рисуются один раз за уровень прямо из массива клеток стен движка.
+        # Если поле больше окна, слой целиком не нужен: стены рисуются кусками, см. chunk
+        self.camera_x = self.camera_y = 0  # Левая верхняя клетка поля в окне
+        self.chunks = {}  # Куски статичного слоя: (x, y) куска -> Surface, от давно показанных к недавним
+        if (self.width, self.height) == (self.view_width, self.view_height):
+            self.background = pygame.Surface(self.display.get_size()).convert()
+            self.background.fill((0, 0, 0))
+            block_image = load_image('block.png', self.block_size)
+            width = self.width
+            size = self.block_size
+            self.background.blits([(block_image, (index % width * size, index // width * size))
+                                   for index in self.engine.wall_cells], doreturn=False)
+        else:
+            self.background = None
+            self.follow()
+
+        self.action = None  # Направление, нажатое после прошлого тика
+        self.last_state = None  # Результат последнего тика
+        self.last_time = time.perf_counter()  # Время прошлого кадра
+        self.lag = 0  # Время, которое игра ещё не отсчитала тиками
+        self.motion_cells = ()  # Клетки, нарисованные с частичным сдвигом в прошлом кадре
+
+        # Снимки игры перед последними тиками для отката: (снимок без записи действий, длина записи).
+        # Снимок содержит всю сетку поля, поэтому на огромных полях отката нет. Снимок не хранит
+        # других змеек, поэтому на арене тоже
+        rollback = self.width * self.height <= ROLLBACK_MAX_CELLS and not self.arena
+        self.history = deque(maxlen=ROLLBACK_TICKS if rollback else 0)
+        self.redraw = True  # Следующий кадр рисуется целиком
+        self.drawn_items = ()  # Предметы, нарисованные в прошлом кадре
+        self.drawn_pill = False  # Была ли змейка разноцветной в прошлом кадре
+        self.drawn_border = False  # Была ли окантовка быстрой пилюли в прошлом кадре
+        self.drawn_score = None
+        self.score_text = None
+        self.score_rect = pygame.Rect(20, 20, 0, 0)
+        self.profile_text = None
+        self.profile_rect = pygame.Rect(20, 40, 0, 0)
+        self.profile_frames = 0  # Кадров с последнего обновления оверлея
+
+    def quick_save(self):
+        """
+        Быстрое сохранение текущей игры в файл
+        :return:
+        """
+        if self.arena:
+            return
+        with open(QUICKSAVE, 'wb') as file:
+            file.write(zlib.compress(self.engine.snapshot()))
+
+    def quick_load(self):
+        """
+        Загрузка быстрого сохранения. Если оно сделано на другом поле, поле создаётся заново по его зерну.
+        Повреждённый, обрезанный или чужой файл пропускается, текущая игра не меняется
+        :return:
+        """
+        if self.arena or not os.path.exists(QUICKSAVE):
+            return
+        try:
+            with open(QUICKSAVE, 'rb') as file:
+                data = zlib.decompress(file.read())
+            magic, width, height, difficulty, seed, generator = SNAPSHOT.unpack_from(data)[:6]
+            if (width, height) != (self.width, self.height) or difficulty not in CLOCK_SPEEDS:
+                return
+            if (difficulty, seed, generator) != (self.difficulty, self.engine.seed, self.engine.generator):
+                # Снимок проверяется на отдельном движке, чтобы повреждённый файл не заменил текущую игру
+                Engine(width, height, difficulty, seed=seed, generator=check_generator(generator)).restore(data)
+                self.difficulty = difficulty
+                self.new_game(seed, generator)
+            self.restore(data)
+        except (OSError, zlib.error, ValueError, struct.error):
+            return
+
+    def rollback(self):
+        """
+        Откат игры на ROLLBACK_TICKS тиков назад (или к началу сохранённой истории)
+        :return:
+        """
+        if self.history:
+            snapshot, length = self.history[0]
+            self.history.clear()
+            actions = self.engine.actions
+            self.restore(snapshot)
+            del actions[length:]
+            self.engine.actions = actions
+
+    def restore(self, snapshot):
+        """
+        Возврат к снимку игры и полная перерисовка
+        :return:
+        """
+        self.last_state = self.engine.restore(snapshot)
+        self.action = None
+        self.lag = 0
+        self.last_time = time.perf_counter()
+        self.motion_cells = ()
+        self.redraw = True
+
+    def draw(self, state=None):
+        """
+        Отрисовка текущего состояния игры.
+        Стены берутся из статичного слоя, а перерисовываются только изменившиеся клетки
+        :param state: Результат последнего тика, из него берутся новая голова и освободившийся хвост
+        :return: Список изменившихся прямоугольников для pygame.display.update
+        """
+        is_pill = self.snake.is_pill(False)
+        items = (self.engine.apple, self.engine.pill, self.engine.fast_pill)
+        border = self.engine.fast_pill_timer > 0
+
+        # Текст счёта рендерится только когда счёт меняется
+        old_score_rect = self.score_rect
+        if self.snake.score != self.drawn_score:
+            self.drawn_score = self.snake.score
+            self.score_text = self.font.render(f'Счёт: {self.snake.score}', True, (255, 255, 255))
+            self.score_rect = self.score_text.get_rect(topleft=(20, 20))
+        score_area = self.score_rect.union(old_score_rect)
+
+        # Разноцветная змейка меняет цвет каждый кадр, а снятие окантовки открывает края поля,
+        # поэтому в этих случаях кадр рисуется целиком
+        # Камера сдвинулась за головой - всё окно рисуется заново
+        if self.follow():
+            self.redraw = True
+
+        if self.redraw or is_pill or self.drawn_pill or (self.drawn_border and not border):
+            self.draw_background()
+            # Отрисовка змейки. Если поле больше окна или змеек много, клетки змеек ищутся в окне по сетке
+            parts = self.snake.body if self.background is not None and not self.arena else self.visible_cells(SNAKE)
+            for part in parts:
                 if is_pill:
                     # Если змейка съела пилюлю, то она становится разноцветной со случайно генерируемы светлый оттенок
                     pygame.draw.rect(self.display,
-                                     (random.randint(100, 255), random.randint(100, 255), random.randint(100, 255)),
-                                     (part[0] * self.block_size, part[1] * self.block_size, self.block_size,
-                                      self.block_size))
-                    # pygame.draw.rect(self.display,
-                    #                  (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)),
-                    #                  (part[0] * self.block_size, part[1] * self.block_size, self.block_size,
-                    #                   self.block_size))
+                                     (self.colors.randint(100, 255), self.colors.randint(100, 255),
+                                      self.colors.randint(100, 255)),
+                                     self.cell_rect(*part))
                 else:
-                    pygame.draw.rect(self.display, (0, 255, 0), pygame.Rect(part[0] * 20, part[1] * 20, 20, 20))
-
-            # Отрисовка блоков
-            for block in self.blocks:
-                block.draw(self.display)
+                    self.draw_cell(*part)
+            # Отрисовка яблока и пилюль
+            for item in items:
+                if item is not None:
+                    self.draw_cell(*item)
+            # На арене яблок много, они ищутся в окне по сетке
+            if self.arena:
+                for cell in self.visible_cells(APPLE):
+                    self.draw_cell(*cell)
+            rects = [self.display.get_rect()]
+        else:
+            # Изменились только голова, хвост и предметы
+            cells = set(items)
+            cells.update(self.drawn_items)
+            if state is not None:
+                cells.add(state.head)
+                cells.add(state.tail)
+            if self.arena:
+                # Ходы остальных змеек и новые яблоки
+                cells.update(self.engine.changed)
+            cells.discard(None)
+            # Клетки под счётом перерисовываются, так как текст рисуется поверх них
+            cells.update(self.cells_in(score_area))
+            rects = [self.draw_cell(x, y) for x, y in cells]
+
+        # Отрисовка счёта
+        self.display.blit(self.score_text, self.score_rect)
+        rects.append(score_area)
+
+        # Если активна скоростная пилюля, то создаём синию окантовку вокруг поля
+        if border:
+            rects.extend(self.draw_border())
+
+        self.redraw = False
+        self.drawn_items = items
+        self.drawn_pill = is_pill
+        self.drawn_border = border
+        return rects
+
+    def draw_motion(self, alpha):
+        """
+        Промежуточный кадр между тиками: голова заполняет новую клетку на долю alpha,
+        а освободившаяся клетка хвоста ещё закрашена на долю 1 - alpha
+        :param alpha: Доля времени до следующего тика, от 0 до 1
+        :return: Список изменившихся прямоугольников
+        """
+        state = self.last_state
+        size = self.block_size
+        rects = [self.draw_cell(x, y) for x, y in self.motion_cells]
+        self.motion_cells = ()
+        if state is None or state.done:
+            return rects
+
+        parts = []
+        # Голова въезжает со стороны шеи
+        dx, dy = DIRECTIONS[self.snake.direction]
+        parts.append((state.head, -dx, -dy, alpha))
+        # Хвост уезжает в сторону следующего сегмента
+        if state.tail is not None:
+            tail_x, tail_y = self.snake.body[-1]
+            dx = (tail_x - state.tail[0] + 1) % self.width - 1
+            dy = (tail_y - state.tail[1] + 1) % self.height - 1
+            parts.append((state.tail, dx, dy, 1 - alpha))
+
+        for (x, y), dx, dy, fill in parts:
+            if not self.in_view(x, y):
+                continue
+            rect = self.cell_rect(x, y)
+            self.clear_cell(x, y, rect)
+            # Закрашенная часть клетки прижата к стороне (dx, dy)
+            part = rect.copy()
+            if dx:
+                part.width = round(size * fill)
+                if dx > 0:
+                    part.right = rect.right
+            else:
+                part.height = round(size * fill)
+                if dy > 0:
+                    part.bottom = rect.bottom
+            pygame.draw.rect(self.display, (0, 255, 0), part)
+            rects.append(rect)
+        self.motion_cells = [cell for cell, dx, dy, fill in parts]
+
+        # Счёт и окантовка рисуются поверх клеток
+        if any(rect.colliderect(self.score_rect) for rect in rects):
+            self.display.blit(self.score_text, self.score_rect)
+        if self.engine.fast_pill_timer > 0:
+            rects.extend(self.draw_border())
+        return rects
+
+    def draw_profile(self, rects):
+        """
+        Оверлей под счётом: p50/p99 времени кадра и среднее время этапов.
+        Текст обновляется раз в полсекунды, а в остальных кадрах рисуется заново, только если его задели
+        :param rects: Прямоугольники, уже перерисованные в этом кадре
+        :return: Список изменившихся прямоугольников
+        """
+        self.profile_frames += 1
+        if self.profile_text is not None and self.profile_frames < self.fps // 2:
+            if any(rect.colliderect(self.profile_rect) for rect in rects):
+                self.display.blit(self.profile_text, self.profile_rect)
+            return []
+
+        self.profile_frames = 0
+        p50, p99 = self.profiler.percentiles()
+        phases = ' '.join(f'{PHASE_NAMES[phase]} {value * 1000:.2f}'
+                          for phase, value in self.profiler.averages().items())
+        old_rect = self.profile_rect
+        self.profile_text = self.font.render(f'Кадр: p50 {p50 * 1000:.1f} мс, p99 {p99 * 1000:.1f} мс | {phases}',
+                                             True, (255, 255, 0))
+        self.profile_rect = self.profile_text.get_rect(topleft=(20, 40))
+        area = self.profile_rect.union(old_rect).clip(self.display.get_rect())
+        for x, y in self.cells_in(area):
+            self.draw_cell(x, y)
+        self.display.blit(self.profile_text, self.profile_rect)
+        return [area]
+
+    def draw_border(self):
+        """
+        Синяя окантовка вокруг поля, пока действует быстрая пилюля
+        :return: Прямоугольники окантовки
+        """
+        size = self.display.get_rect()
+        pygame.draw.rect(self.display, (0, 191, 255), size, 3)
+        return [pygame.Rect(0, 0, size.width, 3), pygame.Rect(0, size.height - 3, size.width, 3),
+                pygame.Rect(0, 0, 3, size.height), pygame.Rect(size.width - 3, 0, 3, size.height)]
 
-            # Отрисовка яблока
+    def draw_cell(self, x, y):
+        """
+        Перерисовка одной клетки поверх статичного слоя
+        :return: Прямоугольник клетки на экране
+        """
+        rect = self.cell_rect(x, y)
+        if not self.in_view(x, y):
+            return rect
+        self.clear_cell(x, y, rect)
+        cell = self.engine.cell(x, y)
+        if cell == SNAKE:
+            pygame.draw.rect(self.display, (0, 255, 0), rect)
+        elif cell == APPLE:
+            self.apple.set_position(x - self.camera_x, y - self.camera_y)
             self.apple.draw(self.display)
+        elif cell == PILL:
+            self.pill.set_position(x - self.camera_x, y - self.camera_y)
+            self.pill.draw(self.display)
+        elif cell == FAST_PILL:
+            self.fast_pill.set_position(x - self.camera_x, y - self.camera_y)
+            self.fast_pill.draw(self.display)
+        return rect
+
+    def cell_rect(self, x, y):
+        """
+        Прямоугольник клетки поля на экране с учётом камеры
+        :return: pygame.Rect
+        """
+        size = self.block_size
+        return pygame.Rect((x - self.camera_x) * size, (y - self.camera_y) * size, size, size)
 
-            # Генерация и отрисовка пилюли
-            if self.pill is None and random.randint(0, 100) == 0:
-                self.generate_pill()
-            elif self.pill is not None:
-                self.pill.draw(self.display)
-
-            # Быстрая пилуля
-            if self.fast_pill is None and random.randint(0, 200) == 0 and self.fast_pill_timer == 0:
-                self.generate_fast_pill()
-            elif self.fast_pill:
-                self.fast_pill.draw(self.display)
-
-            # Отрисовка счёта
-            value = self.font.render(f'Счёт: {self.snake.score}', True,
-                                     (255, 255, 255))
-            self.display.blit(value, (20, 20))
-
-            # Если активна скоростная пилюля, то создаём синию окантовку вокруг поля
-            if self.fast_pill_timer:
-                pygame.draw.rect(self.display, (0, 191, 255),
-                                 (0, 0, self.width * self.block_size, self.height * self.block_size), 3)
-
-            # Перерисовка экрана
-            pygame.display.flip()
-
-        self.game_over()
-
-    def regenerate_apple(self):
+    def in_view(self, x, y):
         """
-        Генерация яблока
+        Видна ли клетка поля в окне
         :return:
         """
-        # Проверка на то, что яблоко не появляется на змейке и не на блоке
-        while True:
-            self.apple.set_position(random.randint(1, self.width - 2), random.randint(1, self.height - 2))
-            for block in self.blocks:
-                if self.apple.x != block.x and self.apple.y != block.y:
-                    return
-            if len(self.blocks) == 0:
-                return
+        return (0 <= x - self.camera_x < self.view_width and 0 <= y - self.camera_y < self.view_height
+                and x < self.width and y < self.height)
 
-    def generate_pill(self):
+    def clear_cell(self, x, y, rect):
         """
-        Генерация пилюли
+        Фон клетки из статичного слоя или из куска стен, если поле больше окна
+        :param rect: Прямоугольник клетки на экране
         :return:
         """
-
-        # Проверка на то, что пилюля не появляется на змейке и не на блоке
-        while True:
-            self.pill = Pill(random.randint(1, self.width - 2), random.randint(1, self.height - 2))
-            for block in self.blocks:
-                if self.pill.x != block.x and self.pill.y != block.y:
-                    return
-            if len(self.blocks) == 0:
-                return
-
-    def generate_fast_pill(self):
+        if self.background is not None:
+            self.display.blit(self.background, rect, rect)
+            return
+        size = self.block_size
+        self.display.blit(self.chunk(x // CHUNK_CELLS, y // CHUNK_CELLS), rect,
+                          (x % CHUNK_CELLS * size, y % CHUNK_CELLS * size, size, size))
+
+    def draw_background(self):
         """
-        Генерация пилюли
+        Фон и стены во всё окно: статичный слой или видимые куски стен
         :return:
         """
+        if self.background is not None:
+            self.display.blit(self.background, (0, 0))
+            return
+        self.display.fill((0, 0, 0))
+        size = self.block_size
+        self.display.blits([(self.chunk(x, y), ((x * CHUNK_CELLS - self.camera_x) * size,
+                                                 (y * CHUNK_CELLS - self.camera_y) * size))
+                            for y in range(self.camera_y // CHUNK_CELLS,
+                                           (self.camera_y + self.view_height - 1) // CHUNK_CELLS + 1)
+                            for x in range(self.camera_x // CHUNK_CELLS,
+                                           (self.camera_x + self.view_width - 1) // CHUNK_CELLS + 1)],
+                           doreturn=False)
+
+    def chunk(self, x, y):
+        """
+        Кусок статичного слоя CHUNK_CELLS x CHUNK_CELLS клеток. Рисуется при первом показе и хранится,
+        пока в кэше есть место: кэш рассчитан на несколько окон, давно не показанные куски удаляются
+        :param x: Номер куска по горизонтали
+        :param y: Номер куска по вертикали
+        :return: Surface
+        """
+        chunk = self.chunks.pop((x, y), None)
+        if chunk is None:
+            size = self.block_size
+            chunk = pygame.Surface((CHUNK_CELLS * size, CHUNK_CELLS * size)).convert()
+            chunk.fill((0, 0, 0))
+            block_image = load_image('block.png', size)
+            # Стены куска ищутся по строкам сетки стен
+            width = self.width
+            left = x * CHUNK_CELLS
+            right = min(left + CHUNK_CELLS, width)
+            blits = []
+            for row in range(y * CHUNK_CELLS, min((y + 1) * CHUNK_CELLS, self.height)):
+                cells = self.engine.wall_grid[row * width + left:row * width + right]
+                column = cells.find(WALL)
+                while column != -1:
+                    blits.append((block_image, (column * size, (row - y * CHUNK_CELLS) * size)))
+                    column = cells.find(WALL, column + 1)
+            chunk.blits(blits, doreturn=False)
+            # Окно задевает не больше (сторона / CHUNK_CELLS + 2) кусков по каждой стороне
+            limit = 4 * (self.view_width // CHUNK_CELLS + 2) * (self.view_height // CHUNK_CELLS + 2)
+            if len(self.chunks) >= limit:
+                del self.chunks[next(iter(self.chunks))]
+        self.chunks[(x, y)] = chunk
+        return chunk
+
+    def visible_cells(self, code):
+        """
+        Клетки окна с заданным содержимым, ищутся по строкам сетки занятости
+        :param code: Код клетки (SNAKE, APPLE, ...)
+        :return: Генератор клеток (x, y)
+        """
+        grid = self.engine.grid
+        width = self.width
+        left = self.camera_x
+        right = min(left + self.view_width, width)
+        for y in range(self.camera_y, min(self.camera_y + self.view_height, self.height)):
+            cells = grid[y * width + left:y * width + right]
+            x = cells.find(code)
+            while x != -1:
+                yield left + x, y
+                x = cells.find(code, x + 1)
+
+    def follow(self):
+        """
+        Камера за головой змейки: сдвигается, только когда голова выходит из средней части окна
+        :return: True, если камера сдвинулась
+        """
+        if self.background is not None:
+            return False
+        camera = (self.follow_axis(self.camera_x, self.snake.x, self.view_width, self.width),
+                  self.follow_axis(self.camera_y, self.snake.y, self.view_height, self.height))
+        if camera == (self.camera_x, self.camera_y):
+            return False
+        self.camera_x, self.camera_y = camera
+        return True
 
-        # Проверка на то, что пилюля не появляется на змейке и не на блоке
-        while True:
-            self.fast_pill = FastPill(random.randint(1, self.width - 2), random.randint(1, self.height - 2))
-            for block in self.blocks:
-                if self.fast_pill.x != block.x and self.fast_pill.y != block.y:
-                    return
-            if len(self.blocks) == 0:
-                return
-
-    def show_records(self):
+    @staticmethod
+    def follow_axis(camera, head, view, size):
+        """
+        Положение камеры по одной оси: голова держится дальше четверти окна от его краёв
+        :param camera: Текущее начало окна
+        :param head: Координата головы
+        :param view: Размер окна
+        :param size: Размер поля
+        :return: Новое начало окна
+        """
+        margin = view // 4
+        if head < camera + margin:
+            camera = head - margin
+        elif head >= camera + view - margin:
+            camera = head - view + margin + 1
+        return max(0, min(camera, size - view))
+
+    def cells_in(self, rect):
         """
-        Отображение рекордов
+        Клетки поля, которые задевает прямоугольник на экране
         :return:
         """
-        self.display.fill((0, 0, 0))
-        value = self.font.render(f'Рекорды - Esc для выхода', True, (255, 255, 255))
-        self.display.blit(value, (20, 20))
-        # Получение рекордов из файла
-        try:
-            with open('records.txt', 'r') as file:
-                records = file.readlines()
-        except FileNotFoundError:
-            records = []
-
-        # Сортировка рекордов по убыванию
-        records.sort(key=lambda x: int(x.split(' | ')[0]), reverse=True)
-
-        # Отрисовка рекордов
-        for i, record in enumerate(records):
-            record = record.split(' | ')
-
-            text = f'{i + 1}. Счёт: {record[0]} | '
-            if record[1] == '1':
-                text += 'Сложность: Легко'
-            elif record[1] == '2':
-                text += 'Сложность: Средне'
-            elif record[1] == '3':
-                text += 'Сложность: Сложно'
-            elif record[1] == '4':
-                text += 'Сложность: Очень сложно'
-
-            # Время попытки
-            text += f' | Время: {record[2][:-1]}'
+        for y in range(rect.top // self.block_size, (rect.bottom - 1) // self.block_size + 1):
+            for x in range(rect.left // self.block_size, (rect.right - 1) // self.block_size + 1):
+                yield x + self.camera_x, y + self.camera_y
 
-            value = self.font.render(text, True, (255, 255, 255))
-            self.display.blit(value, (20, 40 + i * 20))
+    def show_records(self):
+        """
+        Отображение рекордов по страницам
+        Стрелки влево/вправо - страницы, 0 - все уровни, 1-4 - уровень сложности, Esc - выход
+        :return: Следующая сцена
+        """
+        page = 0
+        difficulty = None
+        per_page = (self.view_height * 20 - 60) // 20  # Сколько строк помещается на экране
+        changed = True
 
-        # Перерисовка экрана пока не нажмут на кнопку ESC
+        # Экран перерисовывается только после нажатия клавиши, пока не нажмут на кнопку ESC
         while True:
-            for event in pygame.event.get():
+            if changed:
+                self.draw_records(page, difficulty, per_page)
+                pygame.display.flip()
+                changed = False
+            for event in self.wait_events(IDLE_TIMEOUT):
                 if event.type == pygame.QUIT:
-                    exit()
+                    return QUIT
+                if event.type == pygame.WINDOWEXPOSED:
+                    changed = True
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_ESCAPE:
-                        return
-            pygame.display.flip()
+                        return MENU
+                    elif event.key in (pygame.K_RIGHT, pygame.K_PAGEDOWN):
+                        if (page + 1) * per_page < self.records.count(difficulty):
+                            page += 1
+                    elif event.key in (pygame.K_LEFT, pygame.K_PAGEUP):
+                        page = max(0, page - 1)
+                    elif pygame.K_0 <= event.key <= pygame.K_4:
+                        difficulty = event.key - pygame.K_0 or None
+                        page = 0
+                    changed = True
+
+    def draw_records(self, page, difficulty, per_page):
+        """
+        Отрисовка одной страницы рекордов
+        :param page: Номер страницы с нуля
+        :param difficulty: Уровень сложности или None для всех уровней
+        :param per_page: Рекордов на странице
+        :return:
+        """
+        self.display.fill((0, 0, 0))
+        pages = max(1, -(-self.records.count(difficulty) // per_page))
+        level = DIFFICULTY_NAMES[difficulty] if difficulty else 'Все уровни'
+        value = self.font.render(f'Рекорды: {level}, страница {page + 1} из {pages} - '
+                                 f'стрелки для страниц, 0-4 сложность, Esc для выхода', True, (255, 255, 255))
+        self.display.blit(value, (20, 20))
+
+        # Лучшие рекорды выбираются из базы по индексу
+        for i, (score, level, attempt_time) in enumerate(self.records.top(per_page, page * per_page, difficulty)):
+            text = (f'{page * per_page + i + 1}. Счёт: {score} | Сложность: {DIFFICULTY_NAMES.get(level, level)} | '
+                    f'Время: {attempt_time}')
+            value = self.font.render(text, True, (255, 255, 255))
+            self.display.blit(value, (20, 50 + i * 20))
 
     def game_over(self):
         """
-        Выводит окно с сообщением о проигрыше
-        :return:
+        Выводит окно с сообщением о проигрыше, через несколько секунд или по нажатию клавиши - меню
+        :return: Следующая сцена
         """
 
         self.display.fill((10, 10, 10))
         value = self.font.render(f'Игра окончена! Счёт: {self.snake.score}', True, (255, 255, 255))
-        self.display.blit(value, (self.width * 20 // 2 - 100, self.height * 20 // 2 - 20))
+        self.display.blit(value, (self.view_width * 20 // 2 - 100, self.view_height * 20 // 2 - 20))
         pygame.display.flip()
 
-        # Сохранение рекорда в файл со временем и счётом и сложностью
-        if self.snake.score > 0:
-            with open('records.txt', 'a') as file:
-                # Преобразуем время в формат дд.мм.гггг чч:мм:сс
-                file.write(
-                    f'{self.snake.score} | {self.difficulty} | {datetime.datetime.now().strftime("%d.%m.%Y %H:%M:%S")}\n')
+        # Игры на арене не попадают в рекорды и не записываются: повтор хранит ходы одной змейки
+        if not self.arena:
+            # Сохранение рекорда в базу со временем и счётом и сложностью
+            if self.snake.score > 0:
+                self.records.add(self.snake.score, self.difficulty)
+                self.records.flush()
+
+            # Запись последней игры для повтора
+            replay.save(replay.record(self.engine), self.replay_path)
+
+        # События последних кадров и недописанная пачка событий
+        if self.telemetry is not None:
+            self.telemetry.flush()
+
+        # Время кадров этой игры, python main.py --profile frames.csv
+        if self.profile_path:
+            self.profiler.dump(self.profile_path)
+
+        # Экран держится несколько секунд, нажатие клавиши сразу возвращает в меню
+        end = time.perf_counter() + GAME_OVER_TIME
+        while time.perf_counter() < end:
+            for event in self.wait_events(max(1, int((end - time.perf_counter()) * 1000))):
+                if event.type == pygame.QUIT:
+                    self.reset_game()
+                    return QUIT
+                if event.type == pygame.KEYDOWN:
+                    end = 0
 
         # Перезапуск игры
-        time.sleep(2)
-        self.reset_game()
+        return self.reset_game()
 
     def reset_game(self):
         """
         Сброс игры и возврат к начальному в главное меню
-        :return:
+        :return: Следующая сцена
         """
-        self.blocks = []
+        self.engine = None
         self.snake = None
-        self.fast_pill_timer = 0
-        self.snake = Snake(self.width // 2, self.height // 2)
+        self.history.clear()
+        self.last_state = None
         # Возврат в меню
-        self.run_menu()
+        return MENU
 
     def pause(self):
         """
@@ -623,28 +1040,76 @@ class Game:
         Вернуться в игру / Выйти
         Enter - Выйти
         Esc - Вернуться в игру
+        :return: Следующая сцена
         """
-        pause = True
-        while pause:
-            for event in pygame.event.get():
+        changed = True
+        while True:
+            # Экран неподвижен, поэтому рисуется один раз и заново, только если окно было закрыто другим
+            if changed:
+                self.display.fill((0, 0, 0))
+                value = self.font.render('Вы действительно хотите выйти?', True, (255, 255, 255))
+                value2 = self.font.render('Esc - Вернуться в игру   Enter - Выйти', True, (255, 255, 255))
+
+                # Вывод сообщения по центру экрана
+                self.display.blit(value, (self.view_width * 20 // 2 - 100, self.view_height * 20 // 2 - 20))
+                self.display.blit(value2, (self.view_width * 20 // 2 - 110, self.view_height * 20 // 2 + 20))
+                pygame.display.flip()
+                changed = False
+
+            for event in self.wait_events(IDLE_TIMEOUT):
                 if event.type == pygame.QUIT:
-                    pause = False
+                    return self.resume()
+                if event.type == pygame.WINDOWEXPOSED:
+                    changed = True
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_ESCAPE:
-                        pause = False
+                        return self.resume()
                     elif event.key == pygame.K_RETURN:
-                        self.game_over()
-
-            self.display.fill((0, 0, 0))
-            value = self.font.render('Вы действительно хотите выйти?', True, (255, 255, 255))
-            value2 = self.font.render('Esc - Вернуться в игру   Enter - Выйти', True, (255, 255, 255))
+                        return GAME_OVER
 
-            # Вывод сообщения по центру экрана
-            self.display.blit(value, (self.width * 20 // 2 - 100, self.height * 20 // 2 - 20))
-            self.display.blit(value2, (self.width * 20 // 2 - 110, self.height * 20 // 2 + 20))
-            pygame.display.flip()
+    def resume(self):
+        """
+        Возврат из паузы в игру
+        :return: Следующая сцена
+        """
+        self.redraw = True
+        self.last_time = time.perf_counter()  # Время паузы не идёт в зачёт игры
+        return PLAYING
 
 
 if __name__ == '__main__':
-    game = Game(50, 40) # Размеры окна игры
-    game.run_menu()
+    # python main.py tournament ... - массовый запуск игр без графики, см. tournament.py
+    if len(sys.argv) > 1 and sys.argv[1] == 'tournament':
+        import tournament
+
+        tournament.main(sys.argv[2:])
+        sys.exit()
+    # python main.py server ... - сервер игр по TCP без графики, см. server.py
+    if len(sys.argv) > 1 and sys.argv[1] == 'server':
+        import server
+
+        server.main(sys.argv[2:])
+        sys.exit()
+
+    # python main.py --fps 144 - частота кадров, скорость игры от неё не зависит
+    fps = int(sys.argv[sys.argv.index('--fps') + 1]) if '--fps' in sys.argv else 60
+    # python main.py --profile frames.csv - сохранить время этапов каждого кадра (CSV или .json)
+    profile = sys.argv[sys.argv.index('--profile') + 1] if '--profile' in sys.argv else None
+    # python main.py --autopilot или --solver - демо-режим, змейкой управляет бот
+    pilot = Autopilot() if '--autopilot' in sys.argv else Solver() if '--solver' in sys.argv else None
+    # python main.py --events game.events --dashboard stats.json - записывать события игры (или .ndjson)
+    # и обновлять файл со счётчиками событий раз в секунду
+    events = None
+    if '--events' in sys.argv or '--dashboard' in sys.argv:
+        events = Telemetry()
+        if '--events' in sys.argv:
+            events.subscribe(EventWriter(sys.argv[sys.argv.index('--events') + 1]))
+        if '--dashboard' in sys.argv:
+            events.subscribe(Dashboard(sys.argv[sys.argv.index('--dashboard') + 1]))
+    # python main.py --board 2000x2000 - поле больше окна, камера следует за змейкой
+    board = tuple(map(int, sys.argv[sys.argv.index('--board') + 1].split('x'))) if '--board' in sys.argv else (50, 40)
+    # python main.py --arena 200 --board 300x300 - арена: 200 змеек, игрок управляет одной из них
+    arena = int(sys.argv[sys.argv.index('--arena') + 1]) if '--arena' in sys.argv else 0
+    game = Game(*board, fps=fps, profile=profile, autopilot=pilot, telemetry=events, view=(50, 40),
+                arena=arena) # Размеры окна игры
+    game.loop()
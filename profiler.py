@@ -0,0 +1,101 @@
+"""
+Замер времени кадра по этапам
+
+Кадр делится на этапы: ввод, движение змейки, проверка столкновений, появление
+предметов, отрисовка и вывод на экран. Этапы отмечаются вызовом mark(этап), время
+с прошлой отметки добавляется к этому этапу. Профайлер не зависит от pygame и может
+быть подключён к engine.Engine через атрибут timer.
+"""
+import csv
+import json
+import time
+from collections import deque
+
+PHASES = ('input', 'move', 'collision', 'spawn', 'draw', 'flip')
+
+
+class FrameProfiler:
+    def __init__(self, history: int = 600):
+        """
+        Инициализация профайлера
+        :param history: По скольким последним кадрам считаются p50/p99
+        """
+        self.recent = deque(maxlen=history)  # Время последних кадров
+        self.rows = []  # Все кадры: время начала, тики и время по этапам
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.current = dict.fromkeys(PHASES, 0.0)
+        self.ticks = 0
+
+    def clear(self):
+        """
+        Сброс записанных кадров, чтобы в долгой сессии хранились кадры только текущей игры
+        :return:
+        """
+        self.rows.clear()
+        self.recent.clear()
+        self.start = time.perf_counter()
+
+    def start_frame(self):
+        """
+        Начало нового кадра
+        :return:
+        """
+        self.last = time.perf_counter()
+        self.current = dict.fromkeys(PHASES, 0.0)
+        self.ticks = 0
+
+    def mark(self, phase):
+        """
+        Конец этапа: время с прошлой отметки добавляется к этапу
+        :param phase: Один из PHASES
+        :return:
+        """
+        now = time.perf_counter()
+        self.current[phase] += now - self.last
+        self.last = now
+        if phase == 'move':
+            self.ticks += 1
+
+    def end_frame(self):
+        """
+        Конец кадра
+        :return:
+        """
+        total = sum(self.current.values())
+        self.recent.append(total)
+        self.rows.append((self.last - self.start, self.ticks, *self.current.values(), total))
+
+    def percentiles(self):
+        """
+        Время кадра по последним кадрам
+        :return: p50 и p99 в секундах
+        """
+        if not self.recent:
+            return 0.0, 0.0
+        frames = sorted(self.recent)
+        return frames[len(frames) // 2], frames[min(len(frames) - 1, len(frames) * 99 // 100)]
+
+    def averages(self):
+        """
+        Среднее время этапов по последним кадрам
+        :return: Словарь этап -> секунды
+        """
+        rows = self.rows[-len(self.recent):] if self.recent else []
+        return {phase: sum(row[2 + i] for row in rows) / max(1, len(rows)) for i, phase in enumerate(PHASES)}
+
+    def dump(self, path):
+        """
+        Сохранение времени всех кадров в CSV или JSON (по расширению файла)
+        :param path: Путь к файлу
+        :return:
+        """
+        columns = ('time', 'ticks', *PHASES, 'total')
+        if path.endswith('.json'):
+            with open(path, 'w') as file:
+                json.dump([dict(zip(columns, row)) for row in self.rows], file)
+        else:
+            with open(path, 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(columns)
+                writer.writerows(self.rows)
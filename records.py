@@ -0,0 +1,261 @@
+"""
+Хранилище рекордов на SQLite
+
+Рекорды лежат в таблице с индексами по счёту и по паре (сложность, счёт), поэтому
+лучшие N результатов, в том числе по отдельному уровню сложности, выбираются по
+индексу без чтения и сортировки всех записей. Новые рекорды копятся в памяти и
+записываются пачками. Старый файл records.txt (строки "счёт | сложность | время")
+переносится в базу один раз.
+
+Когда рекорды присылают много процессов сразу (турнир, боты), писать в базу должен
+один процесс: ScoreSink запускает процесс-писатель, а игры отправляют ему рекорды
+через очередь (ScoreClient). Писатель сам собирает их в пачки и записывает одной
+транзакцией. Несколько RecordStore в разных процессах тоже безопасны: SQLite
+блокирует файл, а соединение ждёт освобождения блокировки.
+"""
+import datetime
+import multiprocessing
+import os
+import queue
+import sqlite3
+import time
+import warnings
+
+TIME_FORMAT = '%d.%m.%Y %H:%M:%S'  # Формат времени попытки, как в records.txt
+
+
+class RecordStore:
+    def __init__(self, path: str = 'records.db', batch_size: int = 1000):
+        """
+        Открытие хранилища
+        :param path: Файл базы данных
+        :param batch_size: Сколько рекордов копить перед записью на диск
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = []  # Рекорды, которые ещё не записаны
+        self.connection = sqlite3.connect(path, timeout=30)  # Ждать, пока другой процесс пишет в базу
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS records ('
+                                    'id INTEGER PRIMARY KEY, score INTEGER NOT NULL, '
+                                    'difficulty INTEGER NOT NULL, time TEXT NOT NULL)')
+            self._create_indexes()
+            # Отметки о выполненных разовых действиях, например переносе records.txt
+            self.connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+
+    def add(self, score, difficulty, time=None):
+        """
+        Добавление рекорда, запись на диск происходит пачками
+        :param score: Счёт
+        :param difficulty: Уровень сложности
+        :param time: Время попытки в формате дд.мм.гггг чч:мм:сс, по умолчанию текущее
+        :return:
+        """
+        if time is None:
+            time = datetime.datetime.now().strftime(TIME_FORMAT)
+        self.pending.append((score, difficulty, time))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def add_many(self, records):
+        """
+        Добавление пачки рекордов (счёт, сложность, время)
+        :return:
+        """
+        self.pending.extend(records)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Запись накопленных рекордов одной транзакцией
+        :return:
+        """
+        if not self.pending:
+            return
+        with self.connection:
+            self.connection.executemany('INSERT INTO records (score, difficulty, time) VALUES (?, ?, ?)',
+                                        self.pending)
+        self.pending = []
+
+    def top(self, limit=10, offset=0, difficulty=None):
+        """
+        Лучшие рекорды по убыванию счёта
+        :param limit: Сколько рекордов вернуть
+        :param offset: Сколько лучших пропустить (для постраничного вывода)
+        :param difficulty: Уровень сложности, по умолчанию все
+        :return: Список (счёт, сложность, время)
+        """
+        self.flush()
+        if difficulty is None:
+            query = 'SELECT score, difficulty, time FROM records ORDER BY score DESC LIMIT ? OFFSET ?'
+            return self.connection.execute(query, (limit, offset)).fetchall()
+        query = ('SELECT score, difficulty, time FROM records WHERE difficulty = ? '
+                 'ORDER BY score DESC LIMIT ? OFFSET ?')
+        return self.connection.execute(query, (difficulty, limit, offset)).fetchall()
+
+    def count(self, difficulty=None):
+        """
+        Количество рекордов
+        :param difficulty: Уровень сложности, по умолчанию все
+        :return:
+        """
+        self.flush()
+        if difficulty is None:
+            return self.connection.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+        return self.connection.execute('SELECT COUNT(*) FROM records WHERE difficulty = ?',
+                                       (difficulty,)).fetchone()[0]
+
+    def _create_indexes(self):
+        """
+        Индексы для выборки лучших рекордов по всем уровням и по каждому уровню
+        :return:
+        """
+        self.connection.execute('CREATE INDEX IF NOT EXISTS records_score ON records (score DESC)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS records_difficulty_score '
+                                'ON records (difficulty, score DESC)')
+
+    def import_text(self, path='records.txt'):
+        """
+        Разовый перенос рекордов из текстового файла в базу.
+        Файл читается построчно, а индексы на время переноса удаляются и строятся заново:
+        так миллионы строк переносятся в разы быстрее, чем с обновлением индекса на каждую.
+        Повреждённые строки пропускаются, о них выдаётся одно предупреждение
+        :param path: Файл со строками "счёт | сложность | время"
+        :return: Количество перенесённых рекордов
+        """
+        key = 'imported:' + os.path.abspath(path)
+        if not os.path.exists(path) or self.connection.execute('SELECT 1 FROM meta WHERE key = ?',
+                                                               (key,)).fetchone():
+            return 0
+
+        skipped = []  # Номера повреждённых строк
+
+        def parse(file):
+            for number, line in enumerate(file, 1):
+                parts = line.rstrip('\n').split(' | ')
+                try:
+                    if len(parts) != 3:
+                        raise ValueError(line)
+                    record = int(parts[0]), int(parts[1]), parts[2]
+                except ValueError:
+                    if line.strip():  # Пустые строки не считаются повреждёнными
+                        skipped.append(number)
+                    continue
+                yield record
+
+        self.flush()
+        before = self.count()
+        # Байты не в UTF-8 заменяются, такая строка тоже пропускается, а не обрывает перенос
+        with open(path, 'r', errors='replace') as file, self.connection:
+            self.connection.execute('DROP INDEX IF EXISTS records_score')
+            self.connection.execute('DROP INDEX IF EXISTS records_difficulty_score')
+            self.connection.executemany('INSERT INTO records (score, difficulty, time) VALUES (?, ?, ?)',
+                                        parse(file))
+            self._create_indexes()
+            imported = self.count() - before
+            self.connection.execute('INSERT INTO meta (key, value) VALUES (?, ?)', (key, str(imported)))
+        if skipped:
+            warnings.warn(f'{path}: пропущено повреждённых строк {len(skipped)}, первая - строка {skipped[0]}')
+        return imported
+
+    def close(self):
+        """
+        Запись накопленных рекордов и закрытие базы
+        :return:
+        """
+        self.flush()
+        self.connection.close()
+
+
+class ScoreClient:
+    def __init__(self, records_queue):
+        """
+        Отправка рекордов процессу-писателю, можно передавать в другие процессы
+        :param records_queue: Очередь процесса-писателя (ScoreSink.queue)
+        """
+        self.queue = records_queue
+
+    def submit(self, score, difficulty, time=None):
+        """
+        Отправка одного рекорда
+        :param score: Счёт
+        :param difficulty: Уровень сложности
+        :param time: Время попытки, по умолчанию текущее
+        :return:
+        """
+        if time is None:
+            time = datetime.datetime.now().strftime(TIME_FORMAT)
+        self.queue.put((score, difficulty, time))
+
+    def submit_many(self, records):
+        """
+        Отправка пачки рекордов (счёт, сложность, время) одним сообщением
+        :return:
+        """
+        self.queue.put(list(records))
+
+
+def _write_scores(path, records_queue, batch_size, flush_interval):
+    """
+    Процесс-писатель: получает рекорды из очереди и записывает пачками
+    :param flush_interval: Не дольше скольких секунд рекорд ждёт записи в неполной пачке
+    :return:
+    """
+    store = RecordStore(path, batch_size)
+    flushed = time.monotonic()
+    while True:
+        # Неполная пачка записывается по времени с прошлой записи, даже если рекорды идут без перерыва
+        try:
+            item = records_queue.get(timeout=max(0.0, flushed + flush_interval - time.monotonic()))
+        except queue.Empty:
+            item = ()
+        if item is None:
+            break
+        if isinstance(item, list):
+            store.add_many(item)
+        elif item:
+            store.pending.append(item)
+            if len(store.pending) >= batch_size:
+                store.flush()
+        if time.monotonic() - flushed >= flush_interval:
+            store.flush()
+            flushed = time.monotonic()
+    store.close()
+
+
+class ScoreSink(ScoreClient):
+    def __init__(self, path: str = 'records.db', batch_size: int = 5000, flush_interval: float = 0.5):
+        """
+        Запуск процесса-писателя рекордов
+        :param path: Файл базы данных
+        :param batch_size: Сколько рекордов записывать одной транзакцией
+        :param flush_interval: Не дольше скольких секунд рекорд ждёт записи в неполной пачке
+        """
+        super().__init__(multiprocessing.Queue())
+        self.process = multiprocessing.Process(target=_write_scores,
+                                               args=(path, self.queue, batch_size, flush_interval), daemon=True)
+        self.process.start()
+
+    def client(self):
+        """
+        Клиент для отправки рекордов из других процессов
+        :return: ScoreClient
+        """
+        return ScoreClient(self.queue)
+
+    def close(self):
+        """
+        Дождаться записи всех отправленных рекордов и остановить писателя
+        :return:
+        """
+        self.queue.put(None)
+        self.process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
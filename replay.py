@@ -0,0 +1,102 @@
+"""
+Запись и повтор игр
+
+Игра полностью задаётся размером поля, уровнем сложности, зерном уровня, генератором
+уровня (NumPy или чистый Python), зерном игры и действиями игрока, поэтому запись
+хранит только их: заголовок и по байту на тик (коды из engine.ACTION_CODES), сжатые
+zlib. Повтор идёт без графики на полной скорости и воспроизводит игру один в один.
+
+Запуск:
+    python replay.py last_game.replay
+"""
+import struct
+import sys
+import time
+import zlib
+from collections import namedtuple
+
+import engine
+
+MAGIC = b'SNR2'
+# Заголовок: метка, ширина, высота, сложность, зерно уровня, генератор уровня, зерно игры
+HEADER = struct.Struct('<4sHHBQBQ')
+
+Replay = namedtuple('Replay', ['width', 'height', 'difficulty', 'seed', 'game_seed', 'actions', 'generator'])
+
+
+def record(game):
+    """
+    Запись текущей игры
+    :param game: engine.Engine
+    :return: Replay
+    """
+    if game.custom_walls:
+        raise ValueError('Игру со стенами, заданными вручную, нельзя записать')
+    return Replay(game.width, game.height, game.difficulty, game.seed, game.game_seed, bytes(game.actions),
+                  game.generator)
+
+
+def to_bytes(replay):
+    """
+    Упаковка записи в байты
+    :return:
+    """
+    generator = engine.check_generator(replay.generator)
+    header = HEADER.pack(MAGIC, replay.width, replay.height, replay.difficulty, replay.seed, generator,
+                         replay.game_seed)
+    return header + zlib.compress(replay.actions)
+
+
+def from_bytes(data):
+    """
+    Распаковка записи из байтов
+    :return: Replay
+    """
+    magic, width, height, difficulty, seed, generator, game_seed = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('Это не запись игры')
+    return Replay(width, height, difficulty, seed, game_seed, zlib.decompress(data[HEADER.size:]), generator)
+
+
+def save(replay, path):
+    """
+    Сохранение записи в файл
+    :return:
+    """
+    with open(path, 'wb') as file:
+        file.write(to_bytes(replay))
+
+
+def load(path):
+    """
+    Загрузка записи из файла
+    :return: Replay
+    """
+    with open(path, 'rb') as file:
+        return from_bytes(file.read())
+
+
+def simulate(replay):
+    """
+    Повтор игры без графики
+    :param replay: Replay
+    :return: Игра (engine.Engine) и её последнее состояние
+    """
+    # Запись, сделанная генератором на NumPy, без NumPy не повторяется: check_generator сообщит об этом
+    game = engine.Engine(replay.width, replay.height, replay.difficulty, seed=replay.seed, generator=replay.generator)
+    state = game.reset(replay.game_seed)
+    step = game.step
+    actions = engine.CODE_ACTIONS
+    for code in replay.actions:
+        state = step(actions[code])
+    return game, state
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:]:
+        replay = load(path)
+        start = time.perf_counter()
+        game, state = simulate(replay)
+        elapsed = time.perf_counter() - start
+        print(f'{path}: сложность {replay.difficulty}, счёт {state.score}, длина {state.length}, '
+              f'тиков {game.ticks}, смерть {state.cause} | повтор {game.ticks / elapsed:.0f} тик/с')
@@ -0,0 +1,427 @@
+"""
+Сервер игры на asyncio: много игр одновременно, управление по TCP
+
+Правила те же, что в окне (engine.Engine), и скорость та же: тик раз в 1 / clock_speed
+секунд, быстрая пилюля ускоряет игру. Каждое подключение - отдельная игра на сервере.
+Клиент присылает по байту на нажатие (код из ACTION_CODES). Последнее нажатие до тика
+применяется на этом тике, как клавиша в main.py.
+
+Поле целиком не пересылается:
+    LEVEL - один раз на подключение: размер поля, сложность, зерно и стены (zlib)
+    START - в начале каждой игры: зерно игры, голова змейки и предметы (SPAWN)
+    тик - байт флагов: куда сдвинулась голова, убран ли хвост, применено ли нажатие,
+          конец игры. Дальше, если есть, причина смерти и новые предметы (SPAWN)
+Обычный тик занимает один байт, хвост и съеденный предмет клиент находит сам (Mirror).
+После смерти на том же уровне сразу начинается новая игра и приходит новый START.
+
+Клиенту, который не успевает читать, сервер не копит данные бесконечно: когда буфер
+отправки больше MAX_BUFFER, соединение закрывается.
+
+Запуск:
+    python main.py server --port 8765 --difficulty 3
+    python loadtest.py --clients 2000 --port 8765
+"""
+import argparse
+import asyncio
+import heapq
+import signal
+import struct
+import time
+import zlib
+from collections import deque
+
+from engine import ACTION_CODES, APPLE, CAUSES, CODE_ACTIONS, DIRECTIONS, EMPTY, FAST_PILL, PILL, SNAKE, Engine
+
+# Сообщения сервера
+LEVEL = struct.Struct('<BHHBQI')  # метка, ширина, высота, сложность, зерно уровня, длина стен в zlib
+START = struct.Struct('<BQHH')  # метка и количество предметов, зерно игры, голова x, y
+SPAWN = struct.Struct('<BHH')  # код предмета, x, y
+LEVEL_FLAG = 0xFF
+START_FLAG = 0x80
+# Байт флагов тика
+DIRECTION_MASK = 0x03  # Направление хода головы: индекс в CODE_ACTIONS минус 1
+TAIL = 0x04  # Хвост освободил клетку
+ACK = 0x08  # На этом тике применено нажатие клиента
+DONE = 0x10  # Игра окончена, следом байт причины (индекс в CAUSES)
+SPAWN_SHIFT = 5  # Биты 5-6: сколько новых предметов следует за флагами
+
+ITEMS = (APPLE, PILL, FAST_PILL)
+MAX_BUFFER = 65536  # Сколько байт может ждать отправки медленному клиенту
+MAX_LAG = 0.25  # На сколько секунд игра может отстать от расписания, как в Game.advance
+
+
+def items(engine):
+    """
+    Предметы на поле
+    :return: Клетки яблока, пилюли и быстрой пилюли (или None)
+    """
+    return engine.apple, engine.pill, engine.fast_pill
+
+
+def encode_level(engine):
+    """
+    Сообщение LEVEL: уровень, который не меняется между играми
+    :param engine: Игра
+    :return: bytes
+    """
+    walls = zlib.compress(engine.wall_grid)
+    return LEVEL.pack(LEVEL_FLAG, engine.width, engine.height, engine.difficulty, engine.seed, len(walls)) + walls
+
+
+def encode_start(engine):
+    """
+    Сообщение START: начало новой игры
+    :param engine: Игра сразу после reset
+    :return: bytes
+    """
+    spawns = [SPAWN.pack(code, *item) for code, item in zip(ITEMS, items(engine)) if item is not None]
+    return START.pack(START_FLAG | len(spawns), engine.game_seed, engine.snake.x, engine.snake.y) + b''.join(spawns)
+
+
+def encode_tick(engine, state, before, ack):
+    """
+    Изменения за тик
+    :param engine: Игра после тика
+    :param state: Результат тика
+    :param before: Предметы до тика, см. items
+    :param ack: Применено ли на тике нажатие клиента
+    :return: bytes
+    """
+    flags = ACTION_CODES[engine.snake.direction] - 1
+    if state.tail is not None:
+        flags |= TAIL
+    if ack:
+        flags |= ACK
+    if state.done:
+        return bytes((flags | DONE, CAUSES.index(state.cause)))
+    # Предметы не исчезают сами, только съедаются головой, поэтому изменившийся предмет - новый
+    spawns = [SPAWN.pack(code, *item) for code, old, item in zip(ITEMS, before, items(engine))
+              if item is not None and item != old]
+    if not spawns:
+        return bytes((flags,))
+    return bytes((flags | len(spawns) << SPAWN_SHIFT,)) + b''.join(spawns)
+
+
+class Mirror:
+    def __init__(self):
+        """
+        Игра на стороне клиента, собранная из сообщений сервера: сетка клеток и тело змейки
+        """
+        self.width = self.height = self.difficulty = self.seed = None
+        self.walls = None  # Стены уровня, по байту на клетку
+        self.grid = None  # Сетка клеток, коды как в engine
+        self.body = deque()  # Тело змейки, голова слева
+        self.game_seed = None
+        self.ticks = 0  # Тиков в текущей игре
+        self.games = 0  # Начатых игр
+        self.done = False
+        self.cause = None
+        self.received = 0  # Получено байт
+
+    async def _read(self, reader, size):
+        """
+        Чтение ровно size байт с учётом полученного
+        :return: bytes
+        """
+        self.received += size
+        return await reader.readexactly(size)
+
+    async def read(self, reader):
+        """
+        Чтение и применение одного сообщения
+        :param reader: asyncio.StreamReader
+        :return: Байт флагов сообщения
+        """
+        flags = (await self._read(reader, 1))[0]
+        if flags == LEVEL_FLAG:
+            header = bytes((flags,)) + await self._read(reader, LEVEL.size - 1)
+            width, height, difficulty, seed, size = LEVEL.unpack(header)[1:]
+            self.width, self.height, self.difficulty, self.seed = width, height, difficulty, seed
+            self.walls = zlib.decompress(await self._read(reader, size))
+        elif flags & START_FLAG:
+            game_seed, x, y = START.unpack(bytes((flags,)) + await self._read(reader, START.size - 1))[1:]
+            self.game_seed = game_seed
+            self.grid = bytearray(self.walls)
+            self.grid[y * self.width + x] = SNAKE
+            self.body = deque([(x, y)])
+            self.ticks = 0
+            self.games += 1
+            self.done = False
+            self.cause = None
+            await self.spawn(reader, flags & 0x7F)
+        else:
+            await self.tick(reader, flags)
+        return flags
+
+    async def tick(self, reader, flags):
+        """
+        Применение тика: сдвиг головы, освобождение хвоста, новые предметы
+        :return:
+        """
+        self.ticks += 1
+        width = self.width
+        dx, dy = DIRECTIONS[CODE_ACTIONS[(flags & DIRECTION_MASK) + 1]]
+        x, y = self.body[0]
+        head = ((x + dx) % width, (y + dy) % self.height)
+        # Хвост освобождается раньше, чем голова занимает клетку, как в движке
+        if flags & TAIL:
+            x, y = self.body.pop()
+            self.grid[y * width + x] = EMPTY
+        if flags & DONE:
+            self.done = True
+            self.cause = CAUSES[(await self._read(reader, 1))[0]]
+            return
+        self.body.appendleft(head)
+        self.grid[head[1] * width + head[0]] = SNAKE
+        await self.spawn(reader, flags >> SPAWN_SHIFT & 0x03)
+
+    async def spawn(self, reader, count):
+        """
+        Чтение новых предметов
+        :param count: Сколько предметов в сообщении
+        :return:
+        """
+        if count:
+            data = await self._read(reader, SPAWN.size * count)
+            for code, x, y in SPAWN.iter_unpack(data):
+                self.grid[y * self.width + x] = code
+
+
+class Session:
+    def __init__(self, server, reader, writer):
+        """
+        Игра одного подключения
+        :param server: GameServer
+        :param reader: asyncio.StreamReader
+        :param writer: asyncio.StreamWriter
+        """
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.engine = Engine(server.width, server.height, server.difficulty, seed=server.seed)
+        self.number = server.connections  # Номер подключения, различает сессии с одинаковым временем тика
+        self.action = None  # Последнее нажатие до ближайшего тика
+        self.closed = False
+
+    async def read_inputs(self):
+        """
+        Приём нажатий, пока клиент не отключится
+        :return:
+        """
+        try:
+            while data := await self.reader.read(64):
+                # Из нескольких нажатий за тик действует последнее, неизвестные коды пропускаются
+                for code in reversed(data):
+                    if code < len(CODE_ACTIONS):
+                        self.action = code
+                        break
+        except ConnectionError:
+            pass
+        self.closed = True
+
+    def tick(self):
+        """
+        Один тик игры и отправка изменений. После смерти сразу начинается новая игра
+        :return: False, если клиент отключился или не успевает читать
+        """
+        writer = self.writer
+        if self.closed or writer.is_closing():
+            return False
+        if writer.transport.get_write_buffer_size() > MAX_BUFFER:
+            self.server.dropped += 1
+            writer.close()
+            return False
+
+        engine = self.engine
+        action = self.action
+        self.action = None
+        before = items(engine)
+        state = engine.step(None if action is None else CODE_ACTIONS[action])
+        message = encode_tick(engine, state, before, action is not None)
+        self.server.ticks += 1
+        if state.done:
+            self.server.games += 1
+            engine.reset()
+            message += encode_start(engine)
+        self.send(message)
+        return True
+
+    def send(self, message):
+        """
+        Отправка сообщения без ожидания, размер буфера проверяется перед каждым тиком
+        :return:
+        """
+        self.writer.write(message)
+        self.server.sent += len(message)
+
+
+class GameServer:
+    def __init__(self, width: int = 50, height: int = 40, difficulty: int = 3, seed=None):
+        """
+        Сервер игр. Тики всех игр идут из одного расписания: куча (время тика, номер, сессия)
+        и один таймер цикла событий на ближайший тик. Игры, которым пора, обрабатываются
+        пачкой за одно пробуждение, без отдельной задачи и таймера на каждую игру
+        :param width: Ширина поля
+        :param height: Высота поля
+        :param difficulty: Уровень сложности всех игр
+        :param seed: Зерно уровня, по умолчанию у каждого подключения свой уровень
+        """
+        self.width = width
+        self.height = height
+        self.difficulty = difficulty
+        self.seed = seed
+        self.sessions = set()  # Подключённые игры
+        self.schedule = []  # Куча (время следующего тика, номер, сессия)
+        self.timer = None  # Таймер цикла событий на ближайший тик
+        self.connections = 0  # Всего подключений
+        self.ticks = 0
+        self.games = 0  # Законченных игр
+        self.sent = 0  # Отправлено байт
+        self.dropped = 0  # Отключено медленных клиентов
+        self.lateness = deque(maxlen=100000)  # На сколько секунд тики опоздали по расписанию
+        self.server = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8765):
+        """
+        Запуск приёма подключений
+        :param host: Адрес, по умолчанию только этот компьютер
+        :param port: Порт, 0 - любой свободный
+        :return: Порт, на котором работает сервер
+        """
+        self.server = await asyncio.start_server(self.handle, host, port, backlog=4096)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader, writer):
+        """
+        Одно подключение: игра идёт по расписанию, пока клиент не отключится
+        :return:
+        """
+        self.connections += 1
+        session = Session(self, reader, writer)
+        self.sessions.add(session)
+        session.send(encode_level(session.engine) + encode_start(session.engine))
+        loop = asyncio.get_running_loop()
+        self.add(session, loop.time() + 1 / session.engine.clock_speed)
+        try:
+            await session.read_inputs()
+        finally:
+            session.closed = True
+            self.sessions.discard(session)
+            writer.close()
+
+    def add(self, session, due):
+        """
+        Постановка тика игры в расписание
+        :param session: Session
+        :param due: Время тика по часам цикла событий
+        :return:
+        """
+        heapq.heappush(self.schedule, (due, session.number, session))
+        if self.timer is None or due < self.timer.when():
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = asyncio.get_running_loop().call_at(due, self.run_due)
+
+    def run_due(self):
+        """
+        Тики всех игр, которым пора, и таймер на следующий
+        :return:
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        schedule = self.schedule
+        while schedule and schedule[0][0] <= now:
+            due, number, session = heapq.heappop(schedule)
+            late = now - due
+            self.lateness.append(late)
+            if not session.tick():
+                continue
+            # Отставшая игра не пытается догнать время, как в Game.advance.
+            # Скорость берётся заново на каждом тике, так как быстрая пилюля её меняет
+            if late > MAX_LAG:
+                due = now
+            heapq.heappush(schedule, (due + 1 / session.engine.clock_speed, number, session))
+        self.timer = loop.call_at(schedule[0][0], self.run_due) if schedule else None
+
+    def summary(self, elapsed):
+        """
+        Сводка работы сервера
+        :param elapsed: Время работы в секундах
+        :return: Строка
+        """
+        late = sorted(self.lateness) or [0.0]
+        p50 = late[len(late) // 2]
+        p99 = late[min(len(late) - 1, len(late) * 99 // 100)]
+        return (f'подключений {self.connections}, сейчас {len(self.sessions)} | {self.ticks / elapsed:.0f} тик/с, '
+                f'игр {self.games} | отправлено {self.sent / elapsed / 1024:.1f} КБ/с | '
+                f'опоздание тика p50 {p50 * 1000:.2f} мс, p99 {p99 * 1000:.2f} мс | медленных отключено {self.dropped}')
+
+    async def serve(self, host='127.0.0.1', port=8765, report=0.0):
+        """
+        Работа сервера до Ctrl+C или SIGTERM, сводка выводится раз в report секунд
+        :return:
+        """
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop.set)
+            except (NotImplementedError, AttributeError):
+                # На Windows сигналы не ловятся циклом событий, остаётся KeyboardInterrupt
+                pass
+        port = await self.start(host, port)
+        print(f'Сервер на {host}:{port}', flush=True)
+        start = time.perf_counter()
+        async with self.server:
+            while not stop.is_set():
+                try:
+                    await asyncio.wait_for(stop.wait(), report or None)
+                except asyncio.TimeoutError:
+                    print(self.summary(time.perf_counter() - start), flush=True)
+            await self.stop()
+
+    async def stop(self):
+        """
+        Остановка: новые подключения не принимаются, текущие закрываются
+        :return:
+        """
+        self.server.close()
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.schedule.clear()
+        sessions = list(self.sessions)
+        for session in sessions:
+            session.writer.close()
+        # Обработчики подключений завершаются сами, когда соединение закрыто
+        await asyncio.gather(*(session.writer.wait_closed() for session in sessions), return_exceptions=True)
+        await asyncio.sleep(0)
+
+
+def main(argv=None):
+    """
+    Точка входа командной строки
+    :param argv: Аргументы без имени команды
+    :return:
+    """
+    parser = argparse.ArgumentParser(prog='main.py server', description='Сервер игр по TCP')
+    parser.add_argument('--host', default='127.0.0.1', help='адрес, по умолчанию только этот компьютер')
+    parser.add_argument('--port', type=int, default=8765, help='порт, 0 - любой свободный')
+    parser.add_argument('--difficulty', type=int, default=3, choices=[1, 2, 3, 4], help='уровень сложности')
+    parser.add_argument('--width', type=int, default=50, help='ширина поля')
+    parser.add_argument('--height', type=int, default=40, help='высота поля')
+    parser.add_argument('--seed', type=int, default=None, help='зерно уровня, одно на все подключения')
+    parser.add_argument('--report', type=float, default=0.0, help='выводить сводку раз в столько секунд')
+    args = parser.parse_args(argv)
+
+    server = GameServer(args.width, args.height, args.difficulty, args.seed)
+    start = time.perf_counter()
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.report))
+    except KeyboardInterrupt:
+        pass
+    print(server.summary(time.perf_counter() - start), flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+"""
+Поток событий игры: ходы, яблоки, пилюли, быстрая пилюля и смерть
+
+Движок пишет события в кольцевой буфер (Engine.events = Telemetry()). Событие
+сразу упаковывается в байты буфера, поэтому тик не создаёт объектов и не ждёт
+получателей. Раз в кадр (pump) новые события отдаются получателям одним куском
+байтов: счётчикам, файлу событий, файлу для живой панели. Если получатели не
+успевают и буфер переполняется, самые старые события теряются, а их количество
+считается в dropped.
+
+Файл событий: бинарный (метка и записи EVENT подряд) или NDJSON, если имя
+оканчивается на .ndjson. Прочитать его можно генератором read_events.
+
+Запуск:
+    python telemetry.py game.events
+"""
+import json
+import os
+import struct
+import sys
+import time
+from collections import namedtuple
+
+from engine import (CAUSES, CODE_ACTIONS, EVENT_APPLE, EVENT_DEATH, EVENT_FAST_PILL_END, EVENT_FAST_PILL_START,
+                    EVENT_MOVE, EVENT_PILL)
+
+MAGIC = b'SNKE'
+# Событие: тик, тип, x, y, значение
+EVENT = struct.Struct('<IBHHI')
+EVENT_NAMES = {EVENT_MOVE: 'move', EVENT_APPLE: 'apple', EVENT_PILL: 'pill',
+               EVENT_FAST_PILL_START: 'fast_pill_start', EVENT_FAST_PILL_END: 'fast_pill_end',
+               EVENT_DEATH: 'death'}
+EVENT_CODES = {name: code for code, name in EVENT_NAMES.items()}
+
+Event = namedtuple('Event', ['tick', 'kind', 'x', 'y', 'value'])
+
+
+def decode(chunk):
+    """
+    События из куска байтов
+    :param chunk: Записи EVENT подряд
+    :return: Генератор Event
+    """
+    for fields in EVENT.iter_unpack(chunk):
+        yield Event._make(fields)
+
+
+def to_json(event):
+    """
+    Событие в виде словаря для NDJSON: тип, направление и причина смерти словами
+    :param event: Event
+    :return:
+    """
+    result = {'tick': event.tick, 'event': EVENT_NAMES[event.kind], 'x': event.x, 'y': event.y}
+    if event.kind == EVENT_MOVE:
+        result['direction'] = CODE_ACTIONS[event.value]
+    elif event.kind == EVENT_DEATH:
+        result['cause'] = CAUSES[event.value]
+    elif event.kind in (EVENT_APPLE, EVENT_PILL):
+        result['score'] = event.value
+    return result
+
+
+def from_json(data):
+    """
+    Событие из словаря NDJSON
+    :param data: Словарь, как из to_json
+    :return: Event
+    """
+    kind = EVENT_CODES[data['event']]
+    if kind == EVENT_MOVE:
+        value = CODE_ACTIONS.index(data['direction'])
+    elif kind == EVENT_DEATH:
+        value = CAUSES.index(data['cause'])
+    else:
+        value = data.get('score', 0)
+    return Event(data['tick'], kind, data['x'], data['y'], value)
+
+
+def read_events(path):
+    """
+    Чтение файла событий
+    :param path: Бинарный файл или .ndjson
+    :return: Генератор Event
+    """
+    if path.endswith('.ndjson'):
+        with open(path) as file:
+            for line in file:
+                yield from_json(json.loads(line))
+        return
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError('Это не файл событий')
+        # Файл читается кусками, целыми записями
+        size = EVENT.size * 4096
+        while chunk := file.read(size):
+            yield from decode(chunk)
+
+
+class Telemetry:
+    def __init__(self, capacity: int = 16384):
+        """
+        Кольцевой буфер событий и его получатели
+        :param capacity: Сколько событий помещается в буфер между вызовами pump
+        """
+        self.capacity = capacity
+        self.buffer = bytearray(EVENT.size * capacity)
+        self.written = 0  # Всего записано событий
+        self.sent = 0  # Сколько из них уже отдано получателям
+        self.dropped = 0  # Потеряно при переполнении буфера
+        self.consumers = []  # Получатели: вызываются с куском байтов новых событий
+        self._pack = EVENT.pack_into
+
+    def subscribe(self, consumer):
+        """
+        Подписка на события
+        :param consumer: Вызываемый объект, принимает кусок байтов (записи EVENT)
+        :return: consumer
+        """
+        self.consumers.append(consumer)
+        return consumer
+
+    def emit(self, tick, kind, x, y, value):
+        """
+        Запись события в буфер, вызывается движком на каждом тике
+        :return:
+        """
+        self._pack(self.buffer, self.written % self.capacity * EVENT.size, tick, kind, x, y, value)
+        self.written += 1
+
+    def pump(self):
+        """
+        Отдача новых событий получателям, вызывается раз в кадр вне тиков
+        :return: Количество отданных событий
+        """
+        start = max(self.sent, self.written - self.capacity)
+        self.dropped += start - self.sent
+        count = self.written - start
+        self.sent = self.written
+        if not count or not self.consumers:
+            return count
+
+        # Новые события могут переходить через конец буфера
+        begin = start % self.capacity * EVENT.size
+        end = begin + count * EVENT.size
+        if end <= len(self.buffer):
+            chunk = bytes(self.buffer[begin:end])
+        else:
+            chunk = bytes(self.buffer[begin:]) + bytes(self.buffer[:end - len(self.buffer)])
+        for consumer in self.consumers:
+            consumer(chunk)
+        return count
+
+    def flush(self):
+        """
+        Отдача оставшихся событий и запись получателей на диск
+        :return:
+        """
+        self.pump()
+        for consumer in self.consumers:
+            if hasattr(consumer, 'flush'):
+                consumer.flush()
+
+    def close(self):
+        """
+        Завершение: оставшиеся события отдаются, файлы получателей закрываются
+        :return:
+        """
+        self.flush()
+        for consumer in self.consumers:
+            if hasattr(consumer, 'close'):
+                consumer.close()
+
+
+class EventStats:
+    def __init__(self):
+        """
+        Счётчики событий по типам и смертей по причинам
+        """
+        self.counts = dict.fromkeys(EVENT_NAMES.values(), 0)
+        self.deaths = {}
+        self.best = 0  # Лучший счёт по яблокам и пилюлям
+        self.events = 0
+
+    def __call__(self, chunk):
+        """
+        Учёт новых событий
+        :param chunk: Записи EVENT подряд
+        :return:
+        """
+        # Типы событий считаются по срезу байтов без распаковки, распаковываются только смерти и счёт
+        kinds = chunk[4::EVENT.size]
+        for code, name in EVENT_NAMES.items():
+            self.counts[name] += kinds.count(code)
+        self.events += len(kinds)
+        for code in (EVENT_APPLE, EVENT_PILL, EVENT_DEATH):
+            index = kinds.find(code)
+            while index != -1:
+                value = EVENT.unpack_from(chunk, index * EVENT.size)[4]
+                if code == EVENT_DEATH:
+                    cause = CAUSES[value]
+                    self.deaths[cause] = self.deaths.get(cause, 0) + 1
+                else:
+                    self.best = max(self.best, value)
+                index = kinds.find(code, index + 1)
+
+    def summary(self):
+        """
+        Счётчики одним словарём
+        :return:
+        """
+        return {'events': self.events, 'counts': self.counts, 'deaths': self.deaths, 'best': self.best}
+
+
+class Dashboard(EventStats):
+    def __init__(self, path: str, interval: float = 1.0):
+        """
+        Счётчики, которые раз в interval секунд сохраняются в JSON для живой панели.
+        Файл заменяется целиком, поэтому читатель никогда не видит его наполовину записанным
+        :param path: Файл JSON
+        :param interval: Как часто обновлять файл, секунды
+        """
+        super().__init__()
+        self.path = path
+        self.interval = interval
+        self.saved = 0.0
+
+    def __call__(self, chunk):
+        """
+        Учёт новых событий и обновление файла, если пора
+        :param chunk: Записи EVENT подряд
+        :return:
+        """
+        super().__call__(chunk)
+        if time.perf_counter() - self.saved >= self.interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Сохранение счётчиков в файл
+        :return:
+        """
+        self.saved = time.perf_counter()
+        with open(self.path + '.tmp', 'w') as file:
+            json.dump(self.summary(), file)
+        os.replace(self.path + '.tmp', self.path)
+
+
+class EventWriter:
+    def __init__(self, path: str, batch_size: int = 65536):
+        """
+        Запись событий в файл пачками
+        :param path: Файл событий, NDJSON если имя оканчивается на .ndjson, иначе бинарный
+        :param batch_size: Сколько байт копить перед записью на диск
+        """
+        self.ndjson = path.endswith('.ndjson')
+        self.batch_size = batch_size
+        self.pending = []  # Куски, которые ещё не записаны
+        self.size = 0
+        self.file = open(path, 'wb')
+        if not self.ndjson:
+            self.file.write(MAGIC)
+
+    def __call__(self, chunk):
+        """
+        Добавление новых событий в пачку
+        :param chunk: Записи EVENT подряд
+        :return:
+        """
+        if self.ndjson:
+            chunk = ''.join(json.dumps(to_json(event)) + '\n' for event in decode(chunk)).encode()
+        self.pending.append(chunk)
+        self.size += len(chunk)
+        if self.size >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Запись накопленной пачки на диск
+        :return:
+        """
+        self.file.write(b''.join(self.pending))
+        self.file.flush()
+        self.pending = []
+        self.size = 0
+
+    def close(self):
+        """
+        Запись остатка и закрытие файла
+        :return:
+        """
+        self.flush()
+        self.file.close()
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:]:
+        stats = EventStats()
+        stats(b''.join(EVENT.pack(*event) for event in read_events(path)))
+        print(f'{path}: {json.dumps(stats.summary(), ensure_ascii=False)}')
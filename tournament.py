@@ -0,0 +1,156 @@
+"""
+Турнир: массовый запуск игр без графики на всех ядрах процессора
+
+Каждая игра получает свой уровень сложности (те же стены, что в run_easy..run_super_hard)
+и своё зерно, поэтому результат любой игры можно повторить. Игры раздаются процессам
+пачками через ProcessPoolExecutor, в конце выводится сводка по счёту, длине змейки,
+времени жизни и причинам смерти.
+
+Запуск:
+    python main.py tournament --games 2000 --difficulty 1 2 3 4
+    python main.py tournament --games 2000 --scaling
+"""
+import argparse
+import os
+import random
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import engine
+from autopilot import Autopilot
+from hamilton import Solver
+from records import ScoreSink
+
+# Боты, которых можно выбрать в турнире
+BOTS = {
+    'random': engine.random_policy,
+    'autopilot': Autopilot(),
+    'solver': Solver(),
+}
+
+# Клиент процесса-писателя рекордов в процессе-исполнителе, если рекорды сохраняются
+_scores = None
+
+# Задание на одну игру и её результат
+Task = namedtuple('Task', ['difficulty', 'seed', 'bot', 'width', 'height', 'max_ticks'])
+GameResult = namedtuple('GameResult', ['difficulty', 'seed', 'score', 'length', 'ticks', 'cause'])
+
+
+def _init_worker(scores):
+    """
+    Настройка процесса-исполнителя
+    :param scores: ScoreClient или None
+    :return:
+    """
+    global _scores
+    _scores = scores
+
+
+def play_game(task):
+    """
+    Одна игра без графики, выполняется в процессе-исполнителе
+    :param task: Task
+    :return: GameResult
+    """
+    random.seed(task.seed)  # Зерно для бота, у игры своё
+    game = engine.Engine(task.width, task.height, task.difficulty, seed=task.seed)
+    state = engine.play(game, BOTS[task.bot], task.max_ticks)
+    if _scores is not None and state.score > 0:
+        _scores.submit(state.score, task.difficulty)
+    return GameResult(task.difficulty, task.seed, state.score, state.length, game.ticks, state.cause or 'timeout')
+
+
+def make_tasks(games, difficulties, seed=0, bot='random', width=50, height=40, max_ticks=10000):
+    """
+    Задания турнира: уровни сложности чередуются, зерна идут подряд
+    :return: Список Task
+    """
+    return [Task(difficulties[i % len(difficulties)], seed + i, bot, width, height, max_ticks)
+            for i in range(games)]
+
+
+def run_tournament(tasks, workers=None, records=None):
+    """
+    Запуск всех игр турнира на нескольких процессах
+    :param tasks: Список Task
+    :param workers: Количество процессов, по умолчанию по числу ядер
+    :param records: База рекордов, куда записывать результаты, по умолчанию не записывать
+    :return: Список GameResult в порядке заданий и время в секундах
+    """
+    workers = workers or os.cpu_count()
+    # Игры раздаются пачками, чтобы не гонять каждую игру отдельно между процессами
+    chunksize = max(1, len(tasks) // (workers * 8))
+    # Рекорды из всех процессов пишет один процесс-писатель
+    sink = ScoreSink(records) if records else None
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(sink and sink.client(),)) as pool:
+            results = list(pool.map(play_game, tasks, chunksize=chunksize))
+    finally:
+        # Даже если игра упала, уже отправленные рекорды записываются
+        if sink is not None:
+            sink.close()
+    return results, time.perf_counter() - start
+
+
+def report(results, elapsed):
+    """
+    Вывод сводки по турниру
+    :param results: Список GameResult
+    :param elapsed: Время турнира в секундах
+    :return:
+    """
+    ticks = sum(result.ticks for result in results)
+    print(f'Игр: {len(results)} за {elapsed:.2f} с | {len(results) / elapsed:.0f} игр/с | {ticks / elapsed:.0f} тик/с')
+    for difficulty in sorted({result.difficulty for result in results}):
+        group = [result for result in results if result.difficulty == difficulty]
+        causes = Counter(result.cause for result in group)
+        print(f'  сложность {difficulty}: игр {len(group)} | '
+              f'счёт ср. {sum(r.score for r in group) / len(group):.2f}, макс. {max(r.score for r in group)} | '
+              f'длина ср. {sum(r.length for r in group) / len(group):.2f} | '
+              f'тиков ср. {sum(r.ticks for r in group) / len(group):.0f} | '
+              f'смерть: ' + ', '.join(f'{cause} {count}' for cause, count in causes.most_common()))
+
+
+def scaling(tasks):
+    """
+    Пропускная способность и эффективность масштабирования по числу процессов
+    :param tasks: Список Task
+    :return:
+    """
+    counts = sorted({1, 2, 4, 8, 16, 32, os.cpu_count()} & set(range(1, os.cpu_count() + 1)))
+    base = None
+    print('Процессов | игр/с | ускорение | эффективность')
+    for workers in counts:
+        results, elapsed = run_tournament(tasks, workers)
+        throughput = len(results) / elapsed
+        base = base or throughput
+        print(f'{workers:9d} | {throughput:5.0f} | {throughput / base:9.2f} | {throughput / base / workers:13.0%}')
+
+
+def main(argv=None):
+    """
+    Точка входа командной строки
+    :param argv: Аргументы без имени команды
+    :return:
+    """
+    parser = argparse.ArgumentParser(prog='main.py tournament', description='Турнир игр без графики')
+    parser.add_argument('--games', type=int, default=1000, help='количество игр')
+    parser.add_argument('--difficulty', type=int, nargs='+', default=[1, 2, 3, 4], choices=[1, 2, 3, 4],
+                        help='уровни сложности, чередуются между играми')
+    parser.add_argument('--bot', default='random', choices=sorted(BOTS), help='бот, который играет')
+    parser.add_argument('--seed', type=int, default=0, help='зерно первой игры')
+    parser.add_argument('--width', type=int, default=50, help='ширина поля')
+    parser.add_argument('--height', type=int, default=40, help='высота поля')
+    parser.add_argument('--max-ticks', type=int, default=10000, help='ограничение длины игры')
+    parser.add_argument('--workers', type=int, default=None, help='количество процессов')
+    parser.add_argument('--records', default=None, help='база рекордов для результатов, например records.db')
+    parser.add_argument('--scaling', action='store_true', help='замерить масштабирование по числу процессов')
+    args = parser.parse_args(argv)
+
+    tasks = make_tasks(args.games, args.difficulty, args.seed, args.bot, args.width, args.height, args.max_ticks)
+    if args.scaling:
+        scaling(tasks)
+    else:
+        report(*run_tournament(tasks, args.workers, args.records))